@@ -0,0 +1,199 @@
+from __future__ import annotations
+from multiprocessing import Process, Pipe
+from multiprocessing.connection import Connection, wait
+from collections import deque
+from dataclasses import dataclass, asdict
+from typing import Callable
+import json
+import time
+import os
+
+from core.constants import MOD_EXTENSIONS
+from core.file import ModFile
+from audio.offline import render_to_file, memory_summary
+
+MANIFEST_NAME = ".render_manifest.jsonl"   # per output directory record of finished files, used to resume
+
+
+@dataclass
+class FileResult:
+    filepath: str
+    output_path: str
+    status: str  # 'ok', 'failed' or 'timeout'
+    audio_seconds: float = 0.0
+    wall_seconds: float = 0.0
+    peak_rss: int | None = None
+    traced_peak: int | None = None
+    error: str = ""
+
+    def __str__(self):
+        if self.status != 'ok':
+            return f"{self.filepath}: {self.status.upper()} {self.error}"
+        return (f"{self.filepath} -> {self.output_path}: {self.audio_seconds:.1f} s of audio in "
+                f"{self.wall_seconds:.2f} s" + memory_summary(self.peak_rss, self.traced_peak))
+
+
+@dataclass
+class BatchSummary:
+    rendered: int = 0
+    failed: int = 0
+    skipped: int = 0  # already finished by an earlier run
+    audio_seconds: float = 0.0
+    wall_seconds: float = 0.0
+
+    def __str__(self):
+        wall = max(self.wall_seconds, 1e-9)
+        return (f"{self.rendered} rendered, {self.failed} failed, {self.skipped} skipped in {self.wall_seconds:.1f} s: "
+                f"{self.rendered / wall:.2f} files/sec, {self.audio_seconds / wall:.1f} audio-hours/hour")
+
+
+# Finds every module in the given files and directories, paired with where its rendering should go.
+# Directories are mirrored into output_dir, so equally named files in different folders don't collide
+def collect_jobs(paths: list[str], output_dir: str, output_format: str) -> list[tuple[str, str]]:
+    jobs = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                for name in sorted(files):
+                    if name.lower().endswith(MOD_EXTENSIONS):
+                        relative = os.path.relpath(os.path.join(root, name), path)
+                        jobs.append((os.path.join(root, name), _output_path(output_dir, relative, output_format)))
+        else:
+            jobs.append((path, _output_path(output_dir, os.path.basename(path), output_format)))
+    return jobs
+
+
+def _output_path(output_dir: str, relative: str, output_format: str) -> str:
+    return os.path.join(output_dir, os.path.splitext(relative)[0] + "." + output_format)
+
+
+# Renders many modules, every one in a process of its own with up to workers of them at once, so a file's peak RSS
+# is its own and a file that hangs or crashes takes nothing else down with it. Failing files are recorded and
+# skipped, and files finished by an earlier (interrupted) run into the same output directory are not rendered
+# again. A file gets timeout seconds from when its process starts, after that the process is terminated
+def render_batch(jobs: list[tuple[str, str]], output_dir: str, output_format: str = 'wav', workers: int = None,
+                 timeout: float = None, max_seconds: float = None, trace_memory: bool = False,
+                 report: Callable[[FileResult], None] = print) -> BatchSummary:
+    workers = workers or os.cpu_count()
+    os.makedirs(output_dir, exist_ok=True)
+    manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+    finished = _read_manifest(manifest_path)
+
+    summary = BatchSummary()
+    todo = deque()
+    for filepath, output_path in jobs:
+        if os.path.abspath(filepath) in finished:
+            summary.skipped += 1
+        else:
+            todo.append((filepath, output_path))
+
+    start = time.perf_counter()
+    rendering: dict[Connection, tuple[Process, str, str, float]] = {}     # -> process, filepath, output path, deadline
+
+    with open(manifest_path, "a") as manifest:
+        def record(result: FileResult):
+            if result.status == 'ok':
+                summary.rendered += 1
+                summary.audio_seconds += result.audio_seconds
+            else:
+                summary.failed += 1
+            manifest.write(json.dumps(asdict(result) | {"filepath": os.path.abspath(result.filepath)}) + "\n")
+            manifest.flush()
+            report(result)
+
+        def fill():
+            while todo and len(rendering) < workers:
+                filepath, output_path = todo.popleft()
+                receiver, sender = Pipe(duplex=False)
+                process = Process(target=_render_job, daemon=True, args=(sender, filepath, output_path, output_format,
+                                                                          max_seconds, timeout, trace_memory))
+                process.start()
+                sender.close()  # only the process writes to it, so the pipe closes when the process ends
+                deadline = time.perf_counter() + timeout if timeout is not None else float("inf")
+                rendering[receiver] = process, filepath, output_path, deadline
+
+        try:
+            fill()
+            while rendering:
+                next_deadline = min(deadline for *_, deadline in rendering.values())
+                wait_time = max(next_deadline - time.perf_counter(), 0) if next_deadline != float("inf") else None
+                for receiver in wait(list(rendering), timeout=wait_time):
+                    process, filepath, output_path, _ = rendering.pop(receiver)
+                    try:
+                        result = receiver.recv()
+                    except EOFError:
+                        process.join()
+                        _remove(output_path)
+                        result = FileResult(filepath, output_path, 'failed',
+                                            error=f"its process died (exit code {process.exitcode})")
+                    receiver.close()
+                    process.join()
+                    record(result)
+
+                now = time.perf_counter()
+                for receiver in [receiver for receiver, (*_, deadline) in rendering.items() if deadline <= now]:
+                    process, filepath, output_path, _ = rendering.pop(receiver)
+                    process.terminate()
+                    process.join()
+                    receiver.close()
+                    _remove(output_path)
+                    record(FileResult(filepath, output_path, 'timeout', error=f"stopped after {timeout} s"))
+                fill()
+
+        except KeyboardInterrupt:
+            print("Interrupted, rerun the same command to resume")
+
+        finally:
+            for process, *_ in rendering.values():
+                process.terminate()
+
+    summary.wall_seconds = time.perf_counter() - start
+    return summary
+
+
+def _remove(output_path: str):
+    if os.path.exists(output_path):
+        os.remove(output_path)
+
+
+# Runs in the process of a file and sends its FileResult back
+def _render_job(sender: Connection, *args):
+    sender.send(_render_file(*args))
+    sender.close()
+
+
+# Never raises, so a bad file is reported like any other
+def _render_file(filepath: str, output_path: str, output_format: str, max_seconds: float, timeout: float,
+                 trace_memory: bool) -> FileResult:
+    try:
+        song = ModFile.open(filepath)
+    except Exception as e:
+        return FileResult(filepath, output_path, 'failed', error=f"parse error: {e!r}")
+
+    try:
+        os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+        stats = render_to_file(song, output_path, output_format, max_seconds, timeout, trace_memory)
+        return FileResult(filepath, output_path, 'ok', stats.audio_seconds, stats.wall_seconds, stats.peak_rss,
+                          stats.traced_peak)
+
+    except Exception as e:
+        _remove(output_path)
+        status = 'timeout' if isinstance(e, TimeoutError) else 'failed'
+        return FileResult(filepath, output_path, status, error=repr(e))
+
+
+# Files that rendered successfully in earlier runs
+def _read_manifest(manifest_path: str) -> set[str]:
+    finished = set()
+    if not os.path.exists(manifest_path):
+        return finished
+
+    with open(manifest_path) as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue    # a line cut short by an interrupt
+            if entry.get("status") == 'ok':
+                finished.add(entry["filepath"])
+    return finished
@@ -0,0 +1,57 @@
+from collections import OrderedDict
+import samplerate
+
+from settings import TRANSPOSE_CACHE_SIZE
+from audio.processing import transpose
+from core.types import Sample
+
+
+# Bounded LRU store of transposed samples keyed by (sample, period, finetune),
+# so a sustained or repeated note is resampled once and then only sliced
+class TransposeCache:
+    def __init__(self, converter: samplerate.Resampler, max_bytes: int = TRANSPOSE_CACHE_SIZE):
+        self.converter = converter
+        self.max_bytes = max_bytes
+        self.size = 0  # bytes of sample data currently held
+
+        # statistics
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._entries: OrderedDict[tuple[int, int, int], Sample] = OrderedDict()
+
+    def get(self, samplelist: list[Sample], sample_idx: int, period: int) -> Sample:
+        sample = samplelist[sample_idx]
+        key = (sample_idx, period, sample.finetune)
+
+        result = self._entries.get(key)
+        if result is not None:
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return result
+
+        self.misses += 1
+        result = transpose(sample, self.converter, period)
+
+        # Results that could never fit are handed out without being stored
+        nbytes = result.data.nbytes
+        if nbytes > self.max_bytes:
+            return result
+
+        self._entries[key] = result
+        self.size += nbytes
+        while self.size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.size -= evicted.data.nbytes
+            self.evictions += 1
+
+        return result
+
+    def clear(self):
+        self._entries.clear()
+        self.size = 0
+
+    def __str__(self):
+        return (f"transpose cache: {self.hits} hits, {self.misses} misses, {self.evictions} evictions, "
+                f"{len(self._entries)} entries ({self.size / 2**20:.1f} MiB)")
@@ -1,53 +1,50 @@
 from multiprocessing import shared_memory, Barrier
+from threading import BrokenBarrierError
 import numpy as np
-import samplerate
 
-from settings import INTERPOLATION
-from core.constants import BUFFER_SIZE
-from core.types import ChannelState
-from core.utilities import profile
+from core.types import BeatPtr, SharedBeatPtr
+from core.timeline import Timeline
+from core.probes import probe, reported
 from core.file import ModFile
-from audio.renderer import render_frame
-
-
-# Keeps track of the current note to play and calls the render_frame function
-@profile
-def channel(channel_no: int, song: ModFile, shm_name: str, beat_ptr: dict, sync_barrier: Barrier):
-    # Initialise the channel state
-    channel_state = ChannelState()
-
-    # Create the samplerate converter
-    converter = samplerate.Resampler(INTERPOLATION)
-
-    #  Create a numpy array view on the shared memory buffer
+from audio.engine import Engine
+from audio.mipmap import Mipmaps
+from audio.mixer import Mixer
+
+
+# A worker of the multiprocess engine mode: renders its group of channels into the shared channel block every row,
+# then waits at the barrier for the other groups (the mixer is the barrier action). The channels are split over a
+# fixed no of workers, so a song with more channels doesn't start more processes
+@reported("channels")
+def channel_group(channel_nos: list[int], song: ModFile, timeline: Timeline, shm_name: str, beat_ptr: SharedBeatPtr,
+                  sync_barrier: Barrier, mixer: Mixer, mipmaps: Mipmaps = None):
+    #  Create a numpy array view on the shared memory block, which holds the channels of a row of any length
     shm = shared_memory.SharedMemory(name=shm_name)
-    buffer_np = np.ndarray((BUFFER_SIZE,), dtype=np.float32, buffer=shm.buf)
+    buffer_np = np.ndarray((song.channel_count * timeline.max_frames,), dtype=np.float32, buffer=shm.buf)
+    renderer = Engine(song, timeline, buffer_np, channel_nos, mipmaps=mipmaps)
+    barrier_probe = probe("barrier")
+    position = BeatPtr()    # loaded in place every row
 
     try:
         while True:
-            pattern_idx = beat_ptr["pattern_idx"]
-            note_idx = beat_ptr["note_idx"]
-
-            # Unpack the current pattern
-            pattern = song.patternlist[song.pattern_order[pattern_idx]]
-
-            # Reset the channel_state if there was a unique note
-            new_note = pattern[channel_no][note_idx]
-            if new_note.sample_idx == -1:
-                # Continue last note
-                channel_state.increment(new_note)
-            else:
-                # Trigger new note
-                channel_state.trigger(new_note)
-
-            # Render a new frame and pass it to the mixer
-            audio_data = render_frame(channel_state, converter, song.samplelist)
-            buffer_np[:] = audio_data
-            sync_barrier.wait()     # wait for all the other threads and mixing to finish
+            renderer.render(beat_ptr.load_into(position))
+            barrier_probe.start()
+            sync_barrier.wait()     # wait for all the other groups and mixing to finish (the mixer has its own probes)
+            barrier_probe.stop()
 
     except KeyboardInterrupt:
-        print("exiting channel", channel_no)
+        print("exiting channels", channel_nos)
+
+    # The player has shut down its ring buffer (the mixer raises in one worker and breaks the barrier for the rest)
+    except (BrokenPipeError, BrokenBarrierError):
+        print("exiting channels", channel_nos, "(no player)")
 
     finally:
         # cleanup
+        for i, cache in renderer.caches.items():
+            if cache is not None:
+                print("channel", i, "-", cache)
+        renderer.frames = None
+        del buffer_np
         shm.close()
+        mixer.close()
+        beat_ptr.close()
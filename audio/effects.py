@@ -1,119 +1,258 @@
+from __future__ import annotations
+from dataclasses import dataclass
 from numpy.typing import NDArray
+from typing import TYPE_CHECKING
 import numpy as np
 
+if TYPE_CHECKING:
+    from core.types import ChannelState
 
-# arpeggio
-def arpeggio(arg1: int, arg2: int, data: NDArray[np.float32]) -> NDArray[np.float32]:
-    return data  # do nothing
+MIN_PERIOD, MAX_PERIOD = 113, 856   # the range ProTracker clamps period slides to
+MAX_VOLUME = 64
 
+# the vibrato and tremolo waveforms (sine, ramp down, square) over 64 steps, selected by E4x/E7x
+WAVEFORMS = np.array([
+    np.round(255 * np.sin(np.pi * np.arange(64) / 32)),
+    255 - 8 * np.arange(64),
+    np.where(np.arange(64) < 32, 255, -255),
+], dtype=np.float64)
 
-def slide_up(arg1: int, data: NDArray[np.float32]) -> NDArray[np.float32]:
-    return data  # do nothing
 
+# The parameters of one channel for every tick of a row. The effects fill them in, and the renderer turns them
+# into one per-sample position and gain array, so a row is still rendered in a single vectorized pass
+@dataclass
+class TickParams:
+    periods: NDArray[np.float64]  # period of every tick, 0 while the channel is silent
+    volumes: NDArray[np.float64]  # volume of every tick, 0 - 64
+    retrigger: NDArray[np.bool_] = None  # ticks on which the sample restarts, None if it doesn't
 
-def slide_down(arg1: int, data: NDArray[np.float32]) -> NDArray[np.float32]:
-    return data  # do nothing
+    @staticmethod
+    def hold(period: float, volume: float, ticks: int) -> TickParams:
+        return TickParams(np.full(ticks, float(period)), np.full(ticks, float(volume)))
 
 
-def portamento(arg1: int, data: NDArray[np.float32]) -> NDArray[np.float32]:
-    return data  # do nothing
+# Every effect takes the channel state and the row's tick parameters, fills in the ticks and leaves the state
+# as the next row should find it (slides persist, vibrato and arpeggio don't). Effects work on ticks 1 and up
+# like in ProTracker, unless they are 'fine' ones that only act on tick 0. The effects that change the song
+# flow (Bxx, Dxx, E6x, EEx, Fxx) are followed by the Timeline and do nothing here
 
+# tick numbers of a row
+def _ticks(params: TickParams) -> NDArray[np.float64]:
+    return np.arange(len(params.periods), dtype=np.float64)
 
-def vibrato(arg1: int, arg2: int, data: NDArray[np.float32]) -> NDArray[np.float32]:
-    return data  # do nothing
 
+def _slide_period(state: ChannelState, params: TickParams, delta: float):
+    if state.current_period == 0:
+        return
+    params.periods[:] = np.clip(state.current_period + delta * _ticks(params), MIN_PERIOD, MAX_PERIOD)
+    state.current_period = int(params.periods[-1])
 
-def portamento_w_vol_slide(arg1: int, arg2: int, data: NDArray[np.float32]) -> NDArray[np.float32]:
-    return data  # do nothing
 
+def _slide_volume(state: ChannelState, params: TickParams, delta: float):
+    params.volumes[:] = np.clip(state.volume + delta * _ticks(params), 0, MAX_VOLUME)
+    state.volume = int(params.volumes[-1])
 
-def vibrato_w_vol_slide(arg1: int, arg2: int, data: NDArray[np.float32]) -> NDArray[np.float32]:
-    return data  # do nothing
 
+def _tone_portamento(state: ChannelState, params: TickParams):
+    current, target = state.current_period, state.target_period
+    if current == 0 or target == 0:
+        return
+    steps = state.portamento_speed * _ticks(params)
+    params.periods[:] = np.maximum(current - steps, target) if current > target else np.minimum(current + steps, target)
+    state.current_period = int(params.periods[-1])
 
-def tremolo(arg1: int, arg2: int, data: NDArray[np.float32]) -> NDArray[np.float32]:
-    return data  # do nothing
 
+# offsets of an oscillator from tick 1 on, advancing its position after every tick
+def _oscillate(position: int, speed: int, depth: int, waveform: int, ticks: int) -> NDArray[np.float64]:
+    positions = (position + speed * np.arange(ticks - 1)) & 63
+    return WAVEFORMS[waveform & 3][positions] * depth
 
-def set_offset(arg1: int, data: NDArray[np.float32]) -> NDArray[np.float32]:
-    return data  # do nothing
 
+def _vibrato(state: ChannelState, params: TickParams):
+    ticks = len(params.periods)
+    if state.current_period == 0 or ticks < 2:
+        return
+    params.periods[1:] += _oscillate(state.vibrato_pos, state.vibrato_speed, state.vibrato_depth,
+                                     state.vibrato_wave, ticks) / 128
+    state.vibrato_pos = (state.vibrato_pos + state.vibrato_speed * (ticks - 1)) & 63
 
-def vol_slide(arg1: int, arg2: int, data: NDArray[np.float32]) -> NDArray[np.float32]:
-    return data  # do nothing
 
+# 0xy
+def arpeggio(state: ChannelState, params: TickParams, arg1: int, arg2: int):
+    if arg1 == 0 and arg2 == 0:
+        return  # no effect at all
+    semitones = np.array([0, arg1, arg2])[np.arange(len(params.periods)) % 3]
+    params.periods *= 2.0 ** (-semitones / 12)
 
-def pos_jump(arg1: int, data: NDArray[np.float32]) -> NDArray[np.float32]:
-    return data  # do nothing
 
+# 1xx
+def slide_up(state: ChannelState, params: TickParams, arg1: int):
+    _slide_period(state, params, -arg1)
 
-def set_vol(arg1: int, data: NDArray[np.float32]) -> NDArray[np.float32]:
-    return data  # do nothing
 
+# 2xx
+def slide_down(state: ChannelState, params: TickParams, arg1: int):
+    _slide_period(state, params, arg1)
 
-def pattern_break(arg1: int, data: NDArray[np.float32]) -> NDArray[np.float32]:
-    return data  # do nothing
 
+# 3xx, the note of the row only sets the target period (see ChannelState.play)
+def portamento(state: ChannelState, params: TickParams, arg1: int):
+    if arg1:
+        state.portamento_speed = arg1
+    _tone_portamento(state, params)
 
-def set_speed(arg1: int, data: NDArray[np.float32]) -> NDArray[np.float32]:
-    return data  # do nothing
 
+# 4xy
+def vibrato(state: ChannelState, params: TickParams, arg1: int, arg2: int):
+    if arg1:
+        state.vibrato_speed = arg1
+    if arg2:
+        state.vibrato_depth = arg2
+    _vibrato(state, params)
 
-def set_filter(arg1: int, data: NDArray[np.float32]) -> NDArray[np.float32]:
-    return data  # do nothing
 
+# 5xy, 3 with the last speed and a volume slide
+def portamento_w_vol_slide(state: ChannelState, params: TickParams, arg1: int, arg2: int):
+    _tone_portamento(state, params)
+    vol_slide(state, params, arg1, arg2)
 
-def fineslide_up(arg1: int, data: NDArray[np.float32]) -> NDArray[np.float32]:
-    return data  # do nothing
 
+# 6xy, 4 with the last speed and depth and a volume slide
+def vibrato_w_vol_slide(state: ChannelState, params: TickParams, arg1: int, arg2: int):
+    _vibrato(state, params)
+    vol_slide(state, params, arg1, arg2)
 
-def fineslide_down(arg1: int, data: NDArray[np.float32]) -> NDArray[np.float32]:
-    return data  # do nothing
 
+# 7xy
+def tremolo(state: ChannelState, params: TickParams, arg1: int, arg2: int):
+    if arg1:
+        state.tremolo_speed = arg1
+    if arg2:
+        state.tremolo_depth = arg2
+    ticks = len(params.volumes)
+    if ticks < 2:
+        return
+    offsets = _oscillate(state.tremolo_pos, state.tremolo_speed, state.tremolo_depth, state.tremolo_wave, ticks)
+    params.volumes[1:] = np.clip(params.volumes[1:] + offsets / 64, 0, MAX_VOLUME)
+    state.tremolo_pos = (state.tremolo_pos + state.tremolo_speed * (ticks - 1)) & 63
 
-def glissando(arg1: int, data: NDArray[np.float32]) -> NDArray[np.float32]:
-    return data  # do nothing
 
+# 9xx, starts the note xx * 256 samples in
+def set_offset(state: ChannelState, params: TickParams, arg1: int):
+    if arg1:
+        state.offset_memory = arg1
+    if state.triggered:
+        state.position = float(state.offset_memory * 256)
 
-def set_vibrato(arg1: int, data: NDArray[np.float32]) -> NDArray[np.float32]:
-    return data  # do nothing
 
+# Axy, up by x or down by y every tick
+def vol_slide(state: ChannelState, params: TickParams, arg1: int, arg2: int):
+    _slide_volume(state, params, arg1 if arg1 else -arg2)
 
-def set_loop(arg1: int, data: NDArray[np.float32]) -> NDArray[np.float32]:
-    return data  # do nothing
 
+# Bxx, followed by the Timeline
+def pos_jump(state: ChannelState, params: TickParams, arg1: int):
+    pass
 
-def jump_to_loop(arg1: int, data: NDArray[np.float32]) -> NDArray[np.float32]:
-    return data  # do nothing
 
+# Cxx
+def set_vol(state: ChannelState, params: TickParams, arg1: int):
+    state.volume = min(arg1, MAX_VOLUME)
+    params.volumes[:] = state.volume
 
-def set_tremolo(arg1: int, data: NDArray[np.float32]) -> NDArray[np.float32]:
-    return data  # do nothing
 
+# Dxx, followed by the Timeline
+def pattern_break(state: ChannelState, params: TickParams, arg1: int):
+    pass
 
-def retrig_note(arg1: int, data: NDArray[np.float32]) -> NDArray[np.float32]:
-    return data  # do nothing
 
+# Fxx, followed by the Timeline
+def set_speed(state: ChannelState, params: TickParams, arg1: int):
+    pass
 
-def fine_vol_slide_up(arg1: int, data: NDArray[np.float32]) -> NDArray[np.float32]:
-    return data  # do nothing
 
+# E0x, the Amiga's audio filter
+def set_filter(state: ChannelState, params: TickParams, arg1: int):
+    pass
 
-def fine_vol_slide_down(arg1: int, data: NDArray[np.float32]) -> NDArray[np.float32]:
-    return data  # do nothing
 
+# E1x
+def fineslide_up(state: ChannelState, params: TickParams, arg1: int):
+    if state.current_period:
+        state.current_period = max(state.current_period - arg1, MIN_PERIOD)
+        params.periods[:] = state.current_period
 
-def note_cut(arg1: int, data: NDArray[np.float32]) -> NDArray[np.float32]:
-    return data  # do nothing
 
+# E2x
+def fineslide_down(state: ChannelState, params: TickParams, arg1: int):
+    if state.current_period:
+        state.current_period = min(state.current_period + arg1, MAX_PERIOD)
+        params.periods[:] = state.current_period
 
-def note_delay(arg1: int, data: NDArray[np.float32]) -> NDArray[np.float32]:
-    return data  # do nothing
 
+# E3x, rounding portamentos to semitones, not supported
+def glissando(state: ChannelState, params: TickParams, arg1: int):
+    pass
 
-def pattern_delay(arg1: int, data: NDArray[np.float32]) -> NDArray[np.float32]:
-    return data  # do nothing
 
+# E4x, the waveform of the vibrato. Bit 2 keeps its position when a new note starts
+def set_vibrato(state: ChannelState, params: TickParams, arg1: int):
+    state.vibrato_wave = arg1
 
-def invert_loop(arg1: int, data: NDArray[np.float32]) -> NDArray[np.float32]:
-    return data  # do nothing
+
+# E5x, overriding the sample's finetune, not supported
+def set_loop(state: ChannelState, params: TickParams, arg1: int):
+    pass
+
+
+# E6x, followed by the Timeline
+def jump_to_loop(state: ChannelState, params: TickParams, arg1: int):
+    pass
+
+
+# E7x, the waveform of the tremolo
+def set_tremolo(state: ChannelState, params: TickParams, arg1: int):
+    state.tremolo_wave = arg1
+
+
+# E9x, restarts the sample every x ticks
+def retrig_note(state: ChannelState, params: TickParams, arg1: int):
+    if arg1:
+        ticks = np.arange(len(params.periods))
+        params.retrigger = (ticks > 0) & (ticks % arg1 == 0)
+
+
+# EAx
+def fine_vol_slide_up(state: ChannelState, params: TickParams, arg1: int):
+    state.volume = min(state.volume + arg1, MAX_VOLUME)
+    params.volumes[:] = state.volume
+
+
+# EBx
+def fine_vol_slide_down(state: ChannelState, params: TickParams, arg1: int):
+    state.volume = max(state.volume - arg1, 0)
+    params.volumes[:] = state.volume
+
+
+# ECx, silences the note from tick x on
+def note_cut(state: ChannelState, params: TickParams, arg1: int):
+    if arg1 < len(params.volumes):
+        params.volumes[arg1:] = 0
+        state.volume = 0
+
+
+# EDx, starts the row's note on tick x. The channel is silent until then instead of finishing the previous note
+def note_delay(state: ChannelState, params: TickParams, arg1: int):
+    if state.triggered:
+        params.periods[:arg1] = 0
+        params.volumes[:arg1] = 0
+
+
+# EEx, followed by the Timeline
+def pattern_delay(state: ChannelState, params: TickParams, arg1: int):
+    pass
+
+
+# EFx, not supported
+def invert_loop(state: ChannelState, params: TickParams, arg1: int):
+    pass
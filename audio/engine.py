@@ -0,0 +1,94 @@
+from multiprocessing import shared_memory
+from numpy.typing import NDArray
+import numpy as np
+
+from settings import INTERPOLATION, PLAYBACK_RATE
+from core.types import BeatPtr, SharedBeatPtr, ChannelState
+from core.timeline import Timeline
+from core.probes import probe, reported
+from core.file import ModFile
+from audio.mipmap import Mipmaps, MIPMAP_INTERPOLATION
+from audio.mixer import Mixer, channel_block, selected_channels
+from audio.renderer import render_frame, channel_cache
+
+ENGINE_MODES = ['multiprocess', 'single']   # channel groups in processes synchronised by a Barrier, or all in one
+
+
+# Renders a group of channels of a song (by default all the selected ones) within one process into the
+# (channels, frames) block of each row, in an arena allocated once for the longest row (see channel_block).
+# Several engines can share one arena, each filling in the rows of its own channels. The mipmap modes build the
+# song's Mipmaps unless they are given (shared by several engines)
+class Engine:
+    def __init__(self, song: ModFile, timeline: Timeline, frames: NDArray[np.float32] = None,
+                 channels: list[int] = None, interpolation: str = INTERPOLATION, mipmaps: Mipmaps = None):
+        self.song = song
+        self.timeline = timeline
+        self.channels = channels if channels is not None else selected_channels(song.channel_count)
+        self.channel_states = None
+        self.interpolation = interpolation
+        if interpolation in MIPMAP_INTERPOLATION and mipmaps is None:
+            mipmaps = Mipmaps.build(song.samplelist)
+        self.caches = {i: channel_cache(interpolation, mipmaps) for i in self.channels}
+        if frames is None:
+            frames = np.zeros(song.channel_count * timeline.max_frames, dtype=np.float32)
+        self.frames = frames
+        self._last_row = None
+        self._probe = probe("render")
+
+    # The channel block of the row at the position. Rendering it takes too long if it takes longer than it plays
+    def render(self, position: BeatPtr) -> NDArray[np.float32]:
+        self._probe.start()
+        # Starting, or the song didn't just move on to the next row (a seek): restore the channels from the timeline
+        if self._last_row is None or position.row_idx != self.timeline.next_row(self._last_row):
+            self.channel_states = self.timeline.channel_states(self.song, position.row_idx)
+        self._last_row = position.row_idx
+
+        row = self.timeline.rows[position.row_idx]
+        ticks, frames = int(row["ticks"]), int(row["frames"])
+        block = channel_block(self.frames, self.song.channel_count, frames)
+        for i in self.channels:
+            play_note(self.channel_states[i], self.song, i, position.pattern_idx, position.note_idx)
+            block[i] = render_frame(self.channel_states[i], self.caches[i], self.song.samplelist, ticks, frames,
+                                    self.interpolation)
+        self._probe.stop(frames / PLAYBACK_RATE)
+        return block
+
+
+# The single process engine mode: renders straight into the shared channel block, then mixes and advances the
+# song without any Barrier
+@reported("engine")
+def engine(song: ModFile, timeline: Timeline, shm_name: str, beat_ptr: SharedBeatPtr, mixer: Mixer,
+           mipmaps: Mipmaps = None):
+    # Create a numpy array view on the shared memory block
+    shm = shared_memory.SharedMemory(name=shm_name)
+    frames = np.ndarray((song.channel_count * timeline.max_frames,), dtype=np.float32, buffer=shm.buf)
+    renderer = Engine(song, timeline, frames, mipmaps=mipmaps)
+    position = BeatPtr()    # loaded in place every row
+
+    try:
+        while True:
+            renderer.render(beat_ptr.load_into(position))
+            mixer()
+
+    except KeyboardInterrupt:
+        print("exiting engine")
+
+    # The player has shut down its ring buffer
+    except BrokenPipeError:
+        print("exiting engine (no player)")
+
+    finally:
+        # cleanup
+        renderer.frames = None
+        shm.close()
+        mixer.close()
+        beat_ptr.close()
+
+
+# Updates the channel state with the note at the given position in the song
+def play_note(channel_state: ChannelState, song: ModFile, channel_no: int, pattern_idx: int, note_idx: int):
+    # Look up the current note in the song's note table
+    new_note = song.patterns[song.pattern_order[pattern_idx], note_idx, channel_no]
+
+    # Reset the channel_state if there was a unique note, otherwise continue the last one
+    channel_state.play(new_note.item(), song.samplelist)
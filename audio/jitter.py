@@ -0,0 +1,122 @@
+from numpy.typing import NDArray
+import numpy as np
+import time
+
+from settings import PLAYBACK_RATE, DEVICE_BLOCK_SIZE, JITTER_LATENCY_RANGE, JITTER_CALM_PERIOD
+from core.types import RingBuffer
+
+
+# Sits between the ring buffer and the sound card in callback mode. The device asks for fixed size blocks,
+# which are cut out of a local queue of samples that is topped up with whole ticks from the ring.
+# The queue is kept at a target depth that adapts at runtime:
+#   - on an underrun (the ring had nothing when a block was due) the target doubles and playback
+#     waits until the queue has refilled to it
+#   - after JITTER_CALM_PERIOD seconds without underruns the target shrinks by one block
+# so latency only grows as much as the engine's timing actually needs. The target covers the whole queue ahead of
+# the device: the ring is throttled to it, so the engine waits instead of filling the ring up behind the queue and
+# the latency stays within a tick of the target.
+# It knows nothing about pyaudio, any caller that asks for blocks at the device's pace can drive it
+class JitterBuffer:
+    def __init__(self, ring: RingBuffer, block_size: int = DEVICE_BLOCK_SIZE,
+                 latency_range: tuple[float, float] = JITTER_LATENCY_RANGE, calm_period: float = JITTER_CALM_PERIOD):
+        self.ring = ring
+        self.block_size = block_size
+        self.min_target = max(block_size, int(latency_range[0] * PLAYBACK_RATE))
+        self.max_target = max(self.min_target, int(latency_range[1] * PLAYBACK_RATE))
+        self.calm_period = calm_period
+        self.target = self.min_target  # no of samples to keep queued
+
+        # statistics
+        self.underruns = 0
+        self.blocks = 0
+
+        # room for the largest target, one block taken out of it and the tick that tops it up
+        self._queue = np.zeros(self.max_target + block_size + ring.frame_size, dtype=np.float32)
+        self._start = 0
+        self._end = 0
+        self._block = np.zeros(block_size, dtype=np.float32)
+        self._priming = True    # waiting for the queue to fill up to the target before playing
+        self._last_change = time.perf_counter()    # of the target, or the last underrun
+        self._last_frame = time.perf_counter()     # time a tick last arrived from the ring
+        ring.throttle(self.target)
+
+    # no of samples queued locally
+    @property
+    def fill(self) -> int:
+        return self._end - self._start
+
+    # seconds of audio queued ahead of the device, here and in the ring
+    @property
+    def latency(self) -> float:
+        return (self.fill + self.ring.buffered) / PLAYBACK_RATE
+
+    # seconds since the last tick arrived from the ring
+    @property
+    def idle(self) -> float:
+        return time.perf_counter() - self._last_frame
+
+    # The next block for the device, silence while priming and for whatever is missing on an underrun.
+    # The returned buffer is overwritten by the next call
+    def read(self, frame_count: int) -> NDArray[np.float32]:
+        if frame_count > len(self._block):
+            self._grow(frame_count)
+        block = self._block[:frame_count]
+        self._top_up(frame_count)
+        now = time.perf_counter()
+
+        if self._priming:
+            if self.fill < self.target:
+                block[:] = 0
+                self.ring.throttle(self.target, self.fill)
+                return block
+            self._priming = False
+
+        available = min(self.fill, frame_count)
+        block[:available] = self._queue[self._start:self._start + available]
+        block[available:] = 0
+        self._start += available
+        self.blocks += 1
+
+        if available < frame_count:
+            self.underruns += 1
+            self.target = min(self.max_target, self.target * 2)
+            self._priming = True
+            self._last_change = now
+        elif now - self._last_change >= self.calm_period and self.target > self.min_target:
+            self.target = max(self.min_target, self.target - self.block_size)
+            self._last_change = now
+
+        self.ring.throttle(self.target, self.fill)
+        return block
+
+    # Moves ticks from the ring into the local queue until the target is met after this block is taken.
+    # Never waits, the device callback can't block
+    def _top_up(self, frame_count: int):
+        ring = self.ring
+        while self.fill < self.target + frame_count and ring.fill > 0:
+            frame = ring.read_slot(timeout=0)
+            if frame is None:
+                return
+
+            # Move what's left to the front once the tick no longer fits behind it
+            if self._end + len(frame) > len(self._queue):
+                fill = self.fill
+                self._queue[:fill] = self._queue[self._start:self._end]
+                self._start, self._end = 0, fill
+
+            self._queue[self._end:self._end + len(frame)] = frame
+            self._end += len(frame)
+            ring.release()
+            self._last_frame = time.perf_counter()
+
+    # Makes room for devices that ask for more than block_size samples at once
+    def _grow(self, frame_count: int):
+        queue = np.zeros(self.max_target + frame_count + self.ring.frame_size, dtype=np.float32)
+        fill = self.fill
+        queue[:fill] = self._queue[self._start:self._end]
+        self._queue, self._start, self._end = queue, 0, fill
+        self._block = np.zeros(frame_count, dtype=np.float32)
+
+    def __str__(self):
+        return (f"jitter buffer: {self.latency * 1000:.0f} ms latency, {self.fill}/{self.target} samples queued, "
+                f"{self.underruns} underruns in {self.blocks} blocks")
@@ -0,0 +1,87 @@
+from __future__ import annotations
+from dataclasses import dataclass, replace
+import numpy as np
+import samplerate
+import math
+
+from settings import MIPMAP_OVERSAMPLING, MIPMAP_LEVELS, MIPMAP_QUALITY
+from core.types import Sample, SamplePool
+
+MIPMAP_INTERPOLATION = {'mipmap_linear': 'linear', 'mipmap_cubic': 'cubic'}    # mode: how the levels are read
+LOOP_PADDING = 256  # samples of loop continuation resampled past the loop end, so the seam is filtered too
+
+
+# Band-limited copies of a sample at octave spaced rates, made once when the song is loaded. The first level
+# is oversampled by MIPMAP_OVERSAMPLING, which leaves little for linear or cubic interpolation to get wrong
+# when notes play at or below the sample's own rate. The next ones are decimated by 2, 4, 8... for notes
+# that play faster, which are read from the level whose band limit is nearest to the output's (in octaves,
+# so it may alias by up to half an octave, which measures better than the dullness of the next level down)
+@dataclass
+class Mipmap:
+    levels: list[Sample]
+    ratios: list[float]  # length of every level relative to the sample
+
+    # the level to play at a playback step (source samples per output sample), and its ratio. The first one
+    # has the sample's full band and serves every step up to 2 ** 0.5
+    def level(self, step: float) -> tuple[Sample, float]:
+        idx = 0 if step <= 1 else min(round(math.log2(step)), len(self.levels) - 1)
+        return self.levels[idx], self.ratios[idx]
+
+    @staticmethod
+    def build(sample: Sample, converter_type: str = MIPMAP_QUALITY, oversampling: int = MIPMAP_OVERSAMPLING,
+              depth: int = MIPMAP_LEVELS) -> Mipmap:
+        ratios = [float(oversampling)] + [2.0 ** -k for k in range(1, depth + 1)
+                                          if len(sample.data) * 2.0 ** -k >= 2]
+        return Mipmap([_resample(sample, ratio, converter_type) for ratio in ratios], ratios)
+
+
+# The mipmaps of all the samples of a song, what render_frame reads from in the mipmap modes (where the
+# other modes use a channel's TransposeCache). Built once and shared by all the channels, and with share()
+# by all the processes too
+class Mipmaps:
+    def __init__(self, mipmaps: list[Mipmap]):
+        self.mipmaps = mipmaps
+        self.pool = None
+
+    @staticmethod
+    def build(samplelist: list[Sample], converter_type: str = MIPMAP_QUALITY) -> Mipmaps:
+        return Mipmaps([Mipmap.build(sample, converter_type) for sample in samplelist])
+
+    # the level of a sample to play at a playback step, and its ratio
+    def level(self, sample_idx: int, step: float) -> tuple[Sample, float]:
+        return self.mipmaps[sample_idx].level(step)
+
+    # bytes of all the levels
+    @property
+    def size(self) -> int:
+        return sum(level.data.nbytes for mipmap in self.mipmaps for level in mipmap.levels)
+
+    # Moves the levels into a shared SamplePool, which the caller closes and unlinks
+    def share(self) -> SamplePool:
+        self.pool = SamplePool.create([level for mipmap in self.mipmaps for level in mipmap.levels], np.float32)
+        return self.pool
+
+    def __str__(self):
+        return f"mipmaps: {self.size / 2**20:.1f} MiB{' shared' if self.pool is not None else ''}"
+
+
+# A copy of the sample with length * ratio samples, band-limited to the lower of the two rates. A loop is
+# resampled with its continuation, which the level keeps after the loop end: render_frame wraps the positions
+# through the sample's loop before scaling them, so the level is only read up to loop_end * ratio (which needn't
+# be a whole sample) plus the points the interpolation needs past it. Its own loop spans the continuation too,
+# so those are never wrapped back early
+def _resample(sample: Sample, ratio: float, converter_type: str) -> Sample:
+    data = sample.data.astype(np.float32)
+    loop_end = min(sample.loopstart + sample.looplength, len(data))
+    looping = sample.has_loop and loop_end > sample.loopstart
+    if looping:
+        loop = data[sample.loopstart:loop_end]
+        data = np.concatenate([data[:loop_end]] + [loop] * -(-LOOP_PADDING // len(loop)))
+
+    resampled = samplerate.resample(data, ratio, converter_type) if len(data) else data
+    length = len(resampled) if looping else int(round(len(sample.data) * ratio))
+    level = replace(sample, data=np.ascontiguousarray(resampled[:length], dtype=np.float32), pool=None, offset=0)
+    level.length = length
+    level.loopstart = int(sample.loopstart * ratio) if looping else int(round(sample.loopstart * ratio))
+    level.looplength = length - level.loopstart if looping else int(round(sample.looplength * ratio))
+    return level
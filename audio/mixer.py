@@ -1,56 +1,187 @@
-from multiprocessing import shared_memory, Queue
+from multiprocessing import shared_memory
+from numpy.typing import NDArray
 import numpy as np
+import time
+
+from settings import CHANNELS, PLAYBACK_RATE
+from audio.processing import silence, tick_lengths
+from core.types import BeatPtr, SharedBeatPtr, SharedEnvelopes, SharedSpectrum, RingBuffer
+from core.timeline import Timeline
+from core.probes import probe
+from audio.spectrum import SpectrumAnalyser
+
+
+# Mixes the channel block straight into the player's ring buffer. It lives for the whole playback, attaching to the
+# shared memory once (in the process that first runs it) and reusing its buffers, so mixing allocates nothing.
+# The block is allocated for the longest row of the timeline and every row only mixes as many samples as it lasts.
+# With envelopes it also publishes every tick's minimum, maximum and RMS per channel for the visualizer, and with
+# spectrum the analysis of every tick of the channels and the mix (see SpectrumAnalyser)
+class Mixer:
+    def __init__(self, shm_name: str, output_ring: RingBuffer, beat_ptr: SharedBeatPtr, timeline: Timeline,
+                 channel_count: int, envelopes: SharedEnvelopes = None, spectrum: SharedSpectrum = None):
+        self.shm_name = shm_name
+        self.output_ring = output_ring
+        self.beat_ptr = beat_ptr
+        self.timeline = timeline
+        self.channel_count = channel_count
+        self.envelopes = envelopes
+        self.spectrum = spectrum
+
+        # the average of the selected channels as one weighted sum, unselected channels get a weight of 0
+        channels = selected_channels(channel_count)
+        self._weights = np.zeros(channel_count, dtype=np.float32)
+        self._weights[channels] = 1 / len(channels)
+        # 0-d arrays, because ufuncs box plain scalars into new arrays on every call
+        self._floor = np.array(-1.0, dtype=np.float32)
+        self._ceiling = np.array(1.0, dtype=np.float32)
+
+        self._shm = None
+        self._channel_buffers = None
+        self._mix_buffer = None
+        self._row_frames = None     # length of every row of the timeline as a list, indexing a list allocates nothing
+        self._row_ticks = None
+        self._row_orders = None     # and its position in the song, to publish the next row from
+        self._row_notes = None
+        self._position = BeatPtr()  # the row being mixed, loaded into
+        self._next_position = BeatPtr()     # the row published after it, filled in
+        self._views = {}    # (channel block, mix buffer) views for every row length that was mixed
+        self._ticks = {}    # (tick starts, tick lengths) for every row length and speed that was published
+        self._squares = None    # the channel block squared, for the RMS of the envelopes
+        self._analyser = None
+        self._probes = None     # mix, handoff, tick and envelopes of the process the mixer runs in
+
+    def attach(self):
+        if self._shm is not None:
+            return
+        self._shm = shared_memory.SharedMemory(name=self.shm_name)
+        max_frames = self.timeline.max_frames
+        self._channel_buffers = np.ndarray((self.channel_count * max_frames,), dtype=np.float32, buffer=self._shm.buf)
+        self._mix_buffer = silence(max_frames)
+        self._row_frames = self.timeline.rows["frames"].tolist()
+        self._row_ticks = self.timeline.rows["ticks"].tolist()
+        self._row_orders = self.timeline.rows["order_idx"].tolist()
+        self._row_notes = self.timeline.rows["note_idx"].tolist()
+        if self.envelopes is not None:
+            self._squares = silence(self.channel_count * max_frames)
+        if self.spectrum is not None:
+            self._analyser = SpectrumAnalyser(self.spectrum, max_frames, max(self._row_ticks))
+        self._probes = probe("mix"), probe("handoff"), probe("tick"), probe("envelopes")
+
+    # Averages the first frames samples of the selected channels (all of them by default) into out, by default
+    # a buffer that is overwritten by the next call
+    def mix(self, frames: int = None, out: NDArray[np.float32] = None) -> NDArray[np.float32]:
+        self.attach()
+        channel_buffers, mix_buffer = self._row_views(frames)
+        if out is not None:
+            mix_buffer = out[:len(mix_buffer)]
+        np.dot(self._weights, channel_buffers, out=mix_buffer)
+        # for good measure (np.clip itself allocates a few small objects per call)
+        np.minimum(mix_buffer, self._ceiling, out=mix_buffer)
+        np.maximum(mix_buffer, self._floor, out=mix_buffer)
+        return mix_buffer
+
+    # The barrier action: mix into the next free slot of the player's ring buffer and move on to the next row.
+    # A tick lasts from publishing a row to having it mixed, without the wait for the player, and misses
+    # its deadline if that takes longer than the row plays
+    def __call__(self):
+        # Pass the result to the player. If it hasn't made room within a second the tick is dropped
+        self.attach()
+        mix_probe, handoff_probe, tick_probe, envelopes_probe = self._probes
+        published = self.beat_ptr.published_ns
+        rendered = (time.perf_counter_ns() - published) / 1e9
+        current_row = self.beat_ptr.load_into(self._position).row_idx
+        frames = self._row_frames[current_row]
+        handoff_probe.start()
+        slot = self.output_ring.write_slot(timeout=1)
+        handoff_probe.stop()
+        if slot is not None:
+            mix_probe.start()
+            self.mix(frames, out=slot)
+            self.output_ring.commit(frames)
+            mixed = mix_probe.stop()
+            if published:   # not the initial position, which was published before any channel started
+                tick_probe.record(rendered + mixed, frames / PLAYBACK_RATE)
+            if self._analyser is not None:
+                self._analyser(self._row_views(frames)[0], slot[:frames],
+                               *self._tick_bounds(frames, self._row_ticks[current_row]))
+        if self.envelopes is not None:
+            envelopes_probe.start()
+            self.publish_envelopes(frames, self._row_ticks[current_row])
+            envelopes_probe.stop()
+
+        # Move on to the next row of the timeline, or to a requested seek, and publish it to the channels
+        row_idx = self.beat_ptr.take_seek()
+        if row_idx is None:
+            row_idx = self.timeline.next_row(current_row)
+        position = self._next_position
+        position.pattern_idx, position.note_idx, position.row_idx = \
+            self._row_orders[row_idx], self._row_notes[row_idx], row_idx
+        self.beat_ptr.publish(position)
+
+    # Publishes the minimum, maximum and RMS of every tick of every channel of the block, the first frames samples
+    # of which hold a row of ticks ticks
+    def publish_envelopes(self, frames: int, ticks: int):
+        channel_buffers, _ = self._row_views(frames)
+        starts, lengths = self._tick_bounds(frames, ticks)
+        squares = self._squares[:channel_buffers.size].reshape(channel_buffers.shape)
+        np.multiply(channel_buffers, channel_buffers, out=squares)
+        rms = np.add.reduceat(squares, starts, axis=1)
+        rms /= lengths
+        envelopes = np.stack((np.minimum.reduceat(channel_buffers, starts, axis=1),
+                              np.maximum.reduceat(channel_buffers, starts, axis=1), np.sqrt(rms, out=rms)))
+        self.envelopes.publish(envelopes.transpose(2, 0, 1))
+
+    # where the ticks of a row start in it and how long they are, made once per row length and speed
+    def _tick_bounds(self, frames: int, ticks: int) -> tuple[NDArray[np.int64], NDArray[np.float32]]:
+        bounds = self._ticks.get((frames, ticks))
+        if bounds is None:
+            lengths = tick_lengths(frames, ticks)
+            bounds = self._ticks[frames, ticks] = np.cumsum(lengths) - lengths, lengths.astype(np.float32)
+        return bounds
+
+    # the channel block and the mix buffer of a row length, made once per length
+    def _row_views(self, frames: int = None) -> tuple[NDArray[np.float32], NDArray[np.float32]]:
+        views = self._views.get(frames)
+        if views is None:
+            length = frames or len(self._mix_buffer)
+            views = self._views[frames] = channel_block(self._channel_buffers, self.channel_count, length), self._mix_buffer[:length]
+        return views
+
+    def close(self):
+        if self._shm is None:
+            return
+        self._views = {}
+        self._channel_buffers = None
+        self._shm.close()
+        self._shm = None
+
+    # every process attaches on its own
+    def __getstate__(self):
+        return self.__dict__ | {"_shm": None, "_channel_buffers": None, "_mix_buffer": None, "_row_frames": None,
+                                "_row_ticks": None, "_row_orders": None, "_row_notes": None, "_views": {}, "_ticks": {},
+                                "_squares": None, "_analyser": None, "_probes": None}
+
+
+# the channels of a song the settings select to play, all of them if CHANNELS is None. Raises ValueError if it
+# selects none of them, there would be nothing to mix
+def selected_channels(channel_count: int) -> list[int]:
+    if CHANNELS is None:
+        return list(range(channel_count))
+    channels = [i for i in CHANNELS if 0 <= i < channel_count]
+    if not channels:
+        raise ValueError(f"none of the CHANNELS {CHANNELS} are in a {channel_count} channel song")
+    return channels
+
+
+# The (channels, frames) block of a row in the channel arena. The channels of a row are packed one after the other
+# from the start of the arena, so the block stays contiguous (and mixes without a copy) at every row length
+def channel_block(arena: NDArray[np.float32], channel_count: int, frames: int) -> NDArray[np.float32]:
+    return arena[:channel_count * frames].reshape(channel_count, frames)
+
+
+# Same as Mixer.mix for a (selected channels, frames) block owned by the caller, into a new buffer
+def mix_frames(frames: NDArray[np.float32]) -> NDArray[np.float32]:
+    mix_buffer = frames.sum(axis=0)
+    mix_buffer /= len(frames)
+    return np.clip(mix_buffer, -1.0, 1.0, out=mix_buffer)
 
-from settings import CHANNELS
-from core.constants import BUFFER_SIZE, MAX_NOTE_COUNT
-from audio.processing import silence
-from core.types import BeatPtr
-
-
-# Mixes channels and passes them to the player
-def mix(shm_names: shared_memory, output_queue: Queue, beat_ptr: dict, song_length: int, repeat_idx: int):
-    # Create a numpy array view on the shared memory buffer
-    shm_buffer = []
-    for name in shm_names:
-        shm = shared_memory.SharedMemory(name=name)
-        shm_buffer.append(shm)
-
-    # Clear workspace
-    mix_buffer = silence(BUFFER_SIZE)
-
-    # Mix
-    for i in CHANNELS:
-        if 0 <= i <= 3:
-            np_buffer = np.ndarray((BUFFER_SIZE,), dtype=np.float32, buffer=shm_buffer[i].buf)
-            mix_buffer += np_buffer
-
-    # Average
-    mix_buffer /= len(CHANNELS)
-    mix_buffer = np.clip(mix_buffer, -1.0, 1.0)     # for good measure
-
-    # Pass the result to the player
-    output_queue.put(mix_buffer.tobytes(), timeout=1)
-
-    # Increment the position in the song
-    increment_beat_ptr(beat_ptr, song_length, repeat_idx)
-
-
-def increment_beat_ptr(beat_ptr: dict, song_length: int, repeat_idx: int):
-    # Increment note
-    new_note = beat_ptr["note_idx"] + 1
-    if new_note < MAX_NOTE_COUNT:
-        # Still in bounds
-        beat_ptr["note_idx"] = new_note
-    else:
-        # Reset note
-        beat_ptr["note_idx"] = 0
-
-        # Increment pattern
-        new_pattern = beat_ptr["pattern_idx"] + 1
-        if new_pattern < song_length and new_pattern < repeat_idx:
-            # Still in bounds
-            beat_ptr["pattern_idx"] = new_pattern
-        else:
-            # Completely reset
-            beat_ptr["note_idx"] = 0
-            beat_ptr["pattern_idx"] = 0
\ No newline at end of file
@@ -0,0 +1,144 @@
+from __future__ import annotations
+from dataclasses import dataclass
+from typing import BinaryIO, Iterator
+from numpy.typing import NDArray
+import numpy as np
+import tracemalloc
+import time
+import wave
+import sys
+
+try:
+    import resource     # Unix only
+except ImportError:
+    resource = None
+
+from settings import PLAYBACK_RATE
+from core.file import ModFile
+from core.timeline import Timeline
+from audio.engine import Engine
+from audio.mixer import mix_frames
+
+OUTPUT_FORMATS = ['wav', 'f32', 's16']     # 16-bit WAV, raw float32 PCM, raw int16 PCM
+
+
+@dataclass
+class RenderStats:
+    audio_seconds: float  # length of the rendered audio
+    wall_seconds: float  # time it took to render it, untraced
+    peak_rss: int | None  # peak resident memory of the process so far in bytes (None where it can't be read)
+    traced_peak: int | None = None  # peak memory allocated by a traced pass of the render in bytes, if asked for
+
+    @property
+    def realtime_factor(self) -> float:
+        return self.audio_seconds / self.wall_seconds if self.wall_seconds > 0 else float("inf")
+
+    def __str__(self):
+        return (f"{self.audio_seconds:.1f} s of audio in {self.wall_seconds:.2f} s "
+                f"({self.realtime_factor:.1f}x realtime)" + memory_summary(self.peak_rss, self.traced_peak))
+
+
+# the peak memory figures that are known, for the reports
+def memory_summary(peak_rss: int | None, traced_peak: int | None) -> str:
+    summary = ""
+    if peak_rss is not None:
+        summary += f", peak RSS {peak_rss / 2**20:.1f} MiB"
+    if traced_peak is not None:
+        summary += f", peak render allocations {traced_peak / 2**20:.1f} MiB"
+    return summary
+
+
+# The high-water mark of the process's resident memory in bytes, or None without the resource module
+def peak_rss() -> int | None:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024     # in KiB except on macOS
+
+
+# Runs the channel and mixer logic in a single process without any pacing, yielding mixed frames
+# for one pass through the song's timeline (or until max_seconds of audio have been rendered)
+def render_song(song: ModFile, max_seconds: float = None) -> Iterator[NDArray[np.float32]]:
+    timeline = Timeline.compile(song)
+    renderer = Engine(song, timeline)
+    rendered = 0.0
+    for row_idx in range(len(timeline)):
+        if max_seconds is not None and rendered >= max_seconds:
+            return
+        mix_buffer = mix_frames(renderer.render(timeline.position(row_idx))[renderer.channels])
+        rendered += len(mix_buffer) / PLAYBACK_RATE
+        yield mix_buffer
+
+
+# Renders a song to a file as fast as possible and reports how long it took. Tracing allocations slows rendering
+# down several times, so the render is timed untraced and trace_memory measures the peak allocations in a second,
+# traced pass that discards its frames. Raises TimeoutError if rendering takes longer than timeout seconds
+def render_to_file(song: ModFile, output_path: str, output_format: str = 'wav', max_seconds: float = None,
+                   timeout: float = None, trace_memory: bool = False) -> RenderStats:
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"unknown output format '{output_format}', choose from {OUTPUT_FORMATS}")
+
+    start = time.perf_counter()
+    sample_count = 0
+    with open(output_path, "wb") as f:
+        writer = FrameWriter(f, output_format)
+        try:
+            for frame in render_song(song, max_seconds):
+                writer.write(frame)
+                sample_count += len(frame)
+                if timeout is not None and time.perf_counter() - start > timeout:
+                    raise TimeoutError(f"rendering took longer than {timeout} s")
+        finally:
+            writer.close()
+    wall_seconds = time.perf_counter() - start
+
+    stats = RenderStats(sample_count / PLAYBACK_RATE, wall_seconds, peak_rss())
+    if trace_memory:
+        stats.traced_peak = traced_peak(song, max_seconds)
+    return stats
+
+
+# Peak memory allocated while rendering a song (without writing it), traced by tracemalloc
+def traced_peak(song: ModFile, max_seconds: float = None) -> int:
+    tracing = tracemalloc.is_tracing()
+    if not tracing:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    try:
+        for _ in render_song(song, max_seconds):
+            pass
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        if not tracing:
+            tracemalloc.stop()
+
+
+# Appends mixed frames to an output file in one of the OUTPUT_FORMATS
+class FrameWriter:
+    def __init__(self, f: BinaryIO, output_format: str):
+        self._file = f
+        self._format = output_format
+        self._wav = None
+
+        if output_format == 'wav':
+            self._wav = wave.open(f, "wb")
+            self._wav.setnchannels(1)
+            self._wav.setsampwidth(2)
+            self._wav.setframerate(PLAYBACK_RATE)
+
+    def write(self, frame: NDArray[np.float32]):
+        if self._format == 'f32':
+            self._file.write(frame.tobytes())
+        elif self._format == 's16':
+            self._file.write(to_int16(frame).tobytes())
+        else:
+            self._wav.writeframesraw(to_int16(frame).tobytes())
+
+    # finalises the header, the file itself stays open
+    def close(self):
+        if self._wav is not None:
+            self._wav.close()
+
+
+def to_int16(frame: NDArray[np.float32]) -> NDArray[np.int16]:
+    return (frame * 32767).astype(np.int16)
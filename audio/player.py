@@ -1,14 +1,19 @@
-from multiprocessing import Queue
-import queue as BaseQueue
 import pyaudio
+import time
 
-from settings import PLAYBACK_RATE
-from core.utilities import profile
+from settings import PLAYBACK_RATE, DEVICE_BLOCK_SIZE
+from core.types import RingBuffer
+from core.probes import probe, reported
+from audio.jitter import JitterBuffer
+
+PLAYER_MODES = ['callback', 'blocking']     # the sound card pulls from a jitter buffer, or the player pushes each tick
+PLAYER_TIMEOUT = 1.0    # seconds without a tick from the mixer before the callback player gives up
+STARTUP_TIMEOUT = 10.0  # seconds the players wait for the first tick, starting processes with spawn takes a while
 
 
 # Manages the sound settings, playback, creation and destruction of the audio stream
-@profile
-def player(output_queue: Queue):
+@reported("player")
+def player(output_ring: RingBuffer):
     # Initialize pyAudio
     p = pyaudio.PyAudio()
     stream = p.open(format=pyaudio.paFloat32,
@@ -18,17 +23,77 @@ def player(output_queue: Queue):
                     output=True)
 
     # Wait for the beginning of new frame and playback the buffer
+    handoff_probe, write_probe = probe("handoff"), probe("write")
+    timeout = STARTUP_TIMEOUT
     try:
         while True:
+            handoff_probe.start()
+            frame = output_ring.read_slot(timeout=timeout)
+            if timeout != STARTUP_TIMEOUT:    # the first wait is for the processes to start
+                handoff_probe.stop()
+            timeout = 0.1
+
+            # Detect if the mixer stops working
+            if frame is None:
+                print("exiting player,", output_ring)
+                break
+
+            # pyaudio only accepts bytes, so this is the one copy on the way to the device.
+            # The slot goes back to the mixer before the (blocking) write
+            data = frame.tobytes()
+            output_ring.release()
+
             # Playback
-            data = output_queue.get(timeout=0.1)
+            write_probe.start()
             stream.write(data)
+            write_probe.stop()
+
+    finally:
+        output_ring.shutdown()
+
+        # Close the stream and terminate pyAudio
+        stream.stop_stream()
+        stream.close()
+        p.terminate()
+
 
-    # Detect if the mixer stops working
-    except BaseQueue.Empty:
-        print("exiting player")
+# Same as player, but the sound card asks for DEVICE_BLOCK_SIZE samples at a time from its own thread and gets
+# them from a JitterBuffer, which absorbs late ticks from the engine. This thread only watches the stream.
+# Answering the device takes too long if it takes longer than the block plays
+@reported("player")
+def callback_player(output_ring: RingBuffer):
+    jitter_buffer = JitterBuffer(output_ring)
+    write_probe = probe("write")
+
+    def callback(in_data, frame_count, time_info, status):
+        write_probe.start()
+        data = jitter_buffer.read(frame_count).tobytes()
+        write_probe.stop(frame_count / PLAYBACK_RATE)
+        return data, pyaudio.paContinue
+
+    # Initialize pyAudio
+    p = pyaudio.PyAudio()
+    stream = p.open(format=pyaudio.paFloat32,
+                    channels=1,
+                    rate=PLAYBACK_RATE,
+                    input=False,
+                    output=True,
+                    frames_per_buffer=DEVICE_BLOCK_SIZE,
+                    stream_callback=callback)
+
+    try:
+        stream.start_stream()
+
+        # Detect if the mixer stops working
+        while stream.is_active():
+            if jitter_buffer.idle >= (PLAYER_TIMEOUT if jitter_buffer.blocks else STARTUP_TIMEOUT):
+                break
+            time.sleep(0.1)
+        print("exiting player,", jitter_buffer)
 
     finally:
+        output_ring.shutdown()
+
         # Close the stream and terminate pyAudio
         stream.stop_stream()
         stream.close()
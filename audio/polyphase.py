@@ -0,0 +1,58 @@
+from __future__ import annotations
+from numpy.typing import NDArray
+import numpy as np
+
+from core.types import Sample
+from audio.processing import wrap_positions
+
+POLYPHASE_INTERPOLATION = {'polyphase_4': 4, 'polyphase_8': 8, 'polyphase_16': 16, 'polyphase_32': 32}  # mode: taps
+PHASES = 1024   # fractional positions per sample the filters are tabled at, the nearest one is used
+KAISER_BETA = {4: 2.0, 8: 4.0, 16: 6.0, 32: 8.0}    # window shape per tap count, wider for longer filters
+
+
+# Windowed-sinc interpolation filters for every one of PHASES fractional positions between two samples,
+# shaped (PHASES + 1, taps). Row p holds the weights of the samples from index - taps / 2 + 1 to index + taps / 2
+# around a position index + p / PHASES, normalised so a constant stays constant
+class PolyphaseTable:
+    def __init__(self, taps: int):
+        self.taps = taps
+        self.offsets = np.arange(-taps // 2 + 1, taps // 2 + 1)    # of the samples around the position
+
+        distance = self.offsets[None, :] - np.linspace(0.0, 1.0, PHASES + 1)[:, None]
+        window = np.i0(KAISER_BETA[taps] * np.sqrt(np.clip(1 - (2 * distance / taps) ** 2, 0, 1))) / np.i0(KAISER_BETA[taps])
+        filters = np.sinc(distance) * window
+        filters /= filters.sum(axis=1, keepdims=True)
+        self.filters = filters.astype(np.float32)
+
+    # Renders a sample at fractional playback positions, wrapping them through the loop, as one gather of the
+    # samples around every position and one dot product with the filter of its phase. A row's positions hold
+    # every tick's start phase and step, so the whole row takes a single batch
+    def __call__(self, sample: Sample, positions: NDArray[np.float64]) -> NDArray[np.float32]:
+        index = positions.astype(np.int64)
+        phase = ((positions - index) * PHASES + 0.5).astype(np.int64)
+
+        points = (index[:, None] + self.offsets).ravel()
+        before_start = points < 0
+        wrapped, valid = wrap_positions(sample, np.maximum(points, 0))
+        gathered = sample.data[wrapped].astype(np.float32, copy=False)
+        if valid is not None:
+            gathered[~valid] = 0
+        gathered[before_start] = 0
+
+        return np.einsum('ij,ij->i', gathered.reshape(len(positions), self.taps), self.filters[phase])
+
+
+_tables: dict[int, PolyphaseTable] = {}
+
+
+# the table of a mode, made on its first use
+def polyphase_table(interpolation: str) -> PolyphaseTable:
+    taps = POLYPHASE_INTERPOLATION[interpolation]
+    if taps not in _tables:
+        _tables[taps] = PolyphaseTable(taps)
+    return _tables[taps]
+
+
+# One tick of a sample from a start position at a fixed step, count samples long
+def render_tick(sample: Sample, start: float, step: float, count: int, interpolation: str) -> NDArray[np.float32]:
+    return polyphase_table(interpolation)(sample, start + step * np.arange(count, dtype=np.float64))
@@ -1,11 +1,13 @@
+from __future__ import annotations
 from numpy.typing import NDArray
-from copy import deepcopy
+from dataclasses import replace
 import numpy as np
 import samplerate
 
 from settings import PLAYBACK_RATE
-from core.constants import PRIMARY_PERIOD, RECORD_RATE, BUFFER_SIZE, HALF_TONE
-from core.types import Sample, Effect
+from core.constants import PRIMARY_PERIOD, RECORD_RATE, BUFFER_SIZE, HALF_TONE, SAMPLE_PEAK
+from core.types import Sample, Effect, ChannelState
+from audio.effects import TickParams, MAX_VOLUME
 
 
 # ---- generators
@@ -23,13 +25,14 @@ def finetune(val: int) -> float:
 
 
 def transpose(sample: Sample, converter: samplerate.Resampler, target_period: int) -> Sample:
-    # Create an independent copy
-    result = deepcopy(sample)
+    # Create an independent copy, in float32 but still in the range of the 8-bit samples
+    result = replace(sample, data=None, pool=None, offset=0)
 
     scale_factor = target_period / (PRIMARY_PERIOD * RECORD_RATE/PLAYBACK_RATE * finetune(sample.finetune))
 
-    # Transpose the sample and update its attributes
-    result.data = converter.process(sample.data, ratio=scale_factor)
+    # Transpose the sample and update its attributes, without carrying over the converter state of the previous note
+    converter.reset()
+    result.data = converter.process(sample.data.astype(np.float32), ratio=scale_factor, end_of_input=True)
 
     transform_ratio = len(result.data) / len(sample.data)
     result.length = int(np.round(len(sample.data) * transform_ratio))
@@ -39,67 +42,193 @@ def transpose(sample: Sample, converter: samplerate.Resampler, target_period: in
     return result
 
 
-def extract_view(sample: Sample, frame_no: int) -> NDArray[np.float32]:
-    # Allocate buffer
-    result = silence(BUFFER_SIZE)
+# ---- voice operations
 
-    if sample.looplength == 0:
-        return result
+# offsets of the output samples within one frame, grown to the longest row rendered so far
+_RAMP = np.arange(BUFFER_SIZE, dtype=np.float64)
 
-    # Handle loop vs non-loop regions
-    if sample.has_loop:
-        loop_region = sample.data[sample.loopstart:sample.loopstart + sample.looplength]
-        total_len = len(sample.data)
-    else:
-        loop_region = None
-        total_len = len(sample.data)
-
-    # Playback position in samples
-    start_sample = frame_no * BUFFER_SIZE
-    end_sample = start_sample + BUFFER_SIZE
-
-    # No loop
-    if loop_region is None:
-        # If start position is past the sample length, just return silence
-        if start_sample >= total_len:
-            return silence(BUFFER_SIZE)
-
-        result[:] = 0
-        slice_end = min(end_sample, total_len)
-        chunk_len = slice_end - start_sample  # always >= 0 now
-        if chunk_len > 0:
-            result[:chunk_len] = sample.data[start_sample:slice_end]
-        return result
-
-    # Loop exists
-    result[:] = 0
-    pos = start_sample
-    out_pos = 0
-
-    while out_pos < BUFFER_SIZE:
-        if pos < sample.loopstart:
-            # Before loop starts
-            chunk_end = min(sample.loopstart, pos + BUFFER_SIZE - out_pos)
-            chunk_len = chunk_end - pos
-            result[out_pos:out_pos + chunk_len] = sample.data[pos:pos + chunk_len]
-            pos += chunk_len
-            out_pos += chunk_len
-        else:
-            # Inside loop
-            loop_offset = (pos - sample.loopstart) % sample.looplength
-            chunk_len = min(sample.looplength - loop_offset, BUFFER_SIZE - out_pos)
-            result[out_pos:out_pos + chunk_len] = loop_region[loop_offset:loop_offset + chunk_len]
-            pos += chunk_len
-            out_pos += chunk_len
 
-    return result
+def _ramp(frames: int) -> NDArray[np.float64]:
+    global _RAMP
+    if frames > len(_RAMP):
+        _RAMP = np.arange(frames, dtype=np.float64)
+    return _RAMP[:frames]
+
+
+# no of source samples the playback position advances per output sample at a given period
+def playback_step(sample: Sample, period: int) -> float:
+    return PRIMARY_PERIOD * RECORD_RATE / PLAYBACK_RATE * finetune(sample.finetune) / period
+
+
+# the loop of a sample as (start, end) clipped to its data, or None if it doesn't loop
+def _loop_region(sample: Sample) -> tuple[int, int] | None:
+    loop_end = min(sample.loopstart + sample.looplength, len(sample.data))
+    if not sample.has_loop or loop_end <= sample.loopstart:
+        return None
+    return sample.loopstart, loop_end
+
+
+# maps integer playback positions onto indices of the sample data, wrapping them into the loop. They only
+# grow within a row but a retrigger starts them over, so the last one isn't always the furthest.
+# Also returns a mask of the positions that are still inside the sample (None if all of them are)
+def wrap_positions(sample: Sample, positions: NDArray[np.int64]) -> tuple[NDArray[np.int64], NDArray[np.bool_] | None]:
+    loop = _loop_region(sample)
+    if loop is not None:
+        loop_start, loop_end = loop
+        if positions.max() < loop_end:
+            return positions, None
+        looped = loop_start + (positions - loop_start) % (loop_end - loop_start)
+        return np.where(positions < loop_end, positions, looped), None
+
+    if positions.max() < len(sample.data):
+        return positions, None
+    valid = positions < len(sample.data)
+    return np.where(valid, positions, 0), valid
+
+
+# Folds fractional playback positions back into the loop of the sample, exactly, for reading them from a copy
+# of the sample at another rate (where the loop needn't span a whole no of samples)
+def fold_positions(sample: Sample, positions: NDArray[np.float64]) -> NDArray[np.float64]:
+    loop = _loop_region(sample)
+    if loop is None or positions.max() < loop[1]:
+        return positions
+    loop_start, loop_end = loop
+    return np.where(positions < loop_end, positions, loop_start + (positions - loop_start) % (loop_end - loop_start))
+
+
+# moves a playback position forward, keeping it inside the loop so it stays small
+def advance_position(sample: Sample, position: float, distance: float) -> float:
+    position += distance
+    loop = _loop_region(sample)
+    if loop is not None and position >= loop[1]:
+        loop_start, loop_end = loop
+        position = loop_start + (position - loop_start) % (loop_end - loop_start)
+    return position
+
 
+# no of output samples in each tick of a row
+def tick_lengths(frames: int, ticks: int) -> NDArray[np.int64]:
+    return np.diff(np.arange(ticks + 1) * frames // ticks)
 
-def apply_effect(data: NDArray[np.float32], effect: Effect) -> NDArray[np.float32]:
-    result = effect(data)
+
+# The current row's effect as per-tick parameters, leaving the channel state as the next row should find it
+def tick_params(channel_state: ChannelState, ticks: int) -> TickParams:
+    params = TickParams.hold(channel_state.current_period, channel_state.volume, ticks)
+    Effect(channel_state.current_effect, *channel_state.current_args)(channel_state, params)
+    return params
+
+
+# playback step of every tick, 0 where the period is
+def tick_steps(sample: Sample, params: TickParams) -> NDArray[np.float64]:
+    steps = np.zeros(len(params.periods))
+    np.divide(playback_step(sample, 1), params.periods, out=steps, where=params.periods > 0)
+    return steps
+
+
+# fractional playback position of every output sample of a row, restarting from 0 on retriggered ticks
+def row_positions(position: float, steps: NDArray[np.float64], lengths: NDArray[np.int64],
+                  retrigger: NDArray[np.bool_] = None) -> NDArray[np.float64]:
+    frames = int(lengths.sum())
+    if retrigger is None and steps.min() == steps.max():
+        return position + steps[0] * _ramp(frames)
+
+    per_sample = np.repeat(steps, lengths)
+    offsets = np.cumsum(per_sample)
+    offsets -= per_sample
+    positions = offsets + position
+    if retrigger is not None:
+        for start in np.cumsum(lengths)[:-1][retrigger[1:]]:
+            positions[start:] = offsets[start:] - offsets[start]
+    return positions
+
+
+# the playback position after a row, same as the position that would follow the last one of row_positions
+def row_end(sample: Sample, position: float, steps: NDArray[np.float64], lengths: NDArray[np.int64],
+            retrigger: NDArray[np.bool_] = None) -> float:
+    if retrigger is not None and retrigger.any():
+        first = int(np.flatnonzero(retrigger)[-1])
+        steps, lengths, position = steps[first:], lengths[first:], 0.0
+    if steps.min() == steps.max():
+        distance = steps[0] * int(lengths.sum())
+    else:
+        distance = float(np.dot(steps, lengths))
+    return advance_position(sample, position, distance)
+
+
+# Plays a row into the channel state without rendering it: applies its effect and moves the position on. Most
+# rows have no effect (000) and hold their period, so they move the position in one step without expanding ticks
+def advance_row(channel_state: ChannelState, samplelist: list[Sample], ticks: int, frames: int):
+    params = None
+    if channel_state.current_effect or any(channel_state.current_args):
+        params = tick_params(channel_state, ticks)
+    if channel_state.current_sample is None or channel_state.current_period == 0:
+        return
+    sample = samplelist[channel_state.current_sample]
+    if len(sample.data) == 0:
+        return
+    if params is None:
+        distance = playback_step(sample, 1) / channel_state.current_period * frames
+        channel_state.position = advance_position(sample, channel_state.position, distance)
+    else:
+        channel_state.position = row_end(sample, channel_state.position, tick_steps(sample, params),
+                                         tick_lengths(frames, ticks), params.retrigger)
+
+
+# renders a sample at the given fractional playback positions, wrapping them through the loop.
+# zero_order_hold, linear or cubic (Catmull-Rom over 4 points) interpolation.
+# The result is in the range of the 8-bit sample data, apply_volume scales it down
+def render_voice(sample: Sample, positions: NDArray[np.float64], interpolation: str) -> NDArray[np.float32]:
+    index = positions.astype(np.int64)
+
+    current, valid = wrap_positions(sample, index)
+    result = sample.data[current].astype(np.float32, copy=False)
+
+    if interpolation == 'cubic':
+        fraction = (positions - index).astype(np.float32)
+        before, after, after2 = (_points(sample, np.maximum(index - 1, 0)), _points(sample, index + 1),
+                                 _points(sample, index + 2))
+        c1 = (after - before) * np.float32(0.5)
+        c2 = before - result * np.float32(2.5) + after * np.float32(2) - after2 * np.float32(0.5)
+        c3 = (after2 - before) * np.float32(0.5) + (result - after) * np.float32(1.5)
+        c3 *= fraction
+        c3 += c2
+        c3 *= fraction
+        c3 += c1
+        c3 *= fraction
+        result += c3
+
+    elif interpolation != 'zero_order_hold':
+        following, following_valid = wrap_positions(sample, index + 1)
+        delta = sample.data[following].astype(np.float32, copy=False)
+        if following_valid is not None:
+            delta[~following_valid] = 0
+        delta -= result
+        delta *= (positions - index).astype(np.float32)
+        result += delta
+
+    if valid is not None:
+        result[~valid] = 0
     return result
 
 
+# the sample data at integer positions, wrapped through the loop and 0 past the end
+def _points(sample: Sample, index: NDArray[np.int64]) -> NDArray[np.float32]:
+    wrapped, valid = wrap_positions(sample, index)
+    points = sample.data[wrapped].astype(np.float32, copy=False)
+    if valid is not None:
+        points[~valid] = 0
+    return points
+
+
+# scales a rendered row from the 8-bit range down to -1 - 1 and by the volume of each tick, in place
+def apply_volume(data: NDArray[np.float32], volumes: NDArray[np.float64], lengths: NDArray[np.int64]):
+    if volumes.min() == volumes.max():
+        data *= np.float32(volumes[0] / (MAX_VOLUME * SAMPLE_PEAK))
+    else:
+        data *= np.repeat((volumes / (MAX_VOLUME * SAMPLE_PEAK)).astype(np.float32), lengths)
+    return data
+
+
 def apply_edge_fade(samples, fade_len=128):
     # half of a hann window
     fade_in = np.sin(np.linspace(0, np.pi / 2, fade_len))**2
@@ -1,22 +1,67 @@
+from __future__ import annotations
 from numpy.typing import NDArray
 import numpy as np
 import samplerate
 
-from audio.processing import silence, transpose, extract_view, apply_effect, apply_edge_fade
+from settings import INTERPOLATION
+from audio.processing import silence, tick_lengths, tick_params, tick_steps, row_positions, row_end, render_voice, \
+    apply_volume, fold_positions
+from audio.cache import TransposeCache
+from audio.mipmap import Mipmaps, MIPMAP_INTERPOLATION
+from audio.polyphase import polyphase_table, POLYPHASE_INTERPOLATION
 from core.types import ChannelState, Sample
-from core.constants import BUFFER_SIZE
+
+INTERPOLATION_MODES = ['zero_order_hold', 'linear', 'sinc_fastest', 'sinc_medium', 'sinc_best', 'mipmap_linear',
+                       'mipmap_cubic', 'polyphase_4', 'polyphase_8', 'polyphase_16', 'polyphase_32']
+# interpolation modes the voice computes directly from the sample data, the polyphase modes do too with their own
+# filters, the rest need a resampled copy
+STREAMING_INTERPOLATION = ['zero_order_hold', 'linear']
 
 
 # ---- the note renderer
-def render_frame(channel_state: ChannelState, converter: samplerate.Resampler, samplelist: list[Sample]) -> NDArray[np.float32]:
-    if channel_state.current_sample is None:
-        return silence(BUFFER_SIZE)
+# Renders one row of a channel, frames samples long. The row's effect is expanded into per-tick periods and volumes first,
+# which become a single array of playback positions and gains for the whole row. The cache is what channel_cache
+# gives the channel for the interpolation mode
+def render_frame(channel_state: ChannelState, cache: TransposeCache | Mipmaps | None, samplelist: list[Sample],
+                 ticks: int, frames: int, interpolation: str = INTERPOLATION) -> NDArray[np.float32]:
+    params = tick_params(channel_state, ticks)
+    if channel_state.current_sample is None or channel_state.current_period == 0:
+        return silence(frames)
 
     sample = samplelist[channel_state.current_sample]
+    if len(sample.data) == 0:
+        return silence(frames)
+
+    lengths = tick_lengths(frames, ticks)
+    steps = tick_steps(sample, params)
+    positions = row_positions(channel_state.position, steps, lengths, params.retrigger)
+    if interpolation in STREAMING_INTERPOLATION:
+        dynamic_sample = render_voice(sample, positions, interpolation)
+    elif interpolation in MIPMAP_INTERPOLATION:
+        # the level that doesn't alias at the fastest the note plays within the row. The positions are wrapped
+        # through the sample's own loop first, which keeps its exact length (and pitch) at every level
+        level, ratio = cache.level(channel_state.current_sample, steps.max())
+        positions = fold_positions(sample, positions) * ratio
+        dynamic_sample = render_voice(level, positions, MIPMAP_INTERPOLATION[interpolation])
+    elif interpolation in POLYPHASE_INTERPOLATION:
+        dynamic_sample = polyphase_table(interpolation)(sample, positions)
+    else:
+        # stream the band-limited copy made for the note's period at its own rate, slides and vibrato move
+        # through it proportionally
+        transposed = cache.get(samplelist, channel_state.current_sample, channel_state.note_period)
+        positions *= len(transposed.data) / len(sample.data)
+        dynamic_sample = render_voice(transposed, positions, 'linear')
+
+    channel_state.position = row_end(sample, channel_state.position, steps, lengths, params.retrigger)
+    return apply_volume(dynamic_sample, params.volumes, lengths)
 
-    dynamic_sample = transpose(sample, converter, channel_state.current_period)
-    dynamic_sample = extract_view(dynamic_sample, channel_state.current_frame)
-    # dynamic_sample = apply_effect(dynamic_sample, channel_state.current_effect)
-    # dynamic_sample = apply_edge_fade(dynamic_sample, fade_len=128)
 
-    return dynamic_sample
+# What render_frame reads resampled copies of the samples from, for one channel: its own TransposeCache in the
+# sinc modes, the song's Mipmaps (the same for every channel) in the mipmap modes and nothing in the others,
+# which read the samples directly
+def channel_cache(interpolation: str, mipmaps: Mipmaps = None) -> TransposeCache | Mipmaps | None:
+    if interpolation in MIPMAP_INTERPOLATION:
+        return mipmaps
+    if interpolation in STREAMING_INTERPOLATION or interpolation in POLYPHASE_INTERPOLATION:
+        return None
+    return TransposeCache(samplerate.Resampler(interpolation))
@@ -0,0 +1,105 @@
+from __future__ import annotations
+from numpy.typing import NDArray
+import numpy as np
+import math
+import time
+
+from settings import PLAYBACK_RATE, SPECTRUM_SIZE, SPECTRUM_BUDGET
+from core.constants import SPECTRUM_BANDS
+from core.types import SharedSpectrum, SPECTRUM_PEAK, SPECTRUM_RMS, SPECTRUM_FIELDS
+from core.probes import probe
+
+
+# Bins of an rFFT of size samples where each of the SPECTRUM_BANDS bands starts, spaced evenly in octaves from
+# the first bin above DC up to the Nyquist frequency but at least a bin wide. Every band runs up to the next one
+def band_starts(size: int = SPECTRUM_SIZE) -> NDArray[np.int64]:
+    starts = []
+    for edge in np.geomspace(1, size // 2 + 1, SPECTRUM_BANDS + 1)[:-1]:
+        starts.append(max(int(round(edge)), starts[-1] + 1 if starts else 1))
+    return np.array(starts)
+
+
+# the lowest frequency of every band in Hz
+def band_frequencies(size: int = SPECTRUM_SIZE) -> NDArray[np.float64]:
+    return band_starts(size) * PLAYBACK_RATE / size
+
+
+# Analyses every tick of the rows the mixer mixes, for the channels and the master bus: the RMS level in every
+# band of a Hann windowed rFFT (of the first size samples of the tick, zero padded if it is shorter), the peak
+# and the RMS, published to a SharedSpectrum. The buffers are allocated up front for the longest row and the
+# windows once per tick length. Analysing may take SPECTRUM_BUDGET of the time the rows play: a row that
+# takes longer than its share makes the analyser skip as many rows as it overran by
+class SpectrumAnalyser:
+    def __init__(self, shared: SharedSpectrum, max_frames: int, max_ticks: int, size: int = SPECTRUM_SIZE,
+                 budget: float = SPECTRUM_BUDGET):
+        self.shared = shared
+        self.size = size
+        self.budget = budget
+        self.skipped = 0    # rows left out to stay within the budget
+
+        sources = shared.channel_count + 1
+        self._sources = np.zeros((sources, max_frames), dtype=np.float32)     # the channels, then the master bus
+        self._squares = np.zeros((sources, max_frames), dtype=np.float32)
+        self._windowed = np.zeros((max_ticks, sources, size), dtype=np.float32)
+        self._spectrum = np.zeros((max_ticks, sources, size // 2 + 1), dtype=np.complex64)
+        self._power = np.zeros((max_ticks, sources, size // 2 + 1), dtype=np.float32)
+        self._results = np.zeros((max_ticks, sources, SPECTRUM_FIELDS), dtype=np.float32)
+        self._band_starts = band_starts(size)
+        self._windows = {}  # (window, band scale) for every tick length
+        self._skip = 0
+        self._probe = probe("spectrum")
+
+    # Analyses a row from its (channels, frames) block and the mix of it, given where its ticks start in it and
+    # how long they are
+    def __call__(self, channels: NDArray[np.float32], master: NDArray[np.float32], starts: NDArray[np.int64],
+                 lengths: NDArray[np.float32]):
+        if self._skip:
+            self._skip -= 1
+            self.skipped += 1
+            return
+        start = time.perf_counter()
+        frames = len(master)
+        sources = self._sources[:, :frames]
+        sources[:-1] = channels
+        sources[-1] = master
+        ticks = len(starts)
+        results = self._results[:ticks]
+
+        # peak and RMS of every tick
+        squares = self._squares[:, :frames]
+        np.multiply(sources, sources, out=squares)
+        rms = np.add.reduceat(squares, starts, axis=1)
+        rms /= lengths
+        results[:, :, SPECTRUM_RMS] = np.sqrt(rms, out=rms).T
+        np.abs(sources, out=squares)
+        results[:, :, SPECTRUM_PEAK] = np.maximum.reduceat(squares, starts, axis=1).T
+
+        # the bands of every tick, all in one rFFT
+        length = min(int(lengths.min()), self.size)
+        window, scale = self._window(length)
+        windowed = self._windowed[:ticks]
+        for tick, tick_start in enumerate(starts.tolist()):
+            np.multiply(sources[:, tick_start:tick_start + length], window, out=windowed[tick, :, :length])
+        windowed[:, :, length:] = 0
+        spectrum = np.fft.rfft(windowed, axis=-1, out=self._spectrum[:ticks])
+        power = np.abs(spectrum, out=self._power[:ticks])
+        np.square(power, out=power)
+        bands = np.add.reduceat(power, self._band_starts, axis=-1)
+        bands *= scale
+        results[:, :, :SPECTRUM_BANDS] = np.sqrt(bands, out=bands)
+
+        self.shared.publish(results)
+        elapsed = time.perf_counter() - start
+        budget = self.budget * frames / PLAYBACK_RATE
+        self._probe.record(elapsed, budget)
+        if elapsed > budget:
+            self._skip = math.ceil(elapsed / budget) - 1
+
+    # The Hann window of a tick length, and what scales the summed power of a band to the RMS level of the
+    # signal within it (Parseval's theorem for the windowed, zero padded tick, counting both halves of the spectrum)
+    def _window(self, length: int) -> tuple[NDArray[np.float32], float]:
+        cached = self._windows.get(length)
+        if cached is None:
+            window = np.hanning(length)
+            cached = self._windows[length] = window.astype(np.float32), 2 / (self.size * np.sum(window ** 2))
+        return cached
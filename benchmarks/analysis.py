@@ -0,0 +1,31 @@
+from glob import glob
+import time
+import sys
+
+from core.file import ModFile
+from core.timeline import Timeline
+from core.analysis import analyze
+
+REPEATS = 20
+
+
+# Time it takes to work out the length and loop point of every given file without rendering it,
+# checked against the full timeline
+def main(filepaths: list[str]):
+    total = 0.0
+    for filepath in filepaths:
+        song = ModFile.open(filepath)
+        start = time.perf_counter()
+        for _ in range(REPEATS):
+            info = analyze(song)
+        elapsed = (time.perf_counter() - start) / REPEATS
+        total += elapsed
+
+        timeline = Timeline.compile(song)
+        assert info.duration == timeline.duration and info.loop_row == timeline.loop_row
+        print(f"{filepath:40s} {elapsed * 1000:6.2f} ms  {info}")
+    print(f"{'total':40s} {total * 1000:6.2f} ms")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:] or sorted(glob("examples/*.mod")))
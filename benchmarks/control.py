@@ -0,0 +1,76 @@
+from multiprocessing import Process, Manager, Barrier
+from dataclasses import asdict
+from functools import partial
+import time
+
+from core.types import BeatPtr, SharedBeatPtr
+from core.constants import CHANNEL_COUNT, MAX_NOTE_COUNT
+
+TICKS = 2000
+SONG_LENGTH = 64
+
+
+# Per-tick control overhead of the channel/mixer loop without any rendering:
+# every channel reads the song position, waits at the barrier and the barrier action advances it.
+# Compares the old Manager dict proxy against the shared memory beat pointer
+
+def _advance_proxy(beat_ptr: dict):
+    new_note = beat_ptr["note_idx"] + 1
+    if new_note < MAX_NOTE_COUNT:
+        beat_ptr["note_idx"] = new_note
+    else:
+        beat_ptr["note_idx"] = 0
+        beat_ptr["pattern_idx"] = (beat_ptr["pattern_idx"] + 1) % SONG_LENGTH
+
+
+def _channel_proxy(beat_ptr: dict, barrier: Barrier):
+    for _ in range(TICKS):
+        _ = beat_ptr["pattern_idx"], beat_ptr["note_idx"]
+        barrier.wait()
+
+
+def _advance_shared(beat_ptr: SharedBeatPtr):
+    position = beat_ptr.load()
+    position.note_idx += 1
+    if position.note_idx == MAX_NOTE_COUNT:
+        position.note_idx = 0
+        position.pattern_idx = (position.pattern_idx + 1) % SONG_LENGTH
+    beat_ptr.publish(position)
+
+
+def _channel_shared(beat_ptr: SharedBeatPtr, barrier: Barrier):
+    for _ in range(TICKS):
+        position = beat_ptr.load()
+        _ = position.pattern_idx, position.note_idx
+        barrier.wait()
+    beat_ptr.close()
+
+
+def _run(target, beat_ptr, action) -> float:
+    barrier = Barrier(CHANNEL_COUNT, action=action)
+    processes = [Process(target=target, args=(beat_ptr, barrier)) for _ in range(CHANNEL_COUNT)]
+    start = time.perf_counter()
+    for p in processes:
+        p.start()
+    for p in processes:
+        p.join()
+    return (time.perf_counter() - start) / TICKS
+
+
+def main():
+    with Manager() as manager:
+        proxy = manager.dict(asdict(BeatPtr()))
+        per_tick = _run(_channel_proxy, proxy, partial(_advance_proxy, proxy))
+        print(f"manager dict proxy:  {per_tick * 1e6:8.1f} us/tick")
+
+    shared = SharedBeatPtr.create(BeatPtr())
+    try:
+        per_tick = _run(_channel_shared, shared, partial(_advance_shared, shared))
+        print(f"shared beat pointer: {per_tick * 1e6:8.1f} us/tick  ({shared.tick} ticks published)")
+    finally:
+        shared.close()
+        shared.unlink()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+import time
+import sys
+
+from settings import INTERPOLATION
+from core.constants import INITIAL_SPEED, BUFFER_SIZE
+from core.types import ChannelState
+from core.file import ModFile
+from audio.mipmap import Mipmaps, MIPMAP_INTERPOLATION
+from audio.renderer import render_frame, channel_cache
+
+ROWS = 2000
+PERIOD = 428    # C-2
+EFFECTS = {     # (effect id, args) of the effects with the most per-tick work, against plain notes
+    "none": (0, (0, 0)),
+    "arpeggio": (0x0, (4, 7)),
+    "slide": (0x1, (2,)),
+    "portamento": (0x3, (4,)),
+    "vibrato": (0x4, (4, 8)),
+    "tremolo": (0x7, (4, 8)),
+    "vol slide": (0xA, (0, 1)),
+    "retrigger": (16 + 0x9, (2,)),
+}
+
+
+# Cost of rendering one row of a channel with each effect, which all go through the per-tick parameters
+def main(filepath: str):
+    song = ModFile.open(filepath)
+    sample_idx = max(range(len(song.samplelist)), key=lambda i: len(song.samplelist[i].data))
+    mipmaps = Mipmaps.build(song.samplelist) if INTERPOLATION in MIPMAP_INTERPOLATION else None
+    cache = channel_cache(INTERPOLATION, mipmaps)
+
+    for name, (effect_id, args) in EFFECTS.items():
+        state = ChannelState(instrument=sample_idx)
+        start = time.perf_counter()
+        for row in range(ROWS):
+            if row % 16 == 0:   # a new note now and then, so slides don't just sit at their limit
+                state.trigger(PERIOD)
+                state.volume = 48
+            state.current_effect, state.current_args = effect_id, args
+            render_frame(state, cache, song.samplelist, INITIAL_SPEED, BUFFER_SIZE)
+        per_row = (time.perf_counter() - start) / ROWS
+        print(f"{name:12s} {per_row * 1e6:8.1f} us/row")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1] if len(sys.argv) > 1 else "examples/monty_on_the_run.mod")
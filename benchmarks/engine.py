@@ -0,0 +1,82 @@
+from multiprocessing import shared_memory
+from threading import Thread, Event
+import time
+import sys
+
+from settings import PLAYBACK_RATE
+from core.types import BeatPtr, SharedBeatPtr, RingBuffer
+from core.timeline import Timeline
+from core.setup import engine_processes, channel_groups
+from core.file import ModFile
+from audio.engine import ENGINE_MODES
+
+DURATION = 5.0  # seconds each engine mode runs
+CHANNEL_COUNTS = [4, 8, 16, 32]
+
+
+# Unpaced tick throughput of the live engine modes, with a thread draining the output ring buffer in place of the player.
+# Returns the time per tick and the rendered audio seconds per second
+def run(song: ModFile, mode: str) -> tuple[float, float]:
+    timeline = Timeline.compile(song)
+    shm = shared_memory.SharedMemory(create=True, size=song.channel_count * timeline.max_frames * 4)
+    output_ring = RingBuffer.create(timeline.max_frames, 2)
+    beat_ptr = SharedBeatPtr.create(BeatPtr())
+
+    stop = Event()
+    samples = [0]
+
+    def drain():
+        while not stop.is_set():
+            frame = output_ring.read_slot(timeout=0.1)
+            if frame is not None:
+                samples[0] += len(frame)
+                output_ring.release()
+
+    drain_thread = Thread(target=drain)
+    drain_thread.start()
+    processes = engine_processes(song, timeline, shm.name, output_ring, beat_ptr, mode)
+    for p in processes:
+        p.start()
+
+    try:
+        time.sleep(1.0)     # warm up
+        first_tick, first_sample, start = beat_ptr.tick, samples[0], time.perf_counter()
+        time.sleep(DURATION)
+        ticks, elapsed = beat_ptr.tick - first_tick, time.perf_counter() - start
+        audio_seconds = (samples[0] - first_sample) / PLAYBACK_RATE
+
+    finally:
+        for p in processes:
+            p.terminate()
+            p.join()
+        stop.set()
+        drain_thread.join()
+        shm.close()
+        shm.unlink()
+        beat_ptr.close()
+        beat_ptr.unlink()
+        output_ring.close()
+        output_ring.unlink()
+
+    return elapsed / ticks, audio_seconds / elapsed
+
+
+# The worker processes the multiprocess engine starts for songs of every channel count: songs with 8 channels
+# or more must share them instead of getting one per channel
+def check_groups():
+    for channel_count in CHANNEL_COUNTS:
+        groups = channel_groups(list(range(channel_count)))
+        print(f"{channel_count:3d} channels: {len(groups)} worker processes")
+        assert channel_count < 8 or len(groups) < channel_count, "every channel got its own process"
+
+
+def main(filepath: str):
+    check_groups()
+    song = ModFile.open(filepath)
+    for mode in ENGINE_MODES:
+        per_tick, realtime = run(song, mode)
+        print(f"{mode:14s} {per_tick * 1e6:8.1f} us/tick  ({realtime:6.1f}x realtime)")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1] if len(sys.argv) > 1 else "examples/monty_on_the_run.mod")
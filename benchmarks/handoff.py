@@ -0,0 +1,74 @@
+from multiprocessing import Process, Queue
+import queue as BaseQueue
+import numpy as np
+import time
+
+from core.constants import BUFFER_SIZE
+from core.types import RingBuffer
+
+FRAMES = 5000
+DEPTH = 2
+
+
+# Cost of passing one mixed tick from the mixer process to the player, without any audio device.
+# Compares the old Queue of pickled bytes against the shared memory ring buffer
+
+def _produce_queue(output_queue: Queue):
+    frame = np.random.uniform(-1, 1, BUFFER_SIZE).astype(np.float32)
+    for _ in range(FRAMES):
+        output_queue.put(frame.tobytes(), timeout=1)
+
+
+def _consume_queue(output_queue: Queue) -> int:
+    received = 0
+    try:
+        while True:
+            data = output_queue.get(timeout=1)
+            received += len(data) // 4
+    except BaseQueue.Empty:
+        return received
+
+
+def _produce_ring(output_ring: RingBuffer):
+    frame = np.random.uniform(-1, 1, BUFFER_SIZE).astype(np.float32)
+    for _ in range(FRAMES):
+        output_ring.put(frame, timeout=1)
+    output_ring.close()
+
+
+def _consume_ring(output_ring: RingBuffer) -> int:
+    received = 0
+    while True:
+        frame = output_ring.read_slot(timeout=1)
+        if frame is None:
+            return received
+        received += len(frame)
+        output_ring.release()
+
+
+def _run(produce, consume, channel) -> float:
+    producer = Process(target=produce, args=(channel,))
+    start = time.perf_counter()
+    producer.start()
+    received = consume(channel)
+    elapsed = time.perf_counter() - start - 1     # minus the timeout that ends the consumer
+    producer.join()
+    assert received == FRAMES * BUFFER_SIZE, f"lost {FRAMES - received // BUFFER_SIZE} frames"
+    return elapsed / FRAMES
+
+
+def main():
+    per_frame = _run(_produce_queue, _consume_queue, Queue(DEPTH))
+    print(f"queue of bytes: {per_frame * 1e6:8.1f} us/tick")
+
+    output_ring = RingBuffer.create(BUFFER_SIZE, DEPTH)
+    try:
+        per_frame = _run(_produce_ring, _consume_ring, output_ring)
+        print(f"ring buffer:    {per_frame * 1e6:8.1f} us/tick  ({output_ring})")
+    finally:
+        output_ring.close()
+        output_ring.unlink()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+import numpy as np
+import time
+
+from core.constants import INITIAL_SPEED, BUFFER_SIZE, SAMPLE_PEAK
+from core.types import ChannelState, Sample
+from audio.mipmap import Mipmaps
+from audio.processing import playback_step
+from audio.renderer import render_frame, channel_cache, INTERPOLATION_MODES
+
+LENGTH = 4096   # samples of the looping test sample
+HARMONICS = 40  # of its sawtooth, the highest close to the sample's Nyquist frequency
+CYCLES = 23     # of the fundamental in the loop
+ROWS = 8
+PERIODS = [856, 428, 214, 113, 57, 28]  # C-1, C-2, C-3 and B-3, then two beyond the ProTracker range
+CHUNK = 1024    # output samples per step of the reference
+
+
+# a looping band-limited sawtooth, quantized to 8 bits like real samples
+def test_sample() -> Sample:
+    t = np.arange(LENGTH) / LENGTH
+    wave = sum(np.sin(2 * np.pi * CYCLES * h * t) / h for h in range(1, HARMONICS + 1))
+    data = np.round(wave / np.abs(wave).max() * 100).astype(np.int8)
+    return Sample("saw", LENGTH, 0, 64, 0, LENGTH, True, data)
+
+
+# The ideal playback of the looping sample from position 0 at a step: its periodic band-limited interpolation,
+# evaluated from its spectrum, without what lies above the output's Nyquist frequency
+def reference(sample: Sample, step: float, count: int) -> np.ndarray:
+    spectrum = np.fft.rfft(sample.data.astype(np.float64))[:LENGTH // 2]     # without the Nyquist bin
+    bins = np.arange(len(spectrum))
+    spectrum[bins >= LENGTH / (2 * step)] = 0
+    spectrum[1:] *= 2
+    result = np.empty(count)
+    for start in range(0, count, CHUNK):
+        positions = np.arange(start, min(start + CHUNK, count)) * step
+        result[start:start + len(positions)] = (np.exp(2j * np.pi * np.outer(positions, bins) / LENGTH)
+                                                @ spectrum).real / LENGTH
+    return result / SAMPLE_PEAK
+
+
+# Signal to noise ratio of every interpolation mode against the ideal playback of a test sample at a range of
+# periods, and the time a channel row takes to render with it
+def main():
+    sample = test_sample()
+    samplelist = [sample]
+    start = time.perf_counter()
+    mipmaps = Mipmaps.build(samplelist)
+    print(f"mipmaps built in {(time.perf_counter() - start) * 1e3:.1f} ms, {mipmaps}")
+
+    print(f"{'SNR dB / us per row':22s}" + "".join(f"{period:>14d}" for period in PERIODS))
+    references = {period: reference(sample, playback_step(sample, period), ROWS * BUFFER_SIZE) for period in PERIODS}
+    for mode in INTERPOLATION_MODES:
+        line = f"{mode:22s}"
+        for period in PERIODS:
+            state = ChannelState(instrument=0)
+            state.trigger(period)
+            state.volume = 64
+            cache = channel_cache(mode, mipmaps)
+            rows = []
+            start = time.perf_counter()
+            for _ in range(ROWS):
+                rows.append(render_frame(state, cache, samplelist, INITIAL_SPEED, BUFFER_SIZE, mode))
+            elapsed = (time.perf_counter() - start) / ROWS
+            error = np.concatenate(rows) - references[period]
+            snr = 10 * np.log10(np.sum(references[period] ** 2) / np.sum(error ** 2))
+            line += f"{snr:7.1f}/{elapsed * 1e6:6.0f}"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
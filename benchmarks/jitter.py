@@ -0,0 +1,89 @@
+from threading import Thread, Event
+import numpy as np
+import time
+
+from settings import PLAYBACK_RATE, DEVICE_BLOCK_SIZE
+from core.constants import BUFFER_SIZE, TICK_RATE
+from core.types import RingBuffer
+from audio.jitter import JitterBuffer
+
+DURATION = 12.0     # seconds of simulated playback
+STALLS = {2.0: 0.1, 4.0: 0.25, 4.5: 0.25}    # engine stalls injected at these points in seconds: stall length
+CALM_PERIOD = 1.0
+
+
+# Drives a JitterBuffer the way a sound card in callback mode would, without any audio device:
+# a fake stream asks for a block every DEVICE_BLOCK_SIZE samples in realtime, while a fake engine that
+# stalls now and then fills the ring buffer. Every sample carries its index, so the output is checked for
+# lost or reordered audio, and the target depth is printed as it adapts
+class FakeStream:
+    def __init__(self, jitter_buffer: JitterBuffer, block_size: int = DEVICE_BLOCK_SIZE):
+        self.jitter_buffer = jitter_buffer
+        self.block_size = block_size
+        self.silent = 0     # samples filled in with silence
+        self.last_index = 0
+        self._stop = Event()
+        self._thread = Thread(target=self._run)
+
+    def start_stream(self):
+        self._thread.start()
+
+    def stop_stream(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        deadline = time.perf_counter()
+        while not self._stop.is_set():
+            block = self.jitter_buffer.read(self.block_size)
+            audio = block[block != 0]
+            self.silent += len(block) - len(audio)
+            if len(audio):
+                expected = np.arange(self.last_index + 1, self.last_index + 1 + len(audio), dtype=np.float32)
+                assert np.array_equal(audio, expected), "samples were lost or reordered"
+                self.last_index = int(audio[-1])
+
+            deadline += self.block_size / PLAYBACK_RATE
+            time.sleep(max(0.0, deadline - time.perf_counter()))
+
+
+def _engine(ring: RingBuffer, stop: Event):
+    start = time.perf_counter()
+    stalls = dict(STALLS)
+    index = 1
+    while not stop.is_set():
+        for at in [at for at in stalls if time.perf_counter() - start >= at]:
+            time.sleep(stalls.pop(at))
+        ring.put(np.arange(index, index + BUFFER_SIZE, dtype=np.float32), timeout=0.5)
+        index += BUFFER_SIZE
+
+
+def main():
+    ring = RingBuffer.create(BUFFER_SIZE, 2)
+    jitter_buffer = JitterBuffer(ring, calm_period=CALM_PERIOD)
+    stream = FakeStream(jitter_buffer)
+    stop = Event()
+    engine = Thread(target=_engine, args=(ring, stop))
+
+    print(f"tick {TICK_RATE * 1000:.0f} ms, device block {DEVICE_BLOCK_SIZE / PLAYBACK_RATE * 1000:.1f} ms, "
+          f"stalls {STALLS}")
+    engine.start()
+    stream.start_stream()
+    try:
+        start = time.perf_counter()
+        while time.perf_counter() - start < DURATION:
+            time.sleep(0.5)
+            print(f"{time.perf_counter() - start:5.1f} s  target {jitter_buffer.target / PLAYBACK_RATE * 1000:5.1f} ms  "
+                  f"{jitter_buffer}")
+    finally:
+        stream.stop_stream()
+        stop.set()
+        engine.join()
+        ring.close()
+        ring.unlink()
+
+    print(f"{stream.last_index} samples played in order, {stream.silent} samples of silence filled in")
+
+
+if __name__ == "__main__":
+    main()
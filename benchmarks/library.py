@@ -0,0 +1,42 @@
+from glob import glob
+import tempfile
+import shutil
+import sys
+import os
+
+from core.library import Library
+
+COPIES = 100    # of every example module in the scanned directory
+CHANGED = 10    # files touched and edited before the last rescans
+
+
+# Times a first scan of a directory of modules, a rescan with nothing changed, a rescan after touching some
+# files (stat changed, contents not) and one after editing them (their song names)
+def main(filepaths: list[str]):
+    with tempfile.TemporaryDirectory() as directory:
+        for i in range(COPIES):
+            for filepath in filepaths:
+                shutil.copyfile(filepath, os.path.join(directory, f"{i:04d}_{os.path.basename(filepath)}"))
+        copies = sorted(glob(os.path.join(directory, "*.mod")))
+
+        library = Library(os.path.join(directory, "library.sqlite"))
+        print(f"{len(copies)} files")
+        print(f"{'first scan':16s}", library.scan([directory]))
+        print(f"{'unchanged':16s}", library.scan([directory]))
+
+        for filepath in copies[:CHANGED]:
+            os.utime(filepath, ns=(0, 0))
+        print(f"{'touched':16s}", library.scan([directory]))
+
+        for filepath in copies[:CHANGED]:
+            with open(filepath, "r+b") as f:
+                f.write(b"edited")
+        print(f"{'edited':16s}", library.scan([directory]))
+
+        found = library.search("edited")
+        library.close()
+        assert len(found) == CHANGED, found
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:] or sorted(glob("examples/*.mod")))
@@ -0,0 +1,93 @@
+from multiprocessing import shared_memory
+import numpy as np
+import tracemalloc
+import time
+
+from core.constants import BUFFER_SIZE, CHANNEL_COUNT
+from core.types import BeatPtr, SharedBeatPtr, RingBuffer
+from core.timeline import Timeline, ROW_DTYPE
+from audio.mixer import Mixer, mix_frames
+
+TICKS = 10000
+CALL_PEAK_LIMIT = 1024  # bytes of small objects (numpy scalars, slot views) a tick may make, far below a frame
+
+
+# Peak traced memory of 10 calls, after a few rounds of warm up (the measurement itself allocates a constant amount)
+def _allocated(func) -> int:
+    tracemalloc.start()
+    try:
+        for _ in range(3):
+            tracemalloc.reset_peak()
+            before, _ = tracemalloc.get_traced_memory()
+            func(); func(); func(); func(); func(); func(); func(); func(); func(); func()
+            _, peak = tracemalloc.get_traced_memory()
+        return peak - before
+    finally:
+        tracemalloc.stop()
+
+
+# Traced memory still held after 100 calls, after a round of warm up
+def _retained(func) -> int:
+    func()
+    tracemalloc.start()
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        for _ in range(100):
+            func()
+        after, _ = tracemalloc.get_traced_memory()
+        return after - before
+    finally:
+        tracemalloc.stop()
+
+
+# Cost of mixing one tick and a check that the persistent mixer doesn't allocate in steady state, for a full
+# length row and a shorter one (a faster speed or tempo). The whole tick the barrier runs (loading the row, the
+# handoff to the ring buffer and publishing the next row) only makes a few small objects, and keeps none
+def main():
+    shm = shared_memory.SharedMemory(create=True, size=CHANNEL_COUNT * BUFFER_SIZE * 4)
+    beat_ptr = SharedBeatPtr.create(BeatPtr())
+    channel_buffers = np.ndarray((CHANNEL_COUNT, BUFFER_SIZE), dtype=np.float32, buffer=shm.buf)   # a full length row
+    channel_buffers[:] = np.random.uniform(-1, 1, channel_buffers.shape)
+    output_ring = RingBuffer.create(BUFFER_SIZE, 2)
+    rows = np.zeros(2, dtype=ROW_DTYPE)
+    rows["frames"] = BUFFER_SIZE, BUFFER_SIZE * 2 // 3
+    mixer = Mixer(shm.name, output_ring, beat_ptr, Timeline(rows, 0), CHANNEL_COUNT)
+    short_row = int(rows["frames"][1])
+
+    try:
+        mixer.mix()     # attach and allocate the buffers
+        mixer.mix(short_row)
+        for frames in [None, short_row]:
+            allocated = _allocated(lambda: mixer.mix(frames)) - _allocated(lambda: None)
+            print(f"Mixer.mix allocations in steady state ({frames or BUFFER_SIZE} samples): {allocated} bytes")
+            assert allocated == 0, "steady state mixing allocated memory"
+
+        def tick():     # the barrier action over both row lengths in turn, with the player side draining the ring
+            mixer()
+            output_ring.read_slot(timeout=0)
+            output_ring.release()
+        peak = _allocated(tick) - _allocated(lambda: None)
+        retained = _retained(tick)
+        print(f"Mixer.__call__ peak allocations per tick: {peak} bytes, kept: {retained} bytes")
+        assert peak <= CALL_PEAK_LIMIT, "a tick allocated more than a few small objects"
+        assert retained == 0, "ticks kept allocated memory"
+
+        for name, mix in [("Mixer.mix", mixer.mix), ("mix_frames", lambda: mix_frames(channel_buffers))]:
+            start = time.perf_counter()
+            for _ in range(TICKS):
+                mix()
+            print(f"{name:12s} {(time.perf_counter() - start) / TICKS * 1e6:6.1f} us/tick")
+
+    finally:
+        mixer.close()
+        del channel_buffers
+        shm.close()
+        shm.unlink()
+        beat_ptr.close()
+        beat_ptr.unlink()
+        output_ring.close()
+        output_ring.unlink()
+
+
+if __name__ == "__main__":
+    main()
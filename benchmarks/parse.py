@@ -0,0 +1,36 @@
+from glob import glob
+import time
+import sys
+
+from core.file import ModFile
+
+REPEATS = 20
+# a metadata only open, a full open, and a full open followed by decoding the patterns, which happens lazily on
+# their first use
+MODES = {
+    "metadata": lambda filepath: ModFile.open(filepath, metadata_only=True),
+    "open": lambda filepath: ModFile.open(filepath),
+    "+patterns": lambda filepath: ModFile.open(filepath).patterns,
+}
+
+
+# Times the ways of opening every given file (defaults to the bundled examples)
+def main(filepaths: list[str]):
+    modes = MODES
+    totals = dict.fromkeys(modes, 0.0)
+    print(f"{'':40s}" + "".join(f"{mode:>12s}" for mode in modes))
+    for filepath in filepaths:
+        line = f"{filepath:40s}"
+        for mode, load in modes.items():
+            start = time.perf_counter()
+            for _ in range(REPEATS):
+                load(filepath)
+            elapsed = (time.perf_counter() - start) / REPEATS
+            totals[mode] += elapsed
+            line += f"{elapsed * 1000:9.2f} ms"
+        print(line)
+    print(f"{'total':40s}" + "".join(f"{total * 1000:9.2f} ms" for total in totals.values()))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:] or sorted(glob("examples/*.mod")))
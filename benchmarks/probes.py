@@ -0,0 +1,26 @@
+import time
+
+from core.probes import Probe, NullProbe
+
+CALLS = 1_000_000
+
+
+# Cost of timing a stage with a probe, and with the stand-in that replaces every probe while PROBES is off
+def main():
+    for name, probe in [("disabled", NullProbe()), ("enabled", Probe("stage"))]:
+        start = time.perf_counter()
+        for _ in range(CALLS):
+            probe.start()
+            probe.stop(1.0)
+        print(f"{name:10s} {(time.perf_counter() - start) / CALLS * 1e9:6.0f} ns per start/stop")
+
+    probe = Probe("stage")
+    for i in range(CALLS):
+        probe.record(i / CALLS, 0.99)
+    start = time.perf_counter()
+    summary = probe.summary()
+    print(f"summary    {(time.perf_counter() - start) * 1e6:6.0f} us ({summary['misses']} misses)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+import multiprocessing
+import resource
+import pickle
+import time
+import sys
+
+from core.types import SamplePool
+from core.file import ModFile
+
+WORKERS = [1, 4, 8]     # no of processes to start at once
+
+
+def _worker(song: ModFile, queue: multiprocessing.Queue):
+    queue.put((time.perf_counter(), resource.getrusage(resource.RUSAGE_SELF).ru_maxrss))
+
+
+# Time until all the workers have received the song and their average peak memory, when they are started with spawn
+def start_workers(song: ModFile, count: int) -> tuple[float, float]:
+    context = multiprocessing.get_context('spawn')
+    queue = context.Queue()
+    start = time.perf_counter()
+    processes = [context.Process(target=_worker, args=(song, queue)) for _ in range(count)]
+    for p in processes:
+        p.start()
+    results = [queue.get() for _ in processes]
+    for p in processes:
+        p.join()
+    return max(ready for ready, _ in results) - start, sum(rss for _, rss in results) / count / 2**10
+
+
+# What every process receives with the song, with the sample data copied into it and with the data in a shared pool
+def main(filepath: str):
+    song = ModFile.open(filepath)
+    sample_bytes = sum(len(sample.data) for sample in song.samplelist)
+    print(f"{filepath}: {sample_bytes / 2**10:.0f} KiB of samples "
+          f"({sample_bytes * 4 / 2**10:.0f} KiB as float32)")
+
+    for shared in [False, True]:
+        song = ModFile.open(filepath)
+        pool = SamplePool.create(song.samplelist) if shared else None
+        try:
+            label = "shared pool" if shared else "copied"
+            print(f"{label:12s} pickled song {len(pickle.dumps(song)) / 2**10:6.0f} KiB")
+            for count in WORKERS:
+                elapsed, rss = start_workers(song, count)
+                print(f"{label:12s} {count} workers ready in {elapsed * 1000:6.0f} ms, {rss:6.1f} MiB peak each")
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.unlink()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1] if len(sys.argv) > 1 else "examples/monty_on_the_run.mod")
@@ -0,0 +1,62 @@
+import numpy as np
+import time
+
+from settings import PLAYBACK_RATE, SPECTRUM_SIZE
+from core.constants import BUFFER_SIZE, INITIAL_SPEED
+from core.types import SharedSpectrum, SPECTRUM_PEAK, SPECTRUM_RMS, SPECTRUM_HISTORY, SPECTRUM_FIELDS
+from audio.processing import tick_lengths
+from audio.spectrum import SpectrumAnalyser, band_frequencies
+
+CHANNEL_COUNTS = [4, 8, 16, 32]
+SIZES = [256, 1024, 4096]
+ROWS = 500
+FREQUENCY = 1000    # Hz of the test tone
+AMPLITUDE = 0.5
+
+
+# The levels the analyser reports for a sine on every channel, next to the exact ones, then the cost of
+# analysing a row for a range of channel counts and rFFT sizes without the budget
+def main():
+    lengths = tick_lengths(BUFFER_SIZE, INITIAL_SPEED)
+    starts, lengths = np.cumsum(lengths) - lengths, lengths.astype(np.float32)
+    frequencies = band_frequencies(SPECTRUM_SIZE)
+
+    spectrum = SharedSpectrum.create(4)
+    try:
+        analyser = SpectrumAnalyser(spectrum, BUFFER_SIZE, INITIAL_SPEED, SPECTRUM_SIZE)
+        tone = (AMPLITUDE * np.sin(2 * np.pi * FREQUENCY * np.arange(BUFFER_SIZE) / PLAYBACK_RATE)).astype(np.float32)
+        analyser(np.tile(tone, (4, 1)), tone, starts, lengths)
+        results = np.zeros((SPECTRUM_HISTORY, 5, SPECTRUM_FIELDS), dtype=np.float32)
+        spectrum.load(results)
+        master = results[-1, -1]
+        band = np.searchsorted(frequencies, FREQUENCY, side="right") - 1
+        print(f"{FREQUENCY} Hz sine of amplitude {AMPLITUDE}, {SPECTRUM_SIZE} point rFFT: "
+              f"peak {master[SPECTRUM_PEAK]:.3f}, "
+              f"RMS {master[SPECTRUM_RMS]:.3f} (exact {AMPLITUDE / 2 ** 0.5:.3f}), "
+              f"band from {frequencies[band]:.0f} Hz {master[band]:.3f}, all bands {np.sqrt(np.sum(master[:len(frequencies)] ** 2)):.3f}")
+    finally:
+        spectrum.close()
+        spectrum.unlink()
+
+    budget = BUFFER_SIZE / PLAYBACK_RATE
+    print(f"{'us per row':12s}" + "".join(f"{size:>10d}" for size in SIZES) + f"   (a row plays {budget * 1e6:.0f} us)")
+    for channel_count in CHANNEL_COUNTS:
+        channels = np.random.uniform(-1, 1, (channel_count, BUFFER_SIZE)).astype(np.float32)
+        line = f"{channel_count:3d} channels"
+        for size in SIZES:
+            spectrum = SharedSpectrum.create(channel_count)
+            try:
+                analyser = SpectrumAnalyser(spectrum, BUFFER_SIZE, INITIAL_SPEED, size, budget=float("inf"))
+                analyser(channels, channels[0], starts, lengths)
+                start = time.perf_counter()
+                for _ in range(ROWS):
+                    analyser(channels, channels[0], starts, lengths)
+                line += f"{(time.perf_counter() - start) / ROWS * 1e6:10.0f}"
+            finally:
+                spectrum.close()
+                spectrum.unlink()
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+from argparse import ArgumentParser
+from multiprocessing import shared_memory
+from dataclasses import asdict
+from datetime import datetime, timezone
+import subprocess
+import platform
+import tempfile
+import json
+import time
+import os
+
+import numpy as np
+
+from settings import INTERPOLATION, PLAYBACK_RATE
+from core.types import BeatPtr, SharedBeatPtr, RingBuffer
+from core.timeline import Timeline
+from core.file import ModFile
+from audio.engine import Engine, play_note
+from audio.mixer import Mixer
+from audio.offline import render_to_file
+from audio.renderer import render_frame, INTERPOLATION_MODES
+from benchmarks.synthetic import SyntheticSong, write_module, MAX_SAMPLE_LENGTH
+from benchmarks.parse import MODES as OPEN_MODES
+
+SHAPES = {  # the synthetic modules every run measures
+    "standard": SyntheticSong(),
+    "dense": SyntheticSong(effect_density=0.9, note_density=0.9),
+    "8 channels": SyntheticSong(channels=8),
+    "long samples": SyntheticSong(sample_length=MAX_SAMPLE_LENGTH),
+}
+OPEN_REPEATS = 20
+RENDER_ROWS = 256   # rows rendered with every interpolation mode at most
+RENDER_BUDGET = 2.0     # seconds of rendering after which a mode stops early, the sinc modes resample every new note
+MIX_REPEATS = 5     # passes over the rows of the song
+
+
+# Times ModFile.open the ways benchmarks.parse does, in ms
+def bench_open(filepath: str) -> dict[str, float]:
+    results = {}
+    for mode, load in OPEN_MODES.items():
+        start = time.perf_counter()
+        for _ in range(OPEN_REPEATS):
+            load(filepath)
+        results[mode] = (time.perf_counter() - start) / OPEN_REPEATS * 1000
+    return results
+
+
+# Time per channel and row spent in render_frame for the first rows of the song with every interpolation mode,
+# in us. The notes are played as the engine does, but only render_frame is timed
+def bench_render_frame(song: ModFile, timeline: Timeline) -> dict[str, float]:
+    results = {}
+    for mode in INTERPOLATION_MODES:
+        states = timeline.channel_states(song, 0)
+        caches = Engine(song, timeline, interpolation=mode).caches     # the mipmap modes build theirs here
+        elapsed, rows = 0.0, 0
+        for row_idx in range(min(RENDER_ROWS, len(timeline))):
+            if elapsed >= RENDER_BUDGET:
+                break
+            position = timeline.position(row_idx)
+            row = timeline.rows[row_idx]
+            ticks, frames = int(row["ticks"]), int(row["frames"])
+            for i in caches:
+                play_note(states[i], song, i, position.pattern_idx, position.note_idx)
+            start = time.perf_counter()
+            for i in caches:
+                render_frame(states[i], caches[i], song.samplelist, ticks, frames, mode)
+            elapsed += time.perf_counter() - start
+            rows += 1
+        results[mode] = elapsed / (rows * len(caches)) * 1e6
+    return results
+
+
+# Time per row of Mixer.mix over every row length of the song, in us
+def bench_mix(song: ModFile, timeline: Timeline) -> float:
+    shm = shared_memory.SharedMemory(create=True, size=song.channel_count * timeline.max_frames * 4)
+    beat_ptr = SharedBeatPtr.create(BeatPtr())
+    output_ring = RingBuffer.create(timeline.max_frames, 2)
+    mixer = Mixer(shm.name, output_ring, beat_ptr, timeline, song.channel_count)
+    row_frames = timeline.rows["frames"].tolist()
+
+    try:
+        for frames in set(row_frames):    # attach and make the views of every row length
+            mixer.mix(frames)
+        start = time.perf_counter()
+        for _ in range(MIX_REPEATS):
+            for frames in row_frames:
+                mixer.mix(frames)
+        return (time.perf_counter() - start) / (MIX_REPEATS * len(row_frames)) * 1e6
+
+    finally:
+        mixer.close()
+        shm.close()
+        shm.unlink()
+        beat_ptr.close()
+        beat_ptr.unlink()
+        output_ring.close()
+        output_ring.unlink()
+
+
+# One pass through the song rendered to a WAV file with the INTERPOLATION from the settings, and the peak
+# allocations of a second, traced pass
+def bench_offline(song: ModFile, directory: str) -> dict[str, float]:
+    stats = render_to_file(song, os.path.join(directory, "render.wav"), trace_memory=True)
+    return {"audio_seconds": stats.audio_seconds, "wall_seconds": stats.wall_seconds,
+            "realtime_factor": stats.realtime_factor, "peak_memory": stats.traced_peak}
+
+
+def run(name: str, filepath: str, directory: str, shape: SyntheticSong = None) -> dict:
+    song = ModFile.open(filepath)
+    timeline = Timeline.compile(song)
+    result = {"name": name, "file": filepath if shape is None else None,
+              "shape": asdict(shape) if shape is not None else None,
+              "channels": song.channel_count, "rows": len(timeline),
+              "open_ms": bench_open(filepath),
+              "render_frame_us": bench_render_frame(song, timeline),
+              "mix_us": bench_mix(song, timeline),
+              "offline": bench_offline(song, directory)}
+    print(f"{name:16s} open {result['open_ms']['open']:6.2f} ms, "
+          f"render_frame {result['render_frame_us'][INTERPOLATION]:7.1f} us ({INTERPOLATION}), "
+          f"mix {result['mix_us']:5.1f} us, offline {result['offline']['realtime_factor']:6.1f}x realtime")
+    return result
+
+
+def _commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+# every number in a result file, keyed by its path
+def _flatten(value, path: str = "") -> dict[str, float]:
+    if isinstance(value, dict):
+        return {key: number for name, item in value.items() for key, number in _flatten(item, f"{path}/{name}").items()}
+    if isinstance(value, list):
+        return {key: number for item in value for key, number in _flatten(item, f"{path}/{item.get('name')}").items()}
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return {path: value}
+    return {}
+
+
+# Prints the change of every measurement between two result files
+def compare(old_path: str, new_path: str):
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    print(f"{old['commit'][:10] or old_path} -> {new['commit'][:10] or new_path}")
+    old_results, new_results = _flatten(old["results"]), _flatten(new["results"])
+    for key, value in new_results.items():
+        if "/shape/" in key or key not in old_results or old_results[key] == 0:
+            continue
+        print(f"{key:60s} {old_results[key]:12.3f} {value:12.3f} {(value / old_results[key] - 1) * 100:+7.1f}%")
+
+
+# Measures parsing, rendering a channel row with each interpolation mode, mixing and offline rendering on
+# synthetic modules (and any given files), and writes the results to a JSON file to compare commits with
+def main():
+    parser = ArgumentParser(description="Run the benchmarks and write the results as JSON")
+    parser.add_argument("files", nargs="*", help="modules to measure as well as the synthetic ones")
+    parser.add_argument("-o", "--output", default="benchmark.json", help="results file")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="compare two results files instead")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for name, shape in SHAPES.items():
+            filepath = os.path.join(directory, name.replace(" ", "_") + ".mod")
+            write_module(filepath, shape)
+            results.append(run(name, filepath, directory, shape))
+        for filepath in args.files:
+            results.append(run(os.path.basename(filepath), filepath, directory))
+
+    report = {"commit": _commit(), "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+              "python": platform.python_version(), "numpy": np.__version__, "machine": platform.machine(),
+              "cpu_count": os.cpu_count(), "interpolation": INTERPOLATION, "playback_rate": PLAYBACK_RATE,
+              "results": results}
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
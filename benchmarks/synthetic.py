@@ -0,0 +1,132 @@
+from argparse import ArgumentParser
+from dataclasses import dataclass
+import numpy as np
+
+from core.constants import MAX_NOTE_COUNT
+
+SAMPLE_COUNT = 31
+MAX_SAMPLE_LENGTH = 2 * 0xFFFF     # bytes, the header stores the length in words
+MAX_PATTERNS = 128
+PERIODS = [round(856 * 2 ** (-n / 12)) for n in range(36)]     # C-1 to B-3, the ProTracker range
+# (command, upper nibble range, lower nibble range) of the effects notes get, no flow control so every
+# pattern plays once from top to bottom
+EFFECTS = [
+    (0x0, (1, 15), (1, 15)),    # arpeggio
+    (0x1, (0, 1), (1, 15)),     # slide up
+    (0x2, (0, 1), (1, 15)),     # slide down
+    (0x3, (0, 3), (0, 15)),     # tone portamento
+    (0x4, (1, 15), (1, 15)),    # vibrato
+    (0x5, (0, 1), (1, 15)),     # tone portamento + volume slide
+    (0x6, (1, 15), (0, 0)),     # vibrato + volume slide
+    (0x7, (1, 15), (1, 15)),    # tremolo
+    (0x9, (0, 7), (0, 15)),     # sample offset
+    (0xA, (0, 15), (0, 0)),     # volume slide up
+    (0xA, (0, 0), (1, 15)),     # volume slide down
+    (0xC, (0, 3), (0, 15)),     # set volume
+    (0xE, (0x9, 0x9), (1, 5)),  # retrigger
+    (0xE, (0xA, 0xB), (1, 15)),     # fine volume slides
+    (0xE, (0xC, 0xC), (1, 5)),  # note cut
+]
+
+
+@dataclass
+class SyntheticSong:  # the shape of a generated module
+    patterns: int = 16
+    channels: int = 4
+    sample_length: int = 16384  # bytes of every sample
+    effect_density: float = 0.25    # share of the notes with an effect
+    note_density: float = 0.5   # share of the notes that start a new note
+    seed: int = 0
+
+    @property
+    def magic(self) -> str:
+        if self.channels == 4:
+            return 'M.K.'
+        return f"{self.channels}CHN" if self.channels < 10 else f"{self.channels}CH"
+
+
+# Writes a valid module with the given shape: random notes and effects over 31 looping and one-shot samples of
+# decaying waveforms, with the patterns played once in order. The same shape and seed give the same file
+def write_module(filepath: str, shape: SyntheticSong = SyntheticSong()):
+    if not 1 <= shape.patterns <= MAX_PATTERNS:
+        raise ValueError(f"a module has 1 - {MAX_PATTERNS} patterns, not {shape.patterns}")
+    if not 1 <= shape.channels <= 32:
+        raise ValueError(f"a module has 1 - 32 channels, not {shape.channels}")
+    if not 2 <= shape.sample_length <= MAX_SAMPLE_LENGTH:
+        raise ValueError(f"samples are 2 - {MAX_SAMPLE_LENGTH} bytes long, not {shape.sample_length}")
+    rng = np.random.default_rng(shape.seed)
+    sample_length = shape.sample_length & ~1
+
+    header = bytearray(f"synthetic {shape.channels}ch {shape.patterns}p".encode("ascii").ljust(20, b"\0"))
+    samples = []
+    for i in range(SAMPLE_COUNT):
+        looping = i % 2 == 0
+        header += f"sample {i + 1:02d}".encode("ascii").ljust(22, b"\0")
+        header += (sample_length // 2).to_bytes(2, "big")
+        header += bytes([0, 64])    # finetune, volume
+        header += (0).to_bytes(2, "big")
+        header += (sample_length // 2 if looping else 1).to_bytes(2, "big")
+        samples.append(_waveform(rng, sample_length, looping))
+
+    header += bytes([shape.patterns, 127])
+    header += bytes(range(shape.patterns)).ljust(128, b"\0")
+    header += shape.magic.encode("ascii")
+
+    with open(filepath, "wb") as f:
+        f.write(header)
+        f.write(_patterns(rng, shape).tobytes())
+        for sample in samples:
+            f.write(sample.tobytes())
+
+
+# raw pattern data, (patterns, notes, channels, 4) bytes
+def _patterns(rng: np.random.Generator, shape: SyntheticSong) -> np.ndarray:
+    size = (shape.patterns, MAX_NOTE_COUNT, shape.channels)
+    has_note = rng.random(size) < shape.note_density
+    sample_no = np.where(has_note, rng.integers(1, SAMPLE_COUNT + 1, size), 0)
+    period = np.where(has_note, np.array(PERIODS)[rng.integers(0, len(PERIODS), size)], 0)
+
+    effect = rng.integers(0, len(EFFECTS), size)
+    has_effect = rng.random(size) < shape.effect_density
+    command, upper, lower = (np.zeros(size, dtype=np.int64) for _ in range(3))
+    for i, (effect_id, (upper_low, upper_high), (lower_low, lower_high)) in enumerate(EFFECTS):
+        chosen = has_effect & (effect == i)
+        command[chosen] = effect_id
+        upper[chosen] = rng.integers(upper_low, upper_high + 1, size)[chosen]
+        lower[chosen] = rng.integers(lower_low, lower_high + 1, size)[chosen]
+
+    raw = np.empty(size + (4,), dtype=np.uint8)
+    raw[..., 0] = (sample_no & 0xF0) | (period >> 8)
+    raw[..., 1] = period & 0xFF
+    raw[..., 2] = ((sample_no & 0x0F) << 4) | command
+    raw[..., 3] = (upper << 4) | lower
+    return raw
+
+
+# a few harmonics of a random pitch, decaying for one-shot samples, and a little noise
+def _waveform(rng: np.random.Generator, length: int, looping: bool) -> np.ndarray:
+    t = np.arange(length) / length
+    cycles = rng.integers(8, 64)
+    wave = sum(np.sin(2 * np.pi * cycles * h * t) / h for h in range(1, rng.integers(2, 6)))
+    wave = wave / np.abs(wave).max() + rng.normal(0, 0.05, length)
+    if not looping:
+        wave *= np.exp(-4 * t)
+    return np.clip(wave * 100, -128, 127).astype(np.int8)
+
+
+def main():
+    parser = ArgumentParser(description="Write a synthetic .mod file for benchmarking")
+    parser.add_argument("output", help="path of the module to write")
+    parser.add_argument("-p", "--patterns", type=int, default=SyntheticSong.patterns)
+    parser.add_argument("-c", "--channels", type=int, default=SyntheticSong.channels)
+    parser.add_argument("-l", "--sample-length", type=int, default=SyntheticSong.sample_length, help="in bytes")
+    parser.add_argument("-e", "--effect-density", type=float, default=SyntheticSong.effect_density)
+    parser.add_argument("-n", "--note-density", type=float, default=SyntheticSong.note_density)
+    parser.add_argument("-s", "--seed", type=int, default=SyntheticSong.seed)
+    args = parser.parse_args()
+    write_module(args.output, SyntheticSong(args.patterns, args.channels, args.sample_length, args.effect_density,
+                                            args.note_density, args.seed))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+from glob import glob
+import random
+import time
+import sys
+
+from core.file import ModFile
+from core.types import ChannelState
+from core.timeline import Timeline
+
+SEEKS = 200
+
+
+# Compile time of the timeline of every given file and the cost of a random seek, which finds the row with a
+# binary search and replays it from the nearest snapshot, against replaying every row from the start
+def main(filepaths: list[str]):
+    random.seed(0)
+    for filepath in filepaths:
+        song = ModFile.open(filepath)
+
+        start = time.perf_counter()
+        timeline = Timeline.compile(song)
+        compile_time = time.perf_counter() - start
+
+        targets = [random.uniform(0, timeline.duration) for _ in range(SEEKS)]
+        start = time.perf_counter()
+        for seconds in targets:
+            timeline.channel_states(song, timeline.row_at(seconds))
+        seek_time = (time.perf_counter() - start) / SEEKS
+
+        # the same seeks without snapshots, replaying every row up to the target
+        replayed = []
+        start = time.perf_counter()
+        for seconds in targets[:SEEKS // 10]:
+            states = [ChannelState() for _ in range(song.channel_count)]
+            timeline._replay(song, states, 0, timeline.row_at(seconds))
+            replayed.append(states)
+        linear_time = (time.perf_counter() - start) / (SEEKS // 10)
+        for seconds, states in zip(targets, replayed):
+            assert states == timeline.channel_states(song, timeline.row_at(seconds)), "snapshot replay differs"
+
+        print(f"{filepath:40s} {len(timeline):6d} rows, {timeline.duration:6.1f} s, loops to {timeline.loop_row}: "
+              f"compile {compile_time * 1000:6.1f} ms, seek {seek_time * 1e6:6.0f} us "
+              f"(replaying from the start {linear_time * 1e6:6.0f} us)")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:] or sorted(glob("examples/*.mod")))
@@ -0,0 +1,40 @@
+from __future__ import annotations
+from dataclasses import dataclass
+import numpy as np
+
+from settings import PLAYBACK_RATE
+from core.file import ModFile
+from core.timeline import sequence
+
+
+@dataclass
+class SongInfo:  # what a playlist needs to know about a song, without playing it
+    duration: float  # seconds of one pass through the song, up to where it loops or stops
+    loop_start: float | None  # time the song loops back to, None if it stops with F00
+    loop_row: int | None  # row of the timeline the song loops back to
+    row_count: int  # no of rows in one pass
+    visited_orders: list[int]  # positions in the pattern order that are played, in order of their first visit
+    skipped_orders: list[int]  # positions up to the song length that are never reached
+
+    @property
+    def loops(self) -> bool:
+        return self.loop_row is not None
+
+    def __str__(self):
+        loop = f"loops back to {self.loop_start:.1f} s" if self.loops else "stops"
+        skipped = f", skips orders {self.skipped_orders}" if self.skipped_orders else ""
+        return f"{self.duration:.1f} s, {loop}, plays {len(self.visited_orders)} orders in {self.row_count} rows{skipped}"
+
+
+# Works out a song's length and loop point by stepping through the sequencer only (the same stepping the
+# Timeline uses), without rendering or even looking at the sample data
+def analyze(song: ModFile) -> SongInfo:
+    rows, loop_row = sequence(song)
+    end = int(rows["start"][-1] + rows["frames"][-1])
+    loop_start = int(rows["start"][loop_row]) / PLAYBACK_RATE if loop_row is not None else None
+
+    orders, first_visits = np.unique(rows["order_idx"], return_index=True)
+    visited = [int(order) for order in orders[np.argsort(first_visits)]]
+    skipped = sorted(set(range(song.length)) - set(visited))
+
+    return SongInfo(end / PLAYBACK_RATE, loop_start, loop_row, len(rows), visited, skipped)
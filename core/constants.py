@@ -1,11 +1,29 @@
 from settings import BPM, TPB, PLAYBACK_RATE
 
-CHANNEL_COUNT = 4
+CHANNEL_COUNT = 4   # channels of a standard module, the parser reads the actual count from the file's magic
 MAX_NOTE_COUNT = 64
 RECORD_RATE = 16574
 PRIMARY_PERIOD = 214
 HALF_TONE = 1.007246412
+MOD_EXTENSIONS = (".mod",)    # of the files the batch renderer and the library pick up from directories
+SAMPLE_PEAK = 127   # the samples are signed 8-bit, rendering scales them down to -1 - 1 by this
 
-TICK_RATE = 60 / (BPM * TPB)                    # duration of a frame in seconds
-BUFFER_SIZE = int(TICK_RATE * PLAYBACK_RATE)    # no of samples that need to be generated each frame
-VIEW_WIDTH = min(256, BUFFER_SIZE)              # no of samples to be visualised on the channel plots
+TICK_RATE = 60 / (BPM * TPB)                    # duration of a frame at the initial speed and tempo in seconds
+BUFFER_SIZE = int(TICK_RATE * PLAYBACK_RATE)    # no of samples in such a frame, the timeline has every row's own
+ENVELOPE_HISTORY = 128                          # no of ticks of every channel shown on the channel plots
+SPECTRUM_HISTORY = 64                           # no of ticks of analysis a SharedSpectrum keeps
+SPECTRUM_BANDS = 16                             # of the analysis, spaced evenly in octaves up to the Nyquist frequency
+
+# MOD timing: a row lasts speed ticks of 2.5 / tempo seconds, changed at runtime with the Fxx effect.
+# The initial values make a row last exactly TICK_RATE
+INITIAL_SPEED = 6
+INITIAL_TEMPO = BPM * TPB / 4
+
+# ids of the effects that change the song flow or how notes start, as decoded by ModParser (E commands are 16 + x)
+TONE_PORTAMENTO = 0x3
+TONE_PORTAMENTO_VOL_SLIDE = 0x5
+POSITION_JUMP = 0xB
+PATTERN_BREAK = 0xD
+SET_SPEED = 0xF
+PATTERN_LOOP = 16 + 0x6
+PATTERN_DELAY = 16 + 0xE
@@ -1,14 +1,15 @@
 from __future__ import annotations
 from dataclasses import dataclass, field
 from numpy.typing import NDArray
-from typing import BinaryIO
 import numpy as np
+import mmap
 
-from core.types import Sample, Note, Pattern, Effect
+from core.types import Sample, Pattern, NOTE_DTYPE
 from core.constants import MAX_NOTE_COUNT, CHANNEL_COUNT
 
-MAGIC_IDS = ['M.K', '4CHN', '6CHN', '8CHN', 'FLT4', 'FLT8']
+MAGIC_IDS = ['M.K.', 'M!K!', '4CHN', '6CHN', '8CHN', 'FLT4', 'FLT8', 'CD81', 'OKTA', 'OCTA']
 NO_LOOP = 2
+DUAL_ARG_EFFECTS = [0, 4, 5, 6, 7, 10]     # effects with two 4-bit arguments, the rest take one byte
 
 # addresses:
 SONGNAME_OFFSET = 0x0000
@@ -28,7 +29,6 @@ PATTERNPOS_LEN = 128
 MAGIC_OFFSET = 0x0438
 # ----
 PATTERNS_OFFSET = 0x043C
-PATTERN_SIZE = 1024
 NOTE_SIZE = 4
 
 
@@ -38,14 +38,35 @@ class ModFile:  # holds all the information about a .MOD file
     length: int  # length of the song in patterns
     repeat_idx: int  # pattern index where the tracker should loop
     pattern_order: list[int]  # order in which the patterns will be played
-    patternlist: list[Pattern]  # list of all the patterns (4 channels each)
+    pattern_data: NDArray = field(compare=False)  # raw notes of all the patterns, (patterns, notes, channels, 4) bytes
     samplelist: list[Sample] = field(default=list[Sample], compare=False,
                                      hash=False)  # list of all the sample recordings
-
+    magic: str = field(default='M.K.', compare=False)  # format id of the file, e.g. M.K. or 8CHN
+
+    # no of channels, from the magic of the file
+    @property
+    def channel_count(self) -> int:
+        return self.pattern_data.shape[2]
+
+    # note table of all the patterns, shaped (patterns, notes, channels). Decoded on first access
+    @property
+    def patterns(self) -> NDArray:
+        patterns = self.__dict__.get("_patterns")
+        if patterns is None:
+            patterns = ModParser.decodePatterns(self.pattern_data)
+            object.__setattr__(self, "_patterns", patterns)
+        return patterns
+
+    # With metadata_only the samples only have their header information and no data, which is never read
     @staticmethod
-    def open(filepath: str) -> ModFile:
+    def open(filepath: str, metadata_only: bool = False) -> ModFile:
         parser = ModParser()
-        return parser.parse(filepath)
+        return parser.parse(filepath, metadata_only)
+
+    # list of all the patterns as Pattern views on the note table
+    @property
+    def patternlist(self) -> list[Pattern]:
+        return [Pattern(notes) for notes in self.patterns]
 
     def setSampleList(self, new_samplelist: list[Sample]):
         object.__setattr__(self, "samplelist", new_samplelist)
@@ -53,6 +74,7 @@ class ModFile:  # holds all the information about a .MOD file
     def __str__(self):
         output = "---- SONG INFO ----\n"
         output += "Name: " + self.name + "\n"
+        output += "Channels: " + str(self.channel_count) + "\n"
         output += "Sample list:\n"
         for sample in self.samplelist:
             output += "\t" + ("[null]" if sample.name == '' else sample.name) + "\n"
@@ -70,17 +92,24 @@ class ModParser:
         self.max_sample_count = 31
         self._song_length = 0
         self._pattern_count = 0
-
-    # public method
-    def parse(self, filepath: str) -> ModFile:
-        f = open(filepath, "rb")
-        if not f.readable():
-            print("File couldn't be read")
-            quit()
+        self._magic = ''
+        self._channel_count = CHANNEL_COUNT
+
+    # public methods
+    # The file is memory mapped, so only the parts that are used are read from the disk: the pattern data when
+    # the patterns are first decoded and the sample data (zero-copy views on the mapping) when it's rendered
+    def parse(self, filepath: str, metadata_only: bool = False) -> ModFile:
+        with open(filepath, "rb") as file:
+            if not file.readable():
+                print("File couldn't be read")
+                quit()
+            f = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
 
         # reset after the previous file probably changed it
         self._pattern_count = 0
         self._song_length = 0
+        self._magic = ''
+        self._channel_count = CHANNEL_COUNT
         # ----
 
         # hardcoding because there are way too many variants out there to cover
@@ -90,12 +119,24 @@ class ModParser:
         name = self._readSongName(f)
         length = self._readSongLength(f)
         repeat_idx = self._readRepeatIdx(f)
+        self._magic = self._readMagic(f)
+        self._channel_count = self._channelCount(self._magic)
         pattern_order = self._loadPatternPositions(f)
-        patternlist = self._loadPatternData(f)
-        samplelist = self._loadSampleData(f)
+        pattern_data = self._loadPatternData(f)
+        samplelist = self._loadSampleInfo(f) if metadata_only else self._loadSampleData(f)
 
-        f.close()
-        return ModFile(name, length, repeat_idx, pattern_order, patternlist, samplelist)
+        # The mapping is never closed explicitly: the pattern data and sample views export its buffer (mmap.close()
+        # raises while they exist) and each holds a reference to it, so it is unmapped once the ModFile and every
+        # array taken from it are garbage collected. The file itself was closed above, the mapping has its own handle
+        return ModFile(name, length, repeat_idx, pattern_order, pattern_data, samplelist, self._magic)
+
+    # unpacks raw pattern data into a note table, shaped like the data without the last axis
+    @staticmethod
+    def decodePatterns(raw: NDArray[np.uint8]) -> NDArray:
+        patterns = np.empty(raw.shape[:-1], dtype=NOTE_DTYPE)
+        for name, values in zip(NOTE_DTYPE.names, ModParser._decodeNotes(raw)):
+            patterns[name] = values
+        return patterns
 
     # private methods:
     # ---- file operations
@@ -112,13 +153,14 @@ class ModParser:
         return int.from_bytes(data, "big", signed=False)
 
     @staticmethod
-    def _readBlock(f: BinaryIO, offset: int, length: int) -> bytes:
-        f.seek(offset)
-        return f.read(length)
+    def _readBlock(f: mmap.mmap, offset: int, length: int) -> bytes:
+        return f[offset:offset + length]
 
+    # a read only view on the mapped file, cut short if the file is truncated (an empty array past its end)
     @staticmethod
-    def _tofloat32_np(data: list[int]) -> NDArray[np.float32]:
-        return np.array(data, dtype=np.int8).astype(np.float32) / 127
+    def _view(f: mmap.mmap, offset: int, length: int, dtype: type = np.uint8) -> NDArray:
+        length = max(0, min(length, len(f) - offset))
+        return np.frombuffer(f, dtype=dtype, count=length, offset=offset) if length else np.array([], dtype=dtype)
 
     # ---- data processing
 
@@ -145,45 +187,35 @@ class ModParser:
             result_size = int(np.ceil((end-start) / 8))
             return result.to_bytes(result_size, byteorder='big')
 
-    # unpacks raw effect data
-    def _extractEffectInfo(self, data: bytes) -> Effect:
-        id = self._extractBits(data, 0, 3)
-
-        # E commands
-        if id == 14:
-            id = 16 + self._extractBits(data, 4, 7)
-            arg1 = self._extractBits(data, 8, 11)
-            return Effect(id, arg1)
-
-        # single argument commands
-        elif id in [1, 2, 3, 9, 11, 12, 13, 15]:
-            arg1 = self._extractBits(data, 4, 11)
-            return Effect(id, arg1)
-
-        # dual argument commands
-        elif id in [0, 4, 5, 6, 7, 10]:
-            arg1 = self._extractBits(data, 4, 7)
-            arg2 = self._extractBits(data, 8, 11)
-            return Effect(id, arg1, arg2)
-
-    # unpacks raw note data
-    def _extractNoteInfo(self, data: bytes) -> tuple[int, int, Effect]:
-        sample = (self._extractBits(data, 0, 3) << 4) + self._extractBits(data, 16, 19) - 1
-        period = self._extractBits(data, 4, 15)
-        raw_effect = self._extractBits(data, 20, 31, as_type='bytes')
-        effect = self._extractEffectInfo(raw_effect)
-        return sample, period, effect
+    # unpacks raw note data for every note at once: (..., 4) bytes -> sample, period, effect id, args
+    # arg2 is -1 for effects that only take a single argument
+    @staticmethod
+    def _decodeNotes(raw: NDArray[np.uint8]) -> tuple[NDArray[np.int16], ...]:
+        b0, b1, b2, b3 = (raw[..., i].astype(np.int16) for i in range(NOTE_SIZE))
+
+        sample_idx = (b0 & 0xF0) + (b2 >> 4) - 1
+        period = ((b0 & 0x0F) << 8) + b1
+
+        command = b2 & 0x0F
+        upper, lower = b3 >> 4, b3 & 0x0F
+        is_extended = command == 14     # E commands
+        is_dual = np.isin(command, DUAL_ARG_EFFECTS)
+
+        effect_id = np.where(is_extended, 16 + upper, command)
+        arg1 = np.where(is_extended, lower, np.where(is_dual, upper, b3))
+        arg2 = np.where(is_dual, lower, -1)
+        return sample_idx, period, effect_id, arg1, arg2
 
     # ---- data structure operations
 
     # name of the song
-    def _readSongName(self, f: BinaryIO) -> str:
+    def _readSongName(self, f: mmap.mmap) -> str:
         data = self._readBlock(f, SONGNAME_OFFSET, SONGNAME_LEN)
         return self._toString(data)
 
     # information about the samples
     # DON'T CALL DIRECTLY
-    def _loadSampleInfo(self, f: BinaryIO) -> list[Sample]:
+    def _loadSampleInfo(self, f: mmap.mmap) -> list[Sample]:
         sample_array = []
         for i in range(self.max_sample_count):
             f.seek(SAMPLEARR_OFFSET + SAMPLEBLOCK_SIZE * i)
@@ -199,62 +231,72 @@ class ModParser:
         return sample_array
 
     # length of the song
-    def _readSongLength(self, f: BinaryIO) -> int:
+    def _readSongLength(self, f: mmap.mmap) -> int:
         data = self._readBlock(f, SONGLENGTH_OFFSET, 1)
         self._song_length = self._toUInt_BE(data)
         return self._song_length
 
     # noisetracker uses this byte for restart before the end of file
-    def _readRepeatIdx(self, f: BinaryIO) -> int:
+    def _readRepeatIdx(self, f: mmap.mmap) -> int:
         data = self._readBlock(f, SEARCHUNTIL_OFFSET, 1)
         return self._toUInt_BE(data)
 
-    # reads a given channel (0-3) of a given pattern
-    def _readChannel(self, f: BinaryIO, pattern_no: int, channel_no: int) -> list[Note]:
-        notelist = []
-        for note_idx in range(MAX_NOTE_COUNT):
-            base_addr = PATTERNS_OFFSET + pattern_no * PATTERN_SIZE + channel_no * NOTE_SIZE
-            note_addr = base_addr + note_idx * NOTE_SIZE * CHANNEL_COUNT
-            note_data = self._readBlock(f, note_addr, 4)
-
-            sample_idx, period, effect = self._extractNoteInfo(note_data)
-            notelist.append(Note(sample_idx, period, effect))
-        return notelist
-
     # 128 positions that tell the tracker what pattern (0-63) to play at that position (0-127)
     # CALL BEFORE loadPatternData() and loadSampleData()
-    def _loadPatternPositions(self, f: BinaryIO) -> list[int]:
+    def _loadPatternPositions(self, f: mmap.mmap) -> list[int]:
         data = list(self._readBlock(f, PATTERNPOS_OFFSET, PATTERNPOS_LEN))[0:self._song_length]
+        if self._magic == 'FLT8':
+            data = [position // 2 for position in data]     # FLT8 counts in halves of its 8 channel patterns
         self._pattern_count = max(data) + 1  # save for later
         return data
 
-    # the actual note layout and rhythm information
+    # bytes of pattern data per pattern
+    @property
+    def _patternSize(self) -> int:
+        return MAX_NOTE_COUNT * self._channel_count * NOTE_SIZE
+
+    # the actual note layout and rhythm information, as a view on the file that ModFile decodes in bulk when needed
     # CALL loadPatternPositions() FIRST, because of pattern_count
-    def _loadPatternData(self, f: BinaryIO) -> list[Pattern]:
-        pattern_array = []
-        for pattern_idx in range(self._pattern_count):
-            pattern = Pattern()
-            for channel_idx in range(CHANNEL_COUNT):
-                pattern[channel_idx] = self._readChannel(f, pattern_idx, channel_idx)
-            pattern_array.append(pattern)
-        return pattern_array
+    def _loadPatternData(self, f: mmap.mmap) -> NDArray[np.uint8]:
+        raw = self._view(f, PATTERNS_OFFSET, self._pattern_count * self._patternSize)
+        if len(raw) < self._pattern_count * self._patternSize:    # a truncated file, the missing notes are empty
+            raw = np.concatenate([raw, np.zeros(self._pattern_count * self._patternSize - len(raw), dtype=np.uint8)])
+        if self._magic == 'FLT8':
+            # every pattern is stored as two 4 channel patterns, channels 1-4 followed by 5-8
+            raw = raw.reshape(self._pattern_count, 2, MAX_NOTE_COUNT, 4, NOTE_SIZE).transpose(0, 2, 1, 3, 4)
+        return raw.reshape(self._pattern_count, MAX_NOTE_COUNT, self._channel_count, NOTE_SIZE)
 
     # the actual sample recordings
     # CALL loadPatternPositions() FIRST, because of pattern_count
-    def _loadSampleData(self, f: BinaryIO) -> list[Sample]:
+    def _loadSampleData(self, f: mmap.mmap) -> list[Sample]:
         sample_array = self._loadSampleInfo(f)
 
         offset = 0
         sample_count = len(sample_array)
         for i in range(sample_count):
             sample = sample_array[i]
-            base_addr = PATTERNS_OFFSET + self._pattern_count * PATTERN_SIZE
+            base_addr = PATTERNS_OFFSET + self._pattern_count * self._patternSize
             address = base_addr + offset
-            sample.data = self._tofloat32_np(list(self._readBlock(f, address, sample.length)))
+            sample.data = self._view(f, address, sample.length, np.int8)
             offset += sample.length
         return sample_array
 
     # reads the magic 4 bytes which indicate the module version
-    def _readMagic(self, f: BinaryIO) -> str:
+    def _readMagic(self, f: mmap.mmap) -> str:
         data = self._readBlock(f, MAGIC_OFFSET, 4)
         return self._toString(data)
+
+    # no of channels the magic stands for: the fixed ids, then xCHN and xxCH (FastTracker) and TDZx (TakeTracker).
+    # Anything else is read as a 4 channel module
+    @staticmethod
+    def _channelCount(magic: str) -> int:
+        count = 0
+        if magic in ['FLT8', 'CD81', 'OKTA', 'OCTA']:
+            count = 8
+        elif magic[1:] == 'CHN' and magic[:1].isdigit():
+            count = int(magic[0])
+        elif magic[2:] == 'CH' and magic[:2].isdigit():
+            count = int(magic[:2])
+        elif magic[:3] == 'TDZ' and magic[3:].isdigit():
+            count = int(magic[3:])
+        return count if count > 0 else CHANNEL_COUNT
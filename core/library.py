@@ -0,0 +1,239 @@
+from __future__ import annotations
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+import hashlib
+import json
+import sqlite3
+import time
+import os
+
+from settings import LIBRARY_PATH
+from core.constants import MOD_EXTENSIONS
+from core.file import ModFile
+from core.analysis import analyze
+
+SCAN_CHUNK_SIZE = 64    # files handed to a worker at a time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS modules (
+    path TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    hash TEXT NOT NULL,
+    name TEXT NOT NULL DEFAULT '',
+    magic TEXT NOT NULL DEFAULT '',
+    channel_count INTEGER NOT NULL DEFAULT 0,
+    pattern_count INTEGER NOT NULL DEFAULT 0,
+    length INTEGER NOT NULL DEFAULT 0,
+    duration REAL NOT NULL DEFAULT 0,
+    loops INTEGER NOT NULL DEFAULT 0,
+    error TEXT NOT NULL DEFAULT ''
+);
+CREATE TABLE IF NOT EXISTS samples (
+    path TEXT NOT NULL REFERENCES modules(path) ON DELETE CASCADE,
+    sample_idx INTEGER NOT NULL,  -- the sample's number in the module, 1-31
+    name TEXT NOT NULL,
+    PRIMARY KEY (path, sample_idx)
+);
+CREATE INDEX IF NOT EXISTS modules_name ON modules(name COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS samples_name ON samples(name COLLATE NOCASE);
+"""
+
+
+@dataclass
+class LibraryEntry:  # what the library knows about a module, read from its headers and sequencer only
+    path: str  # absolute path of the file
+    mtime_ns: int
+    size: int  # in bytes
+    hash: str  # of the file contents, to tell an edited file from one that was only touched
+    name: str = ""
+    magic: str = ""
+    channel_count: int = 0
+    pattern_count: int = 0
+    length: int = 0  # of the pattern order
+    duration: float = 0.0  # seconds of one pass through the song
+    loops: bool = False
+    sample_names: dict[int, str] = field(default_factory=dict)  # of the samples that have a name, by number (1-31)
+    error: str = ""  # why the file couldn't be read, the rest is empty then
+
+    def __str__(self):
+        if self.error:
+            return f"{self.path}: ERROR {self.error}"
+        return (f"{self.path}: '{self.name}' {self.magic} {self.channel_count} channels, {self.length} orders, "
+                f"{self.duration:.1f} s{' (loops)' if self.loops else ''}")
+
+
+@dataclass
+class ScanStats:
+    unchanged: int = 0  # same mtime and size as in the index
+    touched: int = 0  # new mtime or size but the same contents
+    added: int = 0
+    updated: int = 0
+    removed: int = 0  # no longer on the disk
+    failed: int = 0  # couldn't be read as a module (still indexed, with the error)
+    wall_seconds: float = 0.0
+
+    def __str__(self):
+        return (f"{self.added} added, {self.updated} updated, {self.removed} removed, {self.touched} touched, "
+                f"{self.unchanged} unchanged, {self.failed} failed in {self.wall_seconds:.2f} s")
+
+
+# An SQLite index of module collections for browsing and searching, filled from header reads (ModFile's
+# metadata only open, the sample data is never read) and the sequencer analysis. Rescans are incremental:
+# files are only opened when their mtime or size changed, and only parsed again when their contents did
+class Library:
+    def __init__(self, db_path: str = LIBRARY_PATH):
+        self.db_path = db_path
+        self._db = sqlite3.connect(db_path)
+        self._db.execute("PRAGMA foreign_keys = ON")
+        self._db.execute("PRAGMA journal_mode = WAL")
+        self._db.executescript(SCHEMA)
+
+    def __len__(self) -> int:
+        return self._db.execute("SELECT COUNT(*) FROM modules").fetchone()[0]
+
+    # Brings the index up to date with the modules in the given files and directories, on a process pool of
+    # workers (default: one per core). Modules that were indexed under a directory and are gone are removed
+    def scan(self, paths: list[str], workers: int = None) -> ScanStats:
+        start = time.perf_counter()
+        stats = ScanStats()
+
+        found = {}  # path -> (mtime_ns, size)
+        roots = []
+        for path in paths:
+            path = os.path.abspath(path)
+            if os.path.isdir(path):
+                roots.append(os.path.join(path, ""))
+                _walk(path, found)
+            elif os.path.isfile(path):
+                status = os.stat(path)
+                found[path] = (status.st_mtime_ns, status.st_size)
+
+        indexed = self._indexed(roots, list(found))
+        jobs = []
+        for path, (mtime_ns, size) in found.items():
+            known = indexed.get(path)
+            if known is not None and known[:2] == (mtime_ns, size):
+                stats.unchanged += 1
+            else:
+                jobs.append((path, known[2] if known is not None else None))
+
+        with self._db:
+            if jobs:
+                with ProcessPoolExecutor(workers or os.cpu_count()) as pool:
+                    for path, entry in zip([path for path, _ in jobs],
+                                           pool.map(_index_file, jobs, chunksize=SCAN_CHUNK_SIZE)):
+                        self._store(entry, path in indexed, stats)
+
+            removed = [(path,) for path in indexed if path not in found]
+            self._db.executemany("DELETE FROM modules WHERE path = ?", removed)
+            stats.removed = len(removed)
+
+        stats.wall_seconds = time.perf_counter() - start
+        return stats
+
+    # Modules whose song name or (with samples) one of whose sample names contains the text, ignoring case
+    def search(self, text: str, samples: bool = True, limit: int = None) -> list[LibraryEntry]:
+        pattern = "%" + text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        query = "SELECT path FROM modules WHERE name LIKE ? ESCAPE '\\'"
+        args = [pattern]
+        if samples:
+            query += " UNION SELECT path FROM samples WHERE name LIKE ? ESCAPE '\\'"
+            args.append(pattern)
+        return self._entries(f"WHERE path IN ({query}) ORDER BY path" + (" LIMIT ?" if limit else ""),
+                             args + ([limit] if limit else []))
+
+    def get(self, path: str) -> LibraryEntry | None:
+        entries = self._entries("WHERE path = ?", [os.path.abspath(path)])
+        return entries[0] if entries else None
+
+    def close(self):
+        self._db.close()
+
+    # (mtime_ns, size, hash) of the indexed files under the roots and of the given files
+    def _indexed(self, roots: list[str], paths: list[str]) -> dict[str, tuple[int, int, str]]:
+        indexed = {}
+        for root in roots:
+            rows = self._db.execute("SELECT path, mtime_ns, size, hash FROM modules WHERE substr(path, 1, ?) = ?",
+                                    (len(root), root))
+            indexed.update((path, (mtime_ns, size, file_hash)) for path, mtime_ns, size, file_hash in rows)
+        for path in paths:
+            if path not in indexed:
+                row = self._db.execute("SELECT mtime_ns, size, hash FROM modules WHERE path = ?", (path,)).fetchone()
+                if row is not None:
+                    indexed[path] = row
+        return indexed
+
+    def _store(self, entry: LibraryEntry, known: bool, stats: ScanStats):
+        if entry.name is None:  # same contents, only the stat changed
+            self._db.execute("UPDATE modules SET mtime_ns = ?, size = ? WHERE path = ?",
+                             (entry.mtime_ns, entry.size, entry.path))
+            stats.touched += 1
+            return
+
+        self._db.execute("DELETE FROM modules WHERE path = ?", (entry.path,))
+        self._db.execute("INSERT INTO modules VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                         (entry.path, entry.mtime_ns, entry.size, entry.hash, entry.name, entry.magic,
+                          entry.channel_count, entry.pattern_count, entry.length, entry.duration, entry.loops,
+                          entry.error))
+        self._db.executemany("INSERT INTO samples VALUES (?, ?, ?)",
+                             [(entry.path, number, name) for number, name in entry.sample_names.items()])
+        if entry.error:
+            stats.failed += 1
+        elif known:
+            stats.updated += 1
+        else:
+            stats.added += 1
+
+    def _entries(self, where: str, args: list) -> list[LibraryEntry]:
+        rows = self._db.execute(
+            "SELECT path, mtime_ns, size, hash, name, magic, channel_count, pattern_count, length, duration, loops, "
+            "(SELECT json_group_object(sample_idx, name) FROM samples s WHERE s.path = m.path), error "
+            f"FROM modules m {where}", args)
+        return [LibraryEntry(*row[:10], bool(row[10]), _sample_names(row[11]), row[12]) for row in rows]
+
+
+# the sample names of a module from the JSON object the index collects them in, by their numbers
+def _sample_names(collected: str | None) -> dict[int, str]:
+    return dict(sorted((int(number), name) for number, name in json.loads(collected or "{}").items()))
+
+
+# every module file below the directory, with its (mtime_ns, size)
+def _walk(directory: str, found: dict[str, tuple[int, int]]):
+    try:
+        entries = list(os.scandir(directory))
+    except OSError:
+        return
+    for entry in entries:
+        if entry.is_dir(follow_symlinks=False):
+            _walk(entry.path, found)
+        elif entry.name.lower().endswith(MOD_EXTENSIONS):
+            status = entry.stat()
+            found[entry.path] = (status.st_mtime_ns, status.st_size)
+
+
+# Runs in a worker process. Reads a file's headers into an entry, or only its stat (and name None) if it
+# still has the hash it was indexed with. Never raises, unreadable files get an entry with the error
+def _index_file(job: tuple[str, str | None]) -> LibraryEntry:
+    path, known_hash = job
+    try:
+        status = os.stat(path)
+        with open(path, "rb") as f:
+            file_hash = hashlib.blake2b(f.read(), digest_size=16).hexdigest()
+        entry = LibraryEntry(path, status.st_mtime_ns, status.st_size, file_hash)
+        if file_hash == known_hash:
+            entry.name = None
+            return entry
+
+        song = ModFile.open(path, metadata_only=True)
+        info = analyze(song)
+        entry.name, entry.magic = song.name, song.magic
+        entry.channel_count, entry.pattern_count, entry.length = song.channel_count, len(song.pattern_data), song.length
+        entry.duration, entry.loops = info.duration, info.loops
+        entry.sample_names = {number: sample.name for number, sample in enumerate(song.samplelist, 1) if sample.name}
+        return entry
+
+    except Exception as e:
+        status = os.stat(path) if os.path.exists(path) else None
+        return LibraryEntry(path, status.st_mtime_ns if status else 0, status.st_size if status else 0, "",
+                            error=repr(e))
@@ -0,0 +1,149 @@
+from __future__ import annotations
+from threading import Thread, Event, Lock
+import functools
+import json
+import time
+import os
+
+import numpy as np
+
+from settings import PROBES, PROBE_LOG_INTERVAL, PROBE_OUTPUT
+
+PROBE_WINDOW = 2048     # latest measurements of a probe the percentiles and histogram are taken over
+HISTOGRAM_EDGES = [0.0] + [2.0 ** e for e in range(-20, 1)]     # seconds, powers of 2 from ~1 us to 1 s
+
+
+# Times one stage of the hot path. start and stop bracket the stage, or record takes a duration measured
+# elsewhere; a duration longer than the deadline passed with it counts as a miss. Keeps running totals and
+# the latest PROBE_WINDOW durations, which the percentiles and the histogram are rolled over
+class Probe:
+    def __init__(self, name: str):
+        self.name = name
+        self.count = 0
+        self.misses = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._window = [0.0] * PROBE_WINDOW
+        self._start = 0.0
+
+    def start(self):
+        self._start = time.perf_counter()
+
+    def stop(self, deadline: float = None) -> float:
+        elapsed = time.perf_counter() - self._start
+        self.record(elapsed, deadline)
+        return elapsed
+
+    def record(self, seconds: float, deadline: float = None):
+        self._window[self.count % PROBE_WINDOW] = seconds
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+        if deadline is not None and seconds > deadline:
+            self.misses += 1
+
+    # the latest durations, oldest first
+    @property
+    def window(self) -> list[float]:
+        if self.count <= PROBE_WINDOW:
+            return self._window[:self.count]
+        split = self.count % PROBE_WINDOW
+        return self._window[split:] + self._window[:split]
+
+    # all the statistics in seconds, the histogram as counts of the window between HISTOGRAM_EDGES
+    def summary(self) -> dict:
+        window = np.array(self.window)
+        p50, p99 = np.percentile(window, [50, 99]) if len(window) else (0.0, 0.0)
+        histogram, _ = np.histogram(np.minimum(window, HISTOGRAM_EDGES[-1]), HISTOGRAM_EDGES)
+        return {"count": self.count, "misses": self.misses, "mean": self.total / self.count if self.count else 0.0,
+                "p50": float(p50), "p99": float(p99), "window_max": float(window.max()) if len(window) else 0.0,
+                "max": self.max, "histogram": histogram.tolist()}
+
+    def __str__(self):
+        summary = self.summary()
+        misses = f" ({summary['misses']} missed)" if summary["misses"] else ""
+        return (f"{self.name} p50 {summary['p50'] * 1e3:.2f} p99 {summary['p99'] * 1e3:.2f} "
+                f"max {summary['window_max'] * 1e3:.2f} ms{misses}")
+
+
+# Stands in for every probe while PROBES is off, so the hot path only pays for an empty call
+class NullProbe:
+    name = ""
+
+    def start(self):
+        pass
+
+    def stop(self, deadline: float = None) -> float:
+        return 0.0
+
+    def record(self, seconds: float, deadline: float = None):
+        pass
+
+
+_NULL_PROBE = NullProbe()
+_probes: dict[str, Probe] = {}  # of this process, by name
+_probes_lock = Lock()   # threads of the process register probes while the log thread goes over them
+
+
+# The probe of a stage in this process, the same one for every caller
+def probe(name: str) -> Probe | NullProbe:
+    if not PROBES:
+        return _NULL_PROBE
+    with _probes_lock:
+        if name not in _probes:
+            _probes[name] = Probe(name)
+        return _probes[name]
+
+
+# all the probes of this process so far, safe to go over while other threads register new ones
+def _registered() -> list[Probe]:
+    with _probes_lock:
+        return list(_probes.values())
+
+
+# The summaries of all the probes of this process. Every process only has its own: in the multiprocess engine
+# the mixer runs as the barrier action of whichever channel group reaches the barrier last, so its probes (mix,
+# handoff, tick, envelopes, spectrum) are split over the reports of the channel groups, which have to be read together
+def report(role: str) -> dict:
+    return {"role": role, "pid": os.getpid(), "time": time.time(), "histogram_edges": HISTOGRAM_EDGES,
+            "scope": "this process only, in the multiprocess engine the mixer's probes are split over the channel groups",
+            "probes": {p.name: p.summary() for p in _registered()}}
+
+
+def log_line(role: str) -> str:
+    return f"[probes {role} {os.getpid()}] " + " | ".join(str(p) for p in _registered() if p.count)
+
+
+# Decorates the function a process runs: while it runs, a thread prints a log line of its probes every
+# PROBE_LOG_INTERVAL seconds, and when it returns the last line is printed and (with PROBE_OUTPUT)
+# the report is written to probes_<role>_<pid>.json. Does nothing while PROBES is off
+def reported(role: str):
+    def decorator(func):
+        if not PROBES:
+            return func
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            done = Event()
+
+            def log():
+                while not done.wait(PROBE_LOG_INTERVAL):
+                    if any(p.count for p in _registered()):
+                        print(log_line(role))
+
+            logger = Thread(target=log, daemon=True)
+            if PROBE_LOG_INTERVAL:
+                logger.start()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                done.set()
+                print(log_line(role))
+                if PROBE_OUTPUT:
+                    os.makedirs(PROBE_OUTPUT, exist_ok=True)
+                    with open(os.path.join(PROBE_OUTPUT, f"probes_{role}_{os.getpid()}.json"), "w") as f:
+                        json.dump(report(role), f, indent=2)
+
+        return wrapper
+    return decorator
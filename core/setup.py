@@ -1,54 +1,103 @@
-from settings import CHANNELS, START_PATTERN, START_NOTE, SHOW_VISUALIZER
-from multiprocessing import Process, shared_memory, Manager, Barrier, Queue
-from core.types import BeatPtr, ProcessInfo
-from core.file import CHANNEL_COUNT, ModFile
-from core.constants import BUFFER_SIZE
-from audio.channel import channel
-from audio.mixer import mix
-from audio.player import player
+from settings import START_PATTERN, START_NOTE, SHOW_VISUALIZER, ENGINE, WORKERS, PLAYER, OUTPUT_BUFFER_DEPTH, \
+    INTERPOLATION, SPECTRUM
+from multiprocessing import Process, shared_memory, Barrier
+from core.types import SharedBeatPtr, SharedEnvelopes, SharedSpectrum, RingBuffer, SamplePool, ProcessInfo
+from core.timeline import Timeline
+from core.file import ModFile
+from audio.channel import channel_group
+from audio.mixer import Mixer, selected_channels
+from audio.engine import engine, ENGINE_MODES
+from audio.mipmap import Mipmaps, MIPMAP_INTERPOLATION
+from audio.player import player, callback_player, PLAYER_MODES
 from graphics.visualizer import visualizer
-from dataclasses import asdict
-from functools import partial
 from threading import Thread
 
 
-def process_init(manager: Manager, song: ModFile) -> ProcessInfo:
-    beat_ptr = BeatPtr(pattern_idx=START_PATTERN, note_idx=START_NOTE)
+def process_init(song: ModFile) -> ProcessInfo:
+    if PLAYER not in PLAYER_MODES:
+        raise ValueError(f"unknown player mode '{PLAYER}', choose from {PLAYER_MODES}")
 
-    # Create the channels shared memory output buffer
-    shm_list = []
-    shm_names = []
-    for _ in range(CHANNEL_COUNT):
-        shm = shared_memory.SharedMemory(create=True, size=BUFFER_SIZE*4)
-        shm_list.append(shm)
-        shm_names.append(shm.name)
+    # Flatten the song into its timeline and start at the chosen row
+    timeline = Timeline.compile(song)
+    beat_ptr = SharedBeatPtr.create(timeline.position(timeline.find(START_PATTERN, START_NOTE)))
 
-    # Prepare the output queue
-    output_queue = Queue(2)     # increase if you experience stuttering
+    # Create the channels shared memory output block, one row of samples per channel. Rows change length with the
+    # song's speed and tempo, so it is allocated once for the longest one, and so are the ring buffer slots
+    shm = shared_memory.SharedMemory(create=True, size=song.channel_count*timeline.max_frames*4)
 
-    # Process safety and synchronization
-    beat_ptr_proxy = manager.dict(asdict(beat_ptr))
-    mix_action = partial(mix, shm_names, output_queue, beat_ptr_proxy, song.length, song.repeat_idx)
-    sync_barrier = Barrier(len(CHANNELS), action=mix_action)
+    # Prepare the ring buffer between the mixer and the player
+    output_ring = RingBuffer.create(timeline.max_frames, OUTPUT_BUFFER_DEPTH)
+
+    # Move the sample data into shared memory, so the rendering processes attach to it instead of each receiving a copy
+    sample_pool = SamplePool.create(song.samplelist)
+
+    # Build the sample pyramids of the mipmap modes once, in shared memory as well
+    mipmaps = mipmap_pool = None
+    if INTERPOLATION in MIPMAP_INTERPOLATION:
+        mipmaps = Mipmaps.build(song.samplelist)
+        mipmap_pool = mipmaps.share()
+
+    # The plotter only reads the per-tick envelopes the mixer publishes, never the channel block itself
+    envelopes = SharedEnvelopes.create(song.channel_count) if SHOW_VISUALIZER else None
+    # The analysis of every tick for any meter that attaches to it, computed once by the mixer
+    spectrum = SharedSpectrum.create(song.channel_count) if SPECTRUM else None
 
-    # Initialise the channel processes and store them
-    process_list = [Process(target=channel, args=(i, song, shm_names[i], beat_ptr_proxy, sync_barrier))
-                    for i in CHANNELS if 0 <= i <= 3]
+    # Initialise the rendering processes and store them
+    process_list = engine_processes(song, timeline, shm.name, output_ring, beat_ptr, mipmaps=mipmaps,
+                                    envelopes=envelopes, spectrum=spectrum)
 
     # Initialise the plotter
     if SHOW_VISUALIZER:
-        plotter_proc = Process(target=visualizer, args=(shm_names, song.name))
+        plotter_proc = Process(target=visualizer, args=(envelopes, song.name, song.channel_count))
         process_list.append(plotter_proc)
 
     # Initialise the player
-    player_thread = Thread(target=player, args=(output_queue,))
+    player_thread = Thread(target=callback_player if PLAYER == 'callback' else player, args=(output_ring,))
     process_list.append(player_thread)
 
     # Start all the processes
     for p in process_list:
         p.start()
 
-    return ProcessInfo(process_list, shm_list, beat_ptr_proxy, output_queue)
+    return ProcessInfo(process_list, [shm], sample_pool, beat_ptr, output_ring, timeline, mipmap_pool, envelopes,
+                       spectrum)
+
+
+# The processes that render the song into the channel buffers and pass the mix to the output ring buffer
+def engine_processes(song: ModFile, timeline: Timeline, shm_name: str, output_ring: RingBuffer,
+                     beat_ptr: SharedBeatPtr, mode: str = ENGINE, mipmaps: Mipmaps = None,
+                     envelopes: SharedEnvelopes = None, spectrum: SharedSpectrum = None) -> list[Process]:
+    if mode not in ENGINE_MODES:
+        raise ValueError(f"unknown engine mode '{mode}', choose from {ENGINE_MODES}")
+
+    mixer = Mixer(shm_name, output_ring, beat_ptr, timeline, song.channel_count, envelopes, spectrum)
+    if mode == 'single':
+        return [Process(target=engine, args=(song, timeline, shm_name, beat_ptr, mixer, mipmaps))]
+
+    # Process safety and synchronization
+    groups = channel_groups(selected_channels(song.channel_count))
+    sync_barrier = Barrier(len(groups), action=mixer)
+
+    processes = [Process(target=channel_group,
+                         args=(group, song, timeline, shm_name, beat_ptr, sync_barrier, mixer, mipmaps))
+                 for group in groups]
+    # Process.start() lets go of the arguments, but with spawn and forkserver the workers attach to the barrier's
+    # semaphores later, which are gone by then if nothing else in this process still holds it
+    for p in processes:
+        p.sync_barrier = sync_barrier
+    return processes
+
+
+# Splits the channels over at most WORKERS processes, taking turns so that every group gets a similar share of them.
+# The number of processes doesn't grow with the channels (or the cores), songs with more channels share them
+def channel_groups(channels: list[int], workers: int = WORKERS) -> list[list[int]]:
+    count = max(1, min(workers, len(channels)))
+    return [channels[i::count] for i in range(count)]
+
+
+# Jumps the running song to the given time in seconds (clamped to one pass through the song)
+def seek(info: ProcessInfo, seconds: float):
+    info.beat_ptr.request_seek(info.timeline.row_at(min(max(seconds, 0.0), info.timeline.duration)))
 
 
 def process_deinit(info: ProcessInfo):
@@ -59,3 +108,18 @@ def process_deinit(info: ProcessInfo):
     # release shared memory
     for shm in info.shm_list:
         shm.unlink()
+    info.sample_pool.close()
+    info.sample_pool.unlink()
+    if info.mipmap_pool is not None:
+        info.mipmap_pool.close()
+        info.mipmap_pool.unlink()
+    if info.envelopes is not None:
+        info.envelopes.close()
+        info.envelopes.unlink()
+    if info.spectrum is not None:
+        info.spectrum.close()
+        info.spectrum.unlink()
+    info.beat_ptr.close()
+    info.beat_ptr.unlink()
+    info.output_ring.close()
+    info.output_ring.unlink()
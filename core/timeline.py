@@ -0,0 +1,190 @@
+from __future__ import annotations
+from dataclasses import dataclass, field
+from copy import deepcopy
+from numpy.typing import NDArray
+import numpy as np
+
+from settings import PLAYBACK_RATE
+from core.constants import MAX_NOTE_COUNT, INITIAL_SPEED, INITIAL_TEMPO, \
+    POSITION_JUMP, PATTERN_BREAK, SET_SPEED, PATTERN_LOOP, PATTERN_DELAY
+from core.types import BeatPtr, ChannelState
+from core.file import ModFile
+from audio.processing import advance_row
+
+SNAPSHOT_INTERVAL = 64  # rows between stored channel states, so a seek replays at most this many rows
+MAX_ROWS = 2**20    # gives up on songs that haven't looped after this many rows
+FLOW_EFFECTS = [POSITION_JUMP, PATTERN_BREAK, SET_SPEED, PATTERN_LOOP, PATTERN_DELAY]
+
+ROW_DTYPE = np.dtype([
+    ("order_idx", np.int16),    # index into the pattern order
+    ("note_idx", np.int16),     # row within the pattern
+    ("speed", np.uint8),    # ticks per row
+    ("ticks", np.uint16),   # ticks the row lasts, more than speed when it's delayed with EEx
+    ("tempo", np.float32),  # a tick lasts 2.5 / tempo seconds
+    ("start", np.int64),    # offset of the row from the start of the song in samples
+    ("frames", np.int32),   # length of the row in samples
+])
+
+
+# The song flattened into the rows in the order they are played, after following the pattern order, position jumps,
+# pattern breaks and loops, pattern delays and speed/tempo changes. Every row knows where it starts in samples
+# and the channel states are stored every SNAPSHOT_INTERVAL rows, so seeking to any time or row is a binary
+# search and a replay of at most SNAPSHOT_INTERVAL rows. After the last row the song continues at loop_row
+# (None if it ends with F00 instead of looping)
+@dataclass
+class Timeline:
+    rows: NDArray = field(compare=False)  # ROW_DTYPE table of all the rows
+    loop_row: int | None
+    snapshots: list[list[ChannelState]] = field(default_factory=list, compare=False)  # every SNAPSHOT_INTERVAL rows
+
+    @staticmethod
+    def compile(song: ModFile) -> Timeline:
+        rows, loop_row = sequence(song)
+        timeline = Timeline(rows, loop_row)
+        timeline._takeSnapshots(song)
+        return timeline
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    # length of one pass through the song in seconds
+    @property
+    def duration(self) -> float:
+        return self.end / PLAYBACK_RATE
+
+    # length of one pass through the song in samples
+    @property
+    def end(self) -> int:
+        last = self.rows[-1]
+        return int(last["start"] + last["frames"])
+
+    # length of the longest row in samples, what every buffer a row is rendered into is allocated for
+    @property
+    def max_frames(self) -> int:
+        return int(self.rows["frames"].max())
+
+    # the row played after the given one
+    def next_row(self, row_idx: int) -> int:
+        if row_idx + 1 < len(self.rows):
+            return row_idx + 1
+        return self.loop_row if self.loop_row is not None else 0
+
+    # the row playing at the given time in the first pass through the song
+    def row_at(self, seconds: float) -> int:
+        offset = int(seconds * PLAYBACK_RATE)
+        return max(0, int(np.searchsorted(self.rows["start"], offset, side='right')) - 1)
+
+    # the first time the given row of the pattern order is played
+    def find(self, pattern_idx: int, note_idx: int = 0) -> int:
+        matches = np.flatnonzero((self.rows["order_idx"] == pattern_idx) & (self.rows["note_idx"] == note_idx))
+        if len(matches) == 0:
+            raise ValueError(f"pattern {pattern_idx} note {note_idx} is never played")
+        return int(matches[0])
+
+    def position(self, row_idx: int) -> BeatPtr:
+        row = self.rows[row_idx]
+        return BeatPtr(int(row["order_idx"]), int(row["note_idx"]), row_idx)
+
+    # The states of all the channels right before the given row is played
+    def channel_states(self, song: ModFile, row_idx: int) -> list[ChannelState]:
+        first = row_idx - row_idx % SNAPSHOT_INTERVAL
+        states = deepcopy(self.snapshots[first // SNAPSHOT_INTERVAL])
+        self._replay(song, states, first, row_idx)
+        return states
+
+    def _takeSnapshots(self, song: ModFile):
+        states = [ChannelState() for _ in range(song.channel_count)]
+        self.snapshots = []
+        for first in range(0, len(self.rows), SNAPSHOT_INTERVAL):
+            self.snapshots.append(deepcopy(states))
+            self._replay(song, states, first, min(first + SNAPSHOT_INTERVAL, len(self.rows)))
+
+    # Plays the rows from first up to (not including) last into the channel states, without rendering anything
+    def _replay(self, song: ModFile, states: list[ChannelState], first: int, last: int):
+        rows = self.rows[first:last]
+        for order_idx, note_idx, ticks, frames in zip(rows["order_idx"].tolist(), rows["note_idx"].tolist(),
+                                                      rows["ticks"].tolist(), rows["frames"].tolist()):
+            notes = song.patterns[song.pattern_order[order_idx], note_idx].tolist()
+            for state, note in zip(states, notes):
+                state.play(note, song.samplelist)
+                advance_row(state, song.samplelist, ticks, frames)
+
+
+# Steps through the song row by row, following only the effects that change its flow, until it either repeats
+# a row it has already played in the same state (the song loops there) or stops with F00.
+# Returns the ROW_DTYPE table of the rows and the row the song loops back to (None if it stops)
+def sequence(song: ModFile) -> tuple[NDArray, int | None]:
+    effect_ids, args = song.patterns["effect_id"], song.patterns["arg1"]
+    has_flow = np.isin(effect_ids, FLOW_EFFECTS).any(axis=2).tolist()    # nested lists index faster per row
+    restart = song.repeat_idx if song.repeat_idx < song.length else 0
+
+    rows = []
+    seen: dict[tuple, int] = {}     # (order_idx, note_idx, loop counters) -> row
+    order_idx, note_idx = 0, 0
+    speed, tempo = INITIAL_SPEED, INITIAL_TEMPO
+    loop_start = [0] * song.channel_count    # E60 marks, per channel like in ProTracker
+    loop_count = [0] * song.channel_count    # E6x repetitions left
+    loop_row = None
+
+    while len(rows) < MAX_ROWS:
+        key = (order_idx, note_idx, *loop_count)
+        if key in seen:
+            loop_row = seen[key]
+            break
+        seen[key] = len(rows)
+
+        pattern_idx = song.pattern_order[order_idx]
+        next_order, next_note = order_idx, note_idx + 1
+        delay = 0
+        stop = False
+
+        if has_flow[pattern_idx][note_idx]:
+            jump_order = break_note = loop_note = None
+            row_effects = zip(effect_ids[pattern_idx, note_idx].tolist(), args[pattern_idx, note_idx].tolist())
+            for channel_no, (effect_id, arg) in enumerate(row_effects):
+                if effect_id == SET_SPEED:
+                    if arg == 0:
+                        stop = True
+                    elif arg < 32:
+                        speed = arg
+                    else:
+                        tempo = arg
+                elif effect_id == POSITION_JUMP:
+                    jump_order = arg
+                elif effect_id == PATTERN_BREAK:
+                    break_note = (arg >> 4) * 10 + (arg & 0x0F)     # the argument is decimal
+                elif effect_id == PATTERN_DELAY:
+                    delay = max(delay, arg)
+                elif effect_id == PATTERN_LOOP:
+                    if arg == 0:
+                        loop_start[channel_no] = note_idx
+                    elif loop_count[channel_no] == 0:
+                        loop_count[channel_no] = arg
+                        loop_note = loop_start[channel_no]
+                    else:
+                        loop_count[channel_no] -= 1
+                        if loop_count[channel_no] > 0:
+                            loop_note = loop_start[channel_no]
+
+            if loop_note is not None:
+                next_note = loop_note
+            elif jump_order is not None or break_note is not None:
+                next_order = jump_order if jump_order is not None else order_idx + 1
+                next_note = break_note if break_note is not None and break_note < MAX_NOTE_COUNT else 0
+
+        rows.append((order_idx, note_idx, speed, speed * (1 + delay), tempo, 0, 0))
+        if stop:
+            break
+
+        if next_note >= MAX_NOTE_COUNT:
+            next_order, next_note = next_order + 1, 0
+        if next_order >= song.length:
+            next_order = restart
+        order_idx, note_idx = next_order, next_note
+
+    # absolute offsets are rounded from the exact running time, so fractional samples never add up to a drift
+    table = np.array(rows, dtype=ROW_DTYPE)
+    ends = np.rint(np.cumsum(table["ticks"] * 2.5 / table["tempo"].astype(np.float64)) * PLAYBACK_RATE).astype(np.int64)
+    table["start"][1:] = ends[:-1]
+    table["frames"] = np.diff(ends, prepend=0)
+    return table, loop_row
@@ -1,10 +1,17 @@
 from __future__ import annotations
-from dataclasses import dataclass, field, fields
-from multiprocessing import Process, shared_memory, Queue
+from dataclasses import dataclass, field
+from multiprocessing import Process, shared_memory
 from threading import Thread
-from typing import Union
+from typing import Union, TYPE_CHECKING
+import time
+import os
 
 from audio.effects import *
+from core.constants import TONE_PORTAMENTO, TONE_PORTAMENTO_VOL_SLIDE, ENVELOPE_HISTORY, SPECTRUM_BANDS, \
+    SPECTRUM_HISTORY
+
+if TYPE_CHECKING:
+    from core.timeline import Timeline
 
 
 @dataclass
@@ -16,32 +23,42 @@ class Sample:  # holds a sample track
     loopstart: int  # no of byte offset from start of sample
     looplength: int  # no of samples in loop
     has_loop: bool
-    data: NDArray[np.float32] = field(default_factory=lambda: np.array([], dtype=np.float32))  # the actual sample data
+    data: NDArray[np.int8] = field(default_factory=lambda: np.array([], dtype=np.int8))  # the actual sample data
+    pool: SamplePool = field(default=None, compare=False, repr=False)  # shared memory holding the data, if shared
+    offset: int = 0  # of the data in the pool
 
+    # a shared sample is pickled without its data and looks it up in the pool again, by the length in its place
+    def __getstate__(self):
+        if self.pool is None:
+            return self.__dict__
+        return self.__dict__ | {"data": len(self.data)}
 
-@dataclass
-class Note:  # holds a note
-    sample_idx: int
-    period: int
-    effect: Effect
+    def __setstate__(self, state: dict):
+        self.__dict__.update(state)
+        if self.pool is not None:
+            self.data = self.pool.view(self.offset, state["data"])
 
 
-@dataclass
-class Pattern:  # holds a pattern with 4 channels with 64 notes each
-    ch1: list[Note] = field(default_factory=list)  # channel 1
-    ch2: list[Note] = field(default_factory=list)  # channel 2
-    ch3: list[Note] = field(default_factory=list)  # channel 3
-    ch4: list[Note] = field(default_factory=list)  # channel 4
+# Layout of a single note in a song's note table, which is shaped (patterns, notes, channels)
+NOTE_DTYPE = np.dtype([
+    ("sample_idx", np.int16),   # -1 if the note continues the previous one
+    ("period", np.uint16),
+    ("effect_id", np.uint8),
+    ("arg1", np.uint8),
+    ("arg2", np.int8),          # -1 if the effect only takes a single argument
+])
 
-    # indexing support
-    def __getitem__(self, index):
-        field_names = [f.name for f in fields(self)]
-        return getattr(self, field_names[index])
+
+class Pattern:  # a view on one pattern of the note table, indexed as pattern[channel][note]
+    def __init__(self, notes: NDArray):
+        self.notes = notes  # (notes, channels) array of NOTE_DTYPE records
 
     # indexing support
-    def __setitem__(self, index, value):
-        field_name = fields(self)[index].name
-        setattr(self, field_name, value)
+    def __getitem__(self, index) -> NDArray:
+        return self.notes[:, index]
+
+    def __len__(self):
+        return self.notes.shape[1]
 
 
 # Stores information about effects
@@ -62,44 +79,517 @@ class Effect:
         self._arg1 = arg1
         self._arg2 = arg2
 
-    def __call__(self, data: NDArray[np.float32]) -> NDArray[np.float32]:
+    # Applies the effect to one row of a channel, filling in its per-tick parameters
+    def __call__(self, channel_state: ChannelState, params: TickParams):
+        handler = self._effect_lookup[self._id]
+        if handler is None:
+            return
         if self._arg2 is not None:
-            return self._effect_lookup[self._id](self._arg1, self._arg2, data)
+            handler(channel_state, params, self._arg1, self._arg2)
         else:
-            return self._effect_lookup[self._id](self._arg1, data)
+            handler(channel_state, params, self._arg1)
 
 
 # Keeps track of where the player currently is in the track so all the channels
 # are always perfectly synchronised and can resume from any moment in the song
 @dataclass
 class BeatPtr:
-    pattern_idx: int = 0
+    pattern_idx: int = 0    # index into the pattern order
     note_idx: int = 0
+    row_idx: int = 0    # index into the song's Timeline
+
+
+# layout of the SharedBeatPtr block, one int64 each
+_SEQUENCE, _PATTERN_IDX, _NOTE_IDX, _ROW_IDX, _SEEK_REQUESTED, _SEEK_HANDLED, _SEEK_ROW, _PUBLISHED_NS = range(8)
+_FIELD_COUNT = 8
+
+
+# The song position shared by the mixer and the channel processes, kept in a small shared memory block.
+# Protocol (a sequence lock):
+#   publish - the single writer (the mixer) makes the sequence number odd, writes the position, then makes it even again
+#   load    - readers retry until they see the same even sequence number before and after reading the position
+# so a reader never sees half of an update, and the sequence number doubles as a tick counter.
+# Seeks are requested through the same block: request_seek bumps a request counter next to the target row,
+# and the mixer picks the request up with take_seek before it publishes the next position
+class SharedBeatPtr:
+    def __init__(self, name: str = None, create: bool = False):
+        self._shm = shared_memory.SharedMemory(name=name, create=create, size=_FIELD_COUNT * 8)
+        self._block = np.ndarray((_FIELD_COUNT,), dtype=np.int64, buffer=self._shm.buf)
+        if create:
+            self._block[:] = 0
+
+    @staticmethod
+    def create(beat_ptr: BeatPtr) -> SharedBeatPtr:
+        shared = SharedBeatPtr(create=True)
+        shared.publish(beat_ptr)
+        shared._block[_PUBLISHED_NS] = 0     # nothing has started rendering it yet
+        return shared
+
+    @property
+    def name(self) -> str:
+        return self._shm.name
+
+    # no of positions published so far
+    @property
+    def tick(self) -> int:
+        return int(self._block[_SEQUENCE]) // 2
+
+    # perf_counter_ns when the current position was published, i.e. the channels were let loose on its row.
+    # 0 for the initial position
+    @property
+    def published_ns(self) -> int:
+        return int(self._block[_PUBLISHED_NS])
+
+    def load(self) -> BeatPtr:
+        return self.load_into(BeatPtr())
+
+    # Same as load, into a BeatPtr the caller keeps, so the hot path doesn't make a new one every tick
+    def load_into(self, beat_ptr: BeatPtr) -> BeatPtr:
+        block = self._block
+        while True:
+            sequence = block[_SEQUENCE]
+            if sequence & 1:
+                continue    # an update is in progress
+            pattern_idx, note_idx, row_idx = int(block[_PATTERN_IDX]), int(block[_NOTE_IDX]), int(block[_ROW_IDX])
+            if block[_SEQUENCE] == sequence:
+                beat_ptr.pattern_idx, beat_ptr.note_idx, beat_ptr.row_idx = pattern_idx, note_idx, row_idx
+                return beat_ptr
+
+    def publish(self, beat_ptr: BeatPtr):
+        block = self._block
+        block[_SEQUENCE] += 1
+        block[_PATTERN_IDX] = beat_ptr.pattern_idx
+        block[_NOTE_IDX] = beat_ptr.note_idx
+        block[_ROW_IDX] = beat_ptr.row_idx
+        block[_PUBLISHED_NS] = time.perf_counter_ns()
+        block[_SEQUENCE] += 1
+
+    # Asks the mixer to continue at the given timeline row. Any process can request, the newest request wins
+    def request_seek(self, row_idx: int):
+        self._block[_SEEK_ROW] = row_idx
+        self._block[_SEEK_REQUESTED] += 1
+
+    # The row of a pending seek request, or None. Only the mixer takes requests
+    def take_seek(self) -> int | None:
+        block = self._block
+        requested = block[_SEEK_REQUESTED]
+        if requested == block[_SEEK_HANDLED]:
+            return None
+        block[_SEEK_HANDLED] = requested
+        return int(block[_SEEK_ROW])
+
+    def close(self):
+        del self._block
+        self._shm.close()
+
+    def unlink(self):
+        self._shm.unlink()
+
+    # processes receive the name and attach to the same block
+    def __getstate__(self):
+        return self.name
+
+    def __setstate__(self, name: str):
+        self.__init__(name)
+
+
+# layout of the TickRing header, one int64 each and padded to a cache line, followed by the records
+_RING_SEQUENCE, _RING_TICKS = range(2)
+_RING_HEADER_SIZE = 8
+
+
+# The records of the latest history ticks in shared memory, every one a float32 array of the same shape.
+# The single writer (the mixer) appends the ticks of every row under a sequence lock as in SharedBeatPtr, and
+# readers copy the whole ring out, so they never see half of a row
+class TickRing:
+    def __init__(self, shape: tuple[int, ...], history: int, name: str = None, create: bool = False):
+        self.shape = tuple(shape)
+        self.history = history
+        size = _RING_HEADER_SIZE * 8 + history * int(np.prod(shape)) * 4
+        self._shm = shared_memory.SharedMemory(name=name, create=create, size=size)
+        self._header = np.ndarray((_RING_HEADER_SIZE,), dtype=np.int64, buffer=self._shm.buf)
+        self._records = np.ndarray((history, *shape), dtype=np.float32, buffer=self._shm.buf,
+                                   offset=_RING_HEADER_SIZE * 8)
+        self._copy = None   # what load reads the ring into before putting it in order
+        if create:
+            self._header[:] = 0
+            self._records[:] = 0
+
+    @property
+    def name(self) -> str:
+        return self._shm.name
+
+    # no of ticks published so far
+    @property
+    def ticks(self) -> int:
+        return int(self._header[_RING_TICKS])
+
+    # Writer side: appends the records of a row's ticks, shaped (ticks, *shape)
+    def publish(self, records: NDArray[np.float32]):
+        header = self._header
+        slots = (int(header[_RING_TICKS]) + np.arange(len(records))) % self.history
+        header[_RING_SEQUENCE] += 1
+        self._records[slots] = records
+        header[_RING_TICKS] += len(records)
+        header[_RING_SEQUENCE] += 1
+
+    # Reader side: copies the records into out, shaped (history, *shape) with the oldest tick first, and
+    # returns the no of ticks published so far
+    def load(self, out: NDArray[np.float32]) -> int:
+        if self._copy is None:
+            self._copy = np.empty_like(self._records)
+        header = self._header
+        while True:
+            sequence = header[_RING_SEQUENCE]
+            if sequence & 1:
+                _yield_cpu()    # an update is in progress
+                continue
+            np.copyto(self._copy, self._records)
+            ticks = int(header[_RING_TICKS])
+            if header[_RING_SEQUENCE] == sequence:
+                break
+        split = ticks % self.history
+        out[:self.history - split] = self._copy[split:]
+        out[self.history - split:] = self._copy[:split]
+        return ticks
+
+    def close(self):
+        del self._header, self._records
+        self._copy = None
+        self._shm.close()
+
+    def unlink(self):
+        self._shm.unlink()
+
+    # processes receive the name and attach to the same block
+    def __getstate__(self):
+        return self.name, self.shape, self.history
+
+    def __setstate__(self, state: tuple[str, tuple[int, ...], int]):
+        name, shape, history = state
+        TickRing.__init__(self, shape, history, name)
+
+
+ENVELOPE_FIELDS = 3     # minimum, maximum and RMS of a tick
+
+
+# The minimum, maximum and RMS of every channel over its latest ENVELOPE_HISTORY ticks, which is all the
+# visualizer draws, as (ticks, ENVELOPE_FIELDS, channels). It copies these few KiB instead of the channel buffers
+class SharedEnvelopes(TickRing):
+    def __init__(self, channel_count: int, name: str = None, create: bool = False):
+        super().__init__((ENVELOPE_FIELDS, channel_count), ENVELOPE_HISTORY, name, create)
+
+    @staticmethod
+    def create(channel_count: int) -> SharedEnvelopes:
+        return SharedEnvelopes(channel_count, create=True)
+
+    @property
+    def channel_count(self) -> int:
+        return self.shape[1]
+
+
+# fields of the analysis of a source: the RMS level of each of SPECTRUM_BANDS bands, then its peak and RMS
+SPECTRUM_PEAK, SPECTRUM_RMS = SPECTRUM_BANDS, SPECTRUM_BANDS + 1
+SPECTRUM_FIELDS = SPECTRUM_BANDS + 2
+
+
+# The spectrum, peak and RMS of every channel and the master bus over the latest SPECTRUM_HISTORY ticks, as
+# (ticks, channels + 1, SPECTRUM_FIELDS) with the master bus last, for level and spectrum meters
+class SharedSpectrum(TickRing):
+    def __init__(self, channel_count: int, name: str = None, create: bool = False):
+        super().__init__((channel_count + 1, SPECTRUM_FIELDS), SPECTRUM_HISTORY, name, create)
+
+    @staticmethod
+    def create(channel_count: int) -> SharedSpectrum:
+        return SharedSpectrum(channel_count, create=True)
+
+    @property
+    def channel_count(self) -> int:
+        return self.shape[0] - 1
+
+
+# layout of the RingBuffer header, one int64 each and padded to a cache line, followed by the frames
+_WRITE_IDX, _READ_IDX, _OVERRUNS, _UNDERRUNS, _CLOSED, _LIMIT, _HELD = range(7)
+_HEADER_SIZE = 8
+_SPIN_COUNT = 100           # checks of a full or empty ring that only yield the CPU, before falling back to sleeping
+_POLL_INTERVAL = 0.0005     # seconds between the checks after that
+_yield_cpu = getattr(os, "sched_yield", lambda: time.sleep(0))     # no sched_yield on Windows
+
+
+# A single producer, single consumer queue of float32 frames of up to frame_size samples in shared memory.
+# Every slot is allocated at frame_size and records the length of the frame it holds.
+# Protocol:
+#   producer (the mixer)  - fills the slot at write_idx % depth in place, stores its length, then increments write_idx
+#   consumer (the player) - reads the slot at read_idx % depth in place, then increments read_idx
+# Each index has a single writer, so no locks are needed and frames are never pickled or copied on the way.
+# A full ring makes the producer wait, which paces the engine to the player. The consumer can also limit how many
+# samples may be queued (throttle), counting those it has taken out of the ring but not played yet, so the producer
+# waits before the ring fills up. The counters record frames the producer had to drop because the ring stayed full
+# (overruns) and the times the consumer found it empty after playback had started (underruns)
+class RingBuffer:
+    def __init__(self, frame_size: int, depth: int, name: str = None, create: bool = False):
+        self.frame_size = frame_size
+        self.depth = depth
+        size = (_HEADER_SIZE + depth) * 8 + depth * frame_size * 4
+        self._shm = shared_memory.SharedMemory(name=name, create=create, size=size)
+        self._header = np.ndarray((_HEADER_SIZE,), dtype=np.int64, buffer=self._shm.buf)
+        self._lengths = np.ndarray((depth,), dtype=np.int64, buffer=self._shm.buf, offset=_HEADER_SIZE * 8)
+        slots = np.ndarray((depth, frame_size), dtype=np.float32, buffer=self._shm.buf,
+                           offset=(_HEADER_SIZE + depth) * 8)
+        self._slots = list(slots)   # one view per slot made up front, so handing them out allocates nothing
+        if create:
+            self._header[:] = 0
+
+    @staticmethod
+    def create(frame_size: int, depth: int) -> RingBuffer:
+        return RingBuffer(frame_size, depth, create=True)
+
+    @property
+    def name(self) -> str:
+        return self._shm.name
+
+    # no of frames written but not read yet
+    @property
+    def fill(self) -> int:
+        return int(self._header[_WRITE_IDX] - self._header[_READ_IDX])
+
+    # no of samples in the frames written but not read yet
+    @property
+    def buffered(self) -> int:
+        header = self._header
+        return sum(int(self._lengths[i % self.depth]) for i in range(int(header[_READ_IDX]), int(header[_WRITE_IDX])))
+
+    @property
+    def overruns(self) -> int:
+        return int(self._header[_OVERRUNS])
+
+    @property
+    def underruns(self) -> int:
+        return int(self._header[_UNDERRUNS])
+
+    @property
+    def closed(self) -> bool:
+        return bool(self._header[_CLOSED])
+
+    # Producer side: the next free slot to fill (all frame_size samples of it), or None if the ring stayed full for timeout seconds
+    # (the frame is dropped). Raises BrokenPipeError once the consumer has shut the ring down
+    def write_slot(self, timeout: float = None) -> NDArray[np.float32] | None:
+        if not self._wait(self._full, timeout):
+            self._header[_OVERRUNS] += 1
+            return None
+        if self._header[_CLOSED]:
+            raise BrokenPipeError("the ring buffer reader has shut down")
+        return self._slots[self._header[_WRITE_IDX] % self.depth]
+
+    # Producer side: hands the filled slot over to the consumer, of which the first length samples are the frame
+    def commit(self, length: int = None):
+        self._lengths[self._header[_WRITE_IDX] % self.depth] = self.frame_size if length is None else length
+        self._header[_WRITE_IDX] += 1
+
+    # Producer side: copies a frame into the ring. False if it was dropped
+    def put(self, frame: NDArray[np.float32], timeout: float = None) -> bool:
+        slot = self.write_slot(timeout)
+        if slot is None:
+            return False
+        slot[:len(frame)] = frame
+        self.commit(len(frame))
+        return True
+
+    # Consumer side: a view of the oldest frame at its committed length, valid until release(), or None if the ring stayed empty
+    # for timeout seconds or was shut down and drained
+    def read_slot(self, timeout: float = None) -> NDArray[np.float32] | None:
+        header = self._header
+        if header[_READ_IDX] > 0 and self._empty():
+            header[_UNDERRUNS] += 1
+        if not self._wait(self._empty, timeout) or self._empty():
+            return None
+        index = header[_READ_IDX] % self.depth
+        length = self._lengths[index]
+        return self._slots[index] if length == self.frame_size else self._slots[index][:length]
+
+    # Consumer side: gives the slot returned by read_slot back to the producer
+    def release(self):
+        self._header[_READ_IDX] += 1
+
+    # Consumer side: makes the producer wait while the ring and the held samples the consumer took out of it (and
+    # hasn't played yet) add up to limit samples or more. A limit of 0 lets the producer fill the whole ring
+    def throttle(self, limit: int, held: int = 0):
+        self._header[_HELD] = held
+        self._header[_LIMIT] = limit
+
+    # Consumer side: tells the producer nobody is reading anymore
+    def shutdown(self):
+        self._header[_CLOSED] = 1
+
+    def _full(self) -> bool:
+        header = self._header
+        if header[_WRITE_IDX] - header[_READ_IDX] >= self.depth:
+            return True
+        return header[_LIMIT] > 0 and self.buffered + header[_HELD] >= header[_LIMIT]
+
+    def _empty(self) -> bool:
+        return self._header[_WRITE_IDX] == self._header[_READ_IDX]
+
+    # Waits while blocked() holds, for at most timeout seconds (forever if None) or until the ring is shut down.
+    # False if it timed out
+    def _wait(self, blocked, timeout: float = None) -> bool:
+        if not blocked():
+            return True
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        spins = 0
+        while blocked() and not self._header[_CLOSED]:
+            if deadline is not None and time.perf_counter() >= deadline:
+                return False
+            spins += 1
+            _yield_cpu() if spins < _SPIN_COUNT else time.sleep(_POLL_INTERVAL)
+        return True
+
+    def __str__(self):
+        return f"ring buffer: {self.fill}/{self.depth} frames, {self.overruns} overruns, {self.underruns} underruns"
+
+    def close(self):
+        del self._slots
+        del self._lengths
+        del self._header
+        self._shm.close()
+
+    def unlink(self):
+        self._shm.unlink()
+
+    # processes receive the name and attach to the same block
+    def __getstate__(self):
+        return self.name, self.frame_size, self.depth
+
+    def __setstate__(self, state: tuple[str, int, int]):
+        name, frame_size, depth = state
+        self.__init__(frame_size, depth, name)
 
 
 # Keeps track of the progress in note rendering
 @dataclass
 class ChannelState:
-    current_frame: int = 0
+    position: float = 0.0   # fractional playback position in the current sample
 
-    current_sample: int = None
+    current_sample: int = None  # the sample playing
+    instrument: int = None  # the sample the last note named, used by the next note that has a period
     current_period: int = 0
-    current_effect: Effect = Effect()
+    note_period: int = 0    # period the note started at, before any slides
+    target_period: int = 0  # period a tone portamento slides to
+    volume: int = 64    # 0 - 64
+    triggered: bool = False  # whether the current row started a new note
+    current_effect: int = 0
+    current_args: tuple[int, ...] = (0, 0)   # the arguments to construct Effect(current_effect, *current_args)
+
+    # effect memory, for the effects that continue with their previous arguments when given 0
+    portamento_speed: int = 0
+    offset_memory: int = 0
+    vibrato_speed: int = 0
+    vibrato_depth: int = 0
+    vibrato_pos: int = 0
+    vibrato_wave: int = 0
+    tremolo_speed: int = 0
+    tremolo_depth: int = 0
+    tremolo_pos: int = 0
+    tremolo_wave: int = 0
+
+    # Applies the note of the next row the way ProTracker does:
+    #   - a sample number resets the volume to the sample's and becomes the instrument of the following notes
+    #   - a period starts the instrument at that period, unless it's the target of a tone portamento (3xx, 5xy)
+    #   - a row with neither continues the current note
+    # The note is a NOTE_DTYPE record as a tuple of Python ints (what .item() and .tolist() give)
+    def play(self, note: tuple[int, int, int, int, int], samplelist: list[Sample]):
+        sample_idx, period, effect_id, arg1, arg2 = note
+        if 0 <= sample_idx < len(samplelist):
+            self.instrument = sample_idx
+            self.volume = min(samplelist[sample_idx].volume, 64)
+
+        self.triggered = False
+        if period > 0:
+            if effect_id in (TONE_PORTAMENTO, TONE_PORTAMENTO_VOL_SLIDE) and self.current_sample is not None:
+                self.target_period = period
+            elif self.instrument is not None:
+                self.trigger(period)
+
+        self.current_effect = effect_id
+        self.current_args = (arg1,) if arg2 == -1 else (arg1, arg2)
+
+    def trigger(self, period: int):
+        self.position = 0.0
+        self.current_sample = self.instrument
+        self.current_period = self.note_period = period
+        self.triggered = True
+        if not self.vibrato_wave & 4:
+            self.vibrato_pos = 0
+        if not self.tremolo_wave & 4:
+            self.tremolo_pos = 0
+
+
+# The PCM data of all the samples of a song stored once, as int8 (or any dtype, e.g. float32 for resampled copies),
+# in a block of shared memory. Samples are pointed at their part of it and pickled without their data
+# (see Sample.__getstate__), so every process attaches to the same copy instead of receiving its own.
+# Pickled by name like the RingBuffer
+class SamplePool:
+    def __init__(self, size: int, name: str = None, create: bool = False, dtype: np.dtype = np.int8):
+        self.size = size
+        self.dtype = np.dtype(dtype)
+        self._shm = shared_memory.SharedMemory(name=name, create=create, size=max(size * self.dtype.itemsize, 1))
+        self._data = np.ndarray((size,), dtype=self.dtype, buffer=self._shm.buf)
+        self._samples = []  # the samples this process pointed at the pool
+
+    # Moves the data of the samples into a new pool and points them at it
+    @staticmethod
+    def create(samplelist: list[Sample], dtype: np.dtype = np.int8) -> SamplePool:
+        pool = SamplePool(sum(len(sample.data) for sample in samplelist), create=True, dtype=dtype)
+        offset = 0
+        for sample in samplelist:
+            length = len(sample.data)
+            pool._data[offset:offset + length] = sample.data
+            sample.data, sample.pool, sample.offset = pool.view(offset, length), pool, offset
+            pool._samples.append(sample)
+            offset += length
+        return pool
+
+    @property
+    def name(self) -> str:
+        return self._shm.name
+
+    # a read only view of length samples from offset
+    def view(self, offset: int, length: int) -> NDArray:
+        data = self._data[offset:offset + length]
+        data.flags.writeable = False
+        return data
+
+    def __str__(self):
+        return f"sample pool: {self.size * self.dtype.itemsize / 2**10:.0f} KiB shared"
+
+    # the samples pointed at the pool by create() lose their data
+    def close(self):
+        for sample in self._samples:
+            sample.data, sample.pool = np.array([], dtype=self.dtype), None
+        self._samples = []
+        del self._data
+        self._shm.close()
+
+    def unlink(self):
+        self._shm.unlink()
 
-    def trigger(self, new_note: Note):
-        self.current_frame = 0
-        self.current_sample = new_note.sample_idx
-        self.current_period = new_note.period
-        self.current_effect = new_note.effect
+    # processes receive the name and attach to the same block
+    def __getstate__(self):
+        return self.name, self.size, self.dtype.str
 
-    def increment(self, continued_note: Note):
-        self.current_frame += 1
-        self.current_effect = continued_note.effect
+    def __setstate__(self, state: tuple[str, int, str]):
+        name, size, dtype = state
+        self.__init__(size, name, dtype=dtype)
 
 
 @dataclass
 class ProcessInfo:
     process_list: list[Union[Process, Thread]]
     shm_list: list[shared_memory]
-    beat_ptr: BeatPtr
-    output_queue: Queue
+    sample_pool: SamplePool
+    beat_ptr: SharedBeatPtr
+    output_ring: RingBuffer
+    timeline: Timeline
+    mipmap_pool: SamplePool = None  # of the song's Mipmaps, in the mipmap interpolation modes
+    envelopes: SharedEnvelopes = None   # for the visualizer, if it is shown
+    spectrum: SharedSpectrum = None     # with SPECTRUM
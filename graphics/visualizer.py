@@ -1,31 +1,31 @@
-from multiprocessing import shared_memory
 import matplotlib.animation as animation
 import matplotlib.style as mplstyle
 import matplotlib.pyplot as plt
 import numpy as np
 
-from core.constants import BUFFER_SIZE, VIEW_WIDTH, TICK_RATE
-from core.file import CHANNEL_COUNT
-from core.utilities import profile
+from settings import VISUALIZER_FPS
+from core.constants import ENVELOPE_HISTORY
+from core.types import SharedEnvelopes, ENVELOPE_FIELDS
+from audio.mixer import selected_channels
 
+ENVELOPE_COLORS = ["#00e6b8", "#00e6b8", "#007a62"]  # of the minimum, maximum and RMS lines
 
-@profile
-def visualizer(shm_names: str, song_name: str):
-    # Create a numpy array view on the shared memory buffer
-    shm_buffer = []
-    for name in shm_names:
-        shm = shared_memory.SharedMemory(name=name)
-        shm_buffer.append(shm)
 
-    # Persistent NumPy views for each channel
-    shm_array = []
-    for i in range(CHANNEL_COUNT):
-        shm_array.append(np.ndarray((BUFFER_SIZE,), dtype=np.float32, buffer=shm_buffer[i].buf))
+# Plots the envelopes of the latest ticks of every channel, as the mixer publishes them. Every frame copies the
+# small envelope block and redraws only the lines over a saved background (blitting), so its cost doesn't depend
+# on the length of the rows
+def visualizer(envelopes: SharedEnvelopes, song_name: str, channel_count: int):
+    channels = selected_channels(channel_count)     # the others are never rendered
+    data = np.zeros((ENVELOPE_HISTORY, ENVELOPE_FIELDS, channel_count), dtype=np.float32)
 
     try:
-        # Create 4 subplots in a 2x2 grid
-        fig, ax = plt.subplots(2, 2, figsize=(5, 5))
+        # Create a subplot per channel, in a 2x2 grid for 4 channels and 4 columns for more
+        columns = 2 if channel_count <= 4 else 4
+        rows = -(-channel_count // columns)
+        fig, ax = plt.subplots(rows, columns, figsize=(2.5 * columns, 2.5 * rows), squeeze=False)
         ax = ax.flatten()
+        for unused in ax[channel_count:]:
+            unused.set_visible(False)
 
         # Theme setup
         plt.rcParams["font.family"] = "Consolas"
@@ -50,34 +50,32 @@ def visualizer(shm_names: str, song_name: str):
             fontsize=18,
         )
 
-        # Create one Line2D per channel
-        artists = [
-            ax[i].plot(np.zeros(VIEW_WIDTH, dtype=np.float32), linewidth=1, color="#00e6b8")[0]
-            for i in range(CHANNEL_COUNT)
-        ]
+        # Create the minimum, maximum and RMS Line2D of every channel, drawn apart from the background
+        ticks = np.arange(ENVELOPE_HISTORY)
+        artists = {
+            (field, i): ax[i].plot(ticks, data[:, field, i], linewidth=1, color=color, animated=True)[0]
+            for i in channels for field, color in enumerate(ENVELOPE_COLORS)
+        }
+        lines = list(artists.values())
 
         # Subplot configuration
-        for i in range(CHANNEL_COUNT):
+        for i in range(channel_count):
             ax[i].text(0.05, 0.03, f'CHANNEL {i + 1}', fontsize=12, color="white", transform=ax[i].transAxes)
+            ax[i].set_xlim(0, ENVELOPE_HISTORY - 1)
             ax[i].set_ylim(-1.25, 1.25)
             ax[i].set_xticks([])  # Remove x ticks
             ax[i].set_yticks([])  # Remove y ticks
             ax[i].set_facecolor("#222222")
 
         def update(frame):
-            begin = ((VIEW_WIDTH + 1) * frame) % BUFFER_SIZE
-            end = ((VIEW_WIDTH + 1) * (frame + 1) - 1) % BUFFER_SIZE
-
-            if begin > end:
-                return artists
-
-            for i in range(CHANNEL_COUNT):
-                artists[i].set_ydata(shm_array[i][begin:end])
-            return artists
+            envelopes.load(data)
+            for (field, i), artist in artists.items():
+                artist.set_ydata(data[:, field, i])
+            return lines
 
         # Do the animation
-        interv = TICK_RATE * 1000 * (VIEW_WIDTH / BUFFER_SIZE)
-        ani = animation.FuncAnimation(fig=fig, func=update, interval=interv, save_count=10)
+        ani = animation.FuncAnimation(fig=fig, func=update, interval=1000 / VISUALIZER_FPS, blit=True,
+                                      cache_frame_data=False)
         plt.show()
 
     except KeyboardInterrupt:
@@ -85,5 +83,4 @@ def visualizer(shm_names: str, song_name: str):
 
     finally:
         # Cleanup
-        for shm in shm_buffer:
-            shm.close()
+        envelopes.close()
@@ -0,0 +1,36 @@
+from argparse import ArgumentParser
+
+from settings import LIBRARY_PATH
+from core.library import Library
+
+
+# Indexes .mod collections into an SQLite database and searches it by song or sample name
+def main():
+    parser = ArgumentParser(description="Index .mod files (or whole directories of them) and search the index")
+    parser.add_argument("--db", default=LIBRARY_PATH, help="library database file")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    scan = commands.add_parser("scan", help="add new and changed files, drop deleted ones")
+    scan.add_argument("paths", nargs="+", help=".mod files or directories to index")
+    scan.add_argument("-j", "--jobs", type=int, default=None, help="no of indexing processes (default: one per core)")
+
+    search = commands.add_parser("search", help="list the modules whose song or sample names contain the text")
+    search.add_argument("text", help="text to look for, case insensitive")
+    search.add_argument("--no-samples", action="store_true", help="only match song names")
+    search.add_argument("-n", "--limit", type=int, default=None, help="no of results to show")
+    args = parser.parse_args()
+
+    library = Library(args.db)
+    try:
+        if args.command == "scan":
+            print(library.scan(args.paths, args.jobs))
+            print(f"{len(library)} modules in {args.db}")
+        else:
+            for entry in library.search(args.text, not args.no_samples, args.limit):
+                print(entry)
+    finally:
+        library.close()
+
+
+if __name__ == "__main__":
+    main()
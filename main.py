@@ -1,11 +1,9 @@
-from multiprocessing import Manager
 import time
 
 from settings import FILEPATH
-from core.setup import process_init, process_deinit
+from core.setup import process_init, process_deinit, seek
 from core.file import ModFile
 
-# TODO: THE EFFECTS RENDERER
 # TODO: fix discontinuities
 # TODO: a note counter in the visualiser
 # TODO: artists description in the visualiser
@@ -14,20 +12,27 @@ from core.file import ModFile
 
 
 def main():
-    with Manager() as manager:
-        song = ModFile.open(FILEPATH)
-        process_info = process_init(manager, song)
-
-        try:
-            print("NOW PLAYING: ", song.name)
-            while True:
-                time.sleep(1)
-
-        except KeyboardInterrupt:
-            print("Exiting program...")
-
-        finally:
-            process_deinit(process_info)
+    song = ModFile.open(FILEPATH)
+    process_info = process_init(song)
+
+    try:
+        print("NOW PLAYING: ", song.name)
+        print(f"{process_info.timeline.duration:.0f} s long, type a time in seconds and press enter to jump there")
+        while True:
+            try:
+                seek(process_info, float(input()))
+            except ValueError:
+                print("not a time in seconds")
+            except EOFError:
+                # no console to read from, just keep playing
+                while True:
+                    time.sleep(1)
+
+    except KeyboardInterrupt:
+        print("Exiting program...")
+
+    finally:
+        process_deinit(process_info)
 
 
 if __name__ == "__main__":
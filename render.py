@@ -0,0 +1,27 @@
+from argparse import ArgumentParser
+
+from audio.offline import OUTPUT_FORMATS
+from audio.batch import collect_jobs, render_batch
+
+
+# Renders .mod files to disk faster than realtime, without any audio device
+def main():
+    parser = ArgumentParser(description="Render .mod files (or whole directories of them) to WAV or raw PCM")
+    parser.add_argument("paths", nargs="+", help=".mod files or directories to render")
+    parser.add_argument("-o", "--output-dir", default="renders", help="directory for the rendered files")
+    parser.add_argument("-f", "--format", default="wav", choices=OUTPUT_FORMATS, help="wav (16-bit), f32 or s16 raw PCM")
+    parser.add_argument("-s", "--seconds", type=float, default=None, help="stop each song after this many seconds of audio")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="no of render processes (default: one per core)")
+    parser.add_argument("-t", "--timeout", type=float, default=None, help="give up on a file after this many seconds")
+    parser.add_argument("-m", "--trace-memory", action="store_true",
+                        help="also measure each file's peak allocations, in a second (slower) traced pass")
+    args = parser.parse_args()
+
+    jobs = collect_jobs(args.paths, args.output_dir, args.format)
+    summary = render_batch(jobs, args.output_dir, args.format, args.jobs, args.timeout, args.seconds,
+                           args.trace_memory)
+    print(summary)
+
+
+if __name__ == "__main__":
+    main()
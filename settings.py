@@ -1,11 +1,29 @@
 FILEPATH = "examples/monty_on_the_run.mod"           # good example: monty_on_the_run - BPM 100 TPB 8
-CHANNELS = [0, 1, 2, 3]                              # choose from [0, 1, 2, 3]
+CHANNELS = None                                      # channel numbers to play, e.g. [0, 1, 2, 3], None for all
 START_PATTERN, START_NOTE = (0, 0)
 BPM = 100
 TPB = 8
 
 PLAYBACK_RATE = 48000
-INTERPOLATION = 'linear'   # choose from [zero_order_hold (none), linear, sinc_fastest, sinc_medium, sinc_best]
+INTERPOLATION = 'linear'   # choose from [zero_order_hold (none), linear, sinc_fastest, sinc_medium, sinc_best, mipmap_linear, mipmap_cubic, polyphase_4, polyphase_8, polyphase_16, polyphase_32]
+MIPMAP_OVERSAMPLING = 4     # rate of the top level of the mipmap modes' sample pyramids, relative to the samples
+MIPMAP_LEVELS = 4           # no of octaves the pyramids reach below the samples' rate, for notes played faster than it
+MIPMAP_QUALITY = 'sinc_medium'  # resampler the pyramids are built with when the song is loaded
+ENGINE = 'multiprocess'     # choose from [multiprocess (channel groups in worker processes), single (all in one process)]
+WORKERS = 4                 # no of worker processes the channels are split over in multiprocess mode (at most one per channel)
+PLAYER = 'callback'         # choose from [callback (the sound card pulls blocks from a jitter buffer), blocking]
+DEVICE_BLOCK_SIZE = 512     # no of samples the sound card asks for at a time in callback mode
+JITTER_LATENCY_RANGE = (0.02, 0.5)  # seconds the jitter buffer may hold, it starts at the low end and grows on underruns
+JITTER_CALM_PERIOD = 5.0    # seconds without underruns before the jitter buffer shrinks again
+OUTPUT_BUFFER_DEPTH = 2     # no of frames buffered between the mixer and the player, increase if you experience stuttering
+TRANSPOSE_CACHE_SIZE = 32 * 2**20   # bytes of transposed sample data each channel keeps for repeated notes
+LIBRARY_PATH = "library.sqlite"     # index of scanned module collections, see library.py
 
 SHOW_VISUALIZER = True
-USE_PROFILER = False
+VISUALIZER_FPS = 30         # redraws of the channel plots per second
+SPECTRUM = False            # analyse every tick of the channels and the mix (band levels, peak and RMS) into shared memory
+SPECTRUM_SIZE = 1024        # samples of the rFFT of every tick, shorter ticks are zero padded
+SPECTRUM_BUDGET = 0.05      # share of the time a row plays that its analysis may take, the analyser skips rows beyond it
+PROBES = False              # time every stage of the hot path (render, barrier, mix, handoff, write) and report the latencies
+PROBE_LOG_INTERVAL = 10.0   # seconds between the probe log lines of every process, None for one line at exit only
+PROBE_OUTPUT = None         # directory for a JSON report of every process's probes at exit, None for none